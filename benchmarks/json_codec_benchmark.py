@@ -0,0 +1,68 @@
+"""Measure the per-record encode/decode cost of each available JSON codec backend."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+from src.core.json_codec import available_codecs, get_codec
+from setup import CustomerSystemWorkorder
+
+
+def make_workorders(count: int) -> List[CustomerSystemWorkorder]:
+    """Outbound-shaped customer workorders, with native datetimes like the translator emits"""
+    base_time = datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc)
+    return [
+        CustomerSystemWorkorder(
+            orderNo=number,
+            isActive=number % 5 == 0,
+            isCanceled=number % 5 == 1,
+            isDeleted=False,
+            isDone=number % 5 == 2,
+            isOnHold=number % 5 == 3,
+            isPending=number % 5 == 4,
+            isSynced=False,
+            summary=f"Example workorder #{number} summary",
+            creationDate=base_time + timedelta(minutes=number),
+            lastUpdateDate=base_time + timedelta(minutes=number, seconds=30),
+            deletedDate=None,
+        )
+        for number in range(count)
+    ]
+
+
+def per_record_us(operation: Callable, items: list, repeat: int) -> float:
+    """Best-of-repeat time per item, in microseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for item in items:
+            operation(item)
+        best = min(best, time.perf_counter() - started_at)
+    return best / len(items) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=10_000, help="workorders encoded per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the best one is kept")
+    args = parser.parse_args()
+
+    workorders = make_workorders(args.records)
+    print(f"{'codec':<10}{'mode':<10}{'encode us/rec':>15}{'decode us/rec':>15}{'bytes/rec':>12}")
+
+    for name in available_codecs():
+        for compact in (False, True):
+            codec = get_codec(name, compact=compact)
+            encoded = [codec.dumps(workorder) for workorder in workorders]
+            encode_us = per_record_us(codec.dumps, workorders, args.repeat)
+            decode_us = per_record_us(codec.loads, encoded, args.repeat)
+            size = sum(map(len, encoded)) / len(encoded)
+            mode = "compact" if compact else "pretty"
+            print(f"{name:<10}{mode:<10}{encode_us:>15.2f}{decode_us:>15.2f}{size:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
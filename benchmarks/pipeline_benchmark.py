@@ -0,0 +1,395 @@
+"""Run the inbound and outbound flows end to end on synthetic workorders and report per-stage
+throughput and latency percentiles as JSON.
+
+Stages are timed by wrapping the methods the processors call, so the pipeline itself runs
+unchanged. Latencies are per batch (an inbound chunk, an outbound chunk of
+OUTBOUND_BATCH_SIZE, a bulk write...):
+
+- scan: time the flow waited for its next batch from the source (inbound files read on the
+  thread pool, outbound cursor), after prefetching; includes parse time on that path
+- parse: JSON decoding of inbound records, document -> TracOSRecord for outbound ones
+- translate, mongo_write, file_write, mark_synced: the translator, handler and writer calls
+
+Without --mongo-uri MongoDB is mongomock_motor, whose writes scan the whole collection, so
+sizes above --mock-max-records are skipped; point --mongo-uri at a local mongod for the
+100k and 1M runs. Other settings (OUTBOUND_FORMAT, CUSTOMER_JSON_CODEC, batch sizes...)
+are taken from the environment like in a real run.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from src.core.json_codec import get_codec
+from src.core.logging_config import configure_logging
+from src.core.metrics import metrics
+from src.core.mongo_pool import MongoClientPool
+from src.processors.inbound_processor import InboundProcessor
+from src.processors.outbound_processor import OutboundProcessor
+
+
+STAGES = ("scan", "parse", "translate", "mongo_write", "file_write", "mark_synced")
+BASE_TIME = datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc)
+
+
+class StageTimer:
+    """Per-stage samples of (seconds, records), one per batch.
+
+    Per-record calls (parsing, cursor reads) are summed into one sample every batch_size
+    records. Samples may come from the I/O threads, hence the lock.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.samples: Dict[str, List[tuple]] = defaultdict(list)
+        self._pending: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, records: int) -> None:
+        with self._lock:
+            self.samples[stage].append((seconds, records))
+
+    def add_record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            pending = self._pending[stage]
+            pending[0] += seconds
+            pending[1] += 1
+            if pending[1] >= self.batch_size:
+                self.samples[stage].append((pending[0], pending[1]))
+                self._pending[stage] = [0.0, 0]
+
+    def wrap_async(self, stage: str, func: Callable, count: Callable[[tuple, Any], int]) -> Callable:
+        """Time every call of an async method, counting count(args, result) records"""
+        async def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            result = await func(*args, **kwargs)
+            self.add(stage, time.perf_counter() - started_at, count(args, result))
+            return result
+        return timed
+
+    def wrap_per_record(self, stage: str, func: Callable) -> Callable:
+        """Time every call of a method handling one record"""
+        def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_record(stage, time.perf_counter() - started_at)
+        return timed
+
+    def wrap_iterator(self, stage: str, func: Callable, per_record: bool) -> Callable:
+        """Time the wait for every item of an async iterator; items are batches unless per_record"""
+        async def timed(*args, **kwargs):
+            iterator = func(*args, **kwargs).__aiter__()
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                if per_record:
+                    self.add_record(stage, time.perf_counter() - started_at)
+                else:
+                    self.add(stage, time.perf_counter() - started_at, len(item))
+                yield item
+        return timed
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            for stage, (seconds, records) in self._pending.items():
+                if records:
+                    self.samples[stage].append((seconds, records))
+            self._pending.clear()
+            return {stage: summarize(self.samples[stage]) for stage in STAGES if self.samples.get(stage)}
+
+
+class _TimedCodec:
+    """A JSON codec whose loads() is timed as the parse stage"""
+
+    def __init__(self, codec, timer: StageTimer):
+        self._codec = codec
+        self.loads = timer.wrap_per_record("parse", codec.loads)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._codec, name)
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples: List[tuple]) -> Dict[str, Any]:
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    seconds = sum(sample[0] for sample in samples)
+    records = sum(sample[1] for sample in samples)
+    return {
+        "batches": len(samples),
+        "records": records,
+        "seconds": round(seconds, 6),
+        "records_per_second": round(records / seconds, 1) if seconds else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+            "mean": round(sum(latencies) / len(latencies), 3),
+        },
+    }
+
+
+def _count_first_arg(args: tuple, result: Any) -> int:
+    return len(args[0])
+
+
+def instrument_inbound(processor: InboundProcessor, timer: StageTimer) -> None:
+    customer_handler = processor.customer_handler
+    customer_handler.aiter_workorder_chunks = timer.wrap_iterator("scan", customer_handler.aiter_workorder_chunks, per_record=False)
+    customer_handler.codec = _TimedCodec(customer_handler.codec, timer)
+    processor.translator.customer_to_tracos_many = timer.wrap_async("translate", processor.translator.customer_to_tracos_many, _count_first_arg)
+    processor.tracos_handler.create_workorders = timer.wrap_async("mongo_write", processor.tracos_handler.create_workorders, _count_first_arg)
+
+
+def instrument_outbound(processor: OutboundProcessor, timer: StageTimer) -> None:
+    tracos_handler = processor.tracos_handler
+    customer_handler = processor.customer_handler
+    tracos_handler.iter_unsynced_workorders = timer.wrap_iterator("scan", tracos_handler.iter_unsynced_workorders, per_record=True)
+    tracos_handler.parse_data = timer.wrap_per_record("parse", tracos_handler.parse_data)
+    processor.translator.tracos_to_costumer_many = timer.wrap_async("translate", processor.translator.tracos_to_costumer_many, _count_first_arg)
+    customer_handler.create_workorders_async = timer.wrap_async("file_write", customer_handler.create_workorders_async, _count_first_arg)
+    customer_handler.append_to_segments_async = timer.wrap_async("file_write", customer_handler.append_to_segments_async, _count_first_arg)
+    # Publishing a segment is part of writing it; its records were counted when appended
+    customer_handler.close_segment_async = timer.wrap_async("file_write", customer_handler.close_segment_async, lambda args, result: 0)
+    tracos_handler.mark_as_synced_many = timer.wrap_async("mark_synced", tracos_handler.mark_as_synced_many, _count_first_arg)
+
+
+def make_customer_workorders(count: int) -> Iterator[Dict[str, Any]]:
+    """Inbound customer workorders, shaped like the sample files of setup.py"""
+    statuses = ("pending", "in_progress", "completed", "on_hold", "cancelled", "deleted")
+    for number in range(1, count + 1):
+        status = statuses[number % len(statuses)]
+        created_at = BASE_TIME + timedelta(minutes=number)
+        updated_at = created_at + timedelta(hours=1)
+        yield {
+            "orderNo": number,
+            "isActive": status == "in_progress",
+            "isCanceled": status == "cancelled",
+            "isDeleted": status == "deleted",
+            "isDone": status == "completed",
+            "isOnHold": status == "on_hold",
+            "isPending": status == "pending",
+            "summary": f"Example workorder #{number}",
+            "creationDate": created_at.isoformat(),
+            "lastUpdateDate": updated_at.isoformat(),
+            "deletedDate": updated_at.isoformat() if status == "deleted" else None,
+        }
+
+
+def make_tracos_documents(count: int) -> Iterator[Dict[str, Any]]:
+    """Unsynced TracOS documents waiting to be exported"""
+    statuses = ("pending", "in_progress", "completed", "on_hold", "cancelled")
+    for number in range(1, count + 1):
+        created_at = BASE_TIME + timedelta(minutes=number)
+        yield {
+            "_id": ObjectId(),
+            "number": number,
+            "status": statuses[number % len(statuses)],
+            "title": f"Example workorder #{number}",
+            "description": f"Example workorder #{number} description",
+            "createdAt": created_at,
+            "updatedAt": created_at + timedelta(hours=1),
+            "deleted": False,
+            "deletedAt": None,
+            "isSynced": False,
+        }
+
+
+def write_inbound_files(folder: str, count: int, inbound_format: str, records_per_file: int) -> None:
+    """One JSON file per workorder, or NDJSON files of records_per_file workorders"""
+    codec = get_codec(compact=True)
+    if inbound_format == "files":
+        for workorder in make_customer_workorders(count):
+            with open(os.path.join(folder, f"{workorder['orderNo']}.json"), "wb") as f:
+                f.write(codec.dumps(workorder))
+        return
+
+    f = None
+    try:
+        for index, workorder in enumerate(make_customer_workorders(count)):
+            if index % records_per_file == 0:
+                if f is not None:
+                    f.close()
+                f = open(os.path.join(folder, f"workorders_{index // records_per_file:05d}.ndjson"), "wb")
+            f.write(codec.dumps(workorder))
+            f.write(b"\n")
+    finally:
+        if f is not None:
+            f.close()
+
+
+async def seed_tracos(pool: MongoClientPool, database: str, collection: str, count: int, batch_size: int = 10_000) -> None:
+    client = await pool.get_client()
+    documents = []
+    for document in make_tracos_documents(count):
+        documents.append(document)
+        if len(documents) >= batch_size:
+            await client[database][collection].insert_many(documents, ordered=False)
+            documents = []
+    if documents:
+        await client[database][collection].insert_many(documents, ordered=False)
+
+
+@contextmanager
+def environment(**values: str) -> Iterator[None]:
+    """Set environment variables for the processors created inside, restoring them on exit"""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_pool(mongo_uri: Optional[str]) -> MongoClientPool:
+    pool = MongoClientPool()
+    if mongo_uri is None:
+        pool.client_factory = lambda *args, **kwargs: AsyncMongoMockClient()
+    return pool
+
+
+async def run_flow(flow: str, count: int, args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    """Run one flow over count workorders in a fresh database, returning its results"""
+    inbound_dir = os.path.join(work_dir, "inbound")
+    outbound_dir = os.path.join(work_dir, "outbound")
+    os.makedirs(inbound_dir)
+    os.makedirs(outbound_dir)
+    database = f"pipeline_benchmark_{os.getpid()}_{count}"
+    collection = f"workorders_{flow}"
+
+    overrides = {"DATA_INBOUND_DIR": inbound_dir, "DATA_OUTBOUND_DIR": outbound_dir, "MONGO_DATABASE": database, "MONGO_COLLECTION": collection}
+    if args.mongo_uri is not None:
+        overrides["MONGO_URI"] = args.mongo_uri
+
+    with environment(**overrides):
+        pool = make_pool(args.mongo_uri)
+        try:
+            if flow == "inbound":
+                write_inbound_files(inbound_dir, count, args.inbound_format, args.records_per_file)
+                processor = InboundProcessor(mongo_pool=pool)
+                timer = StageTimer(processor.customer_handler.chunk_size)
+                instrument_inbound(processor, timer)
+            else:
+                await seed_tracos(pool, database, collection, count)
+                processor = OutboundProcessor(mongo_pool=pool)
+                timer = StageTimer(processor.batch_size)
+                instrument_outbound(processor, timer)
+
+            metrics.reset()
+            started_at = time.perf_counter()
+            await processor.process()
+            wall_seconds = time.perf_counter() - started_at
+
+            return {
+                "flow": flow,
+                "records": count,
+                "wall_seconds": round(wall_seconds, 3),
+                "records_per_second": round(count / wall_seconds, 1) if wall_seconds else None,
+                "stages": timer.summary(),
+                "metrics": metrics.snapshot(),
+            }
+        finally:
+            if args.mongo_uri is not None and pool.client is not None:
+                await pool.client.drop_database(database)
+            pool.close()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results = {
+        "benchmark": "pipeline",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": "mongod" if args.mongo_uri is not None else "mongomock_motor",
+        "settings": {
+            "inbound_format": args.inbound_format,
+            "records_per_file": args.records_per_file,
+            "json_codec": get_codec().name,
+            **{name: os.environ[name] for name in sorted(os.environ) if name.startswith(("INBOUND_", "OUTBOUND_", "MONGO_", "CUSTOMER_", "TRANSLATOR_")) and name != "MONGO_URI"},
+        },
+        "runs": [],
+        "skipped": [],
+    }
+
+    for count in args.sizes:
+        if args.mongo_uri is None and count > args.mock_max_records:
+            results["skipped"].append({"records": count, "reason": f"over --mock-max-records={args.mock_max_records} with mongomock_motor"})
+            print(f"{count} workorders: skipped with mongomock_motor, use --mongo-uri", file=sys.stderr)
+            continue
+
+        for flow in args.flows:
+            work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_", dir=args.work_dir)
+            try:
+                result = await run_flow(flow, count, args, work_dir)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            results["runs"].append(result)
+            print_result(result)
+    return results
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    print(f"{result['flow']} {result['records']} workorders: {result['wall_seconds']:.2f} s, {result['records_per_second']:.0f}/s", file=sys.stderr)
+    for stage, summary in result["stages"].items():
+        latency = summary["latency_ms"]
+        rate = f"{summary['records_per_second']:.0f}/s" if summary["records_per_second"] else "-"
+        print(
+            f"  {stage:<12}{rate:>12}  p50 {latency['p50']:>9.3f} ms  p90 {latency['p90']:>9.3f} ms  p99 {latency['p99']:>9.3f} ms",
+            file=sys.stderr,
+        )
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size.replace("_", "")) for size in value.split(",") if size.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=parse_sizes, default=[10_000, 100_000, 1_000_000], help="comma-separated workorder counts")
+    parser.add_argument("--flows", type=lambda value: value.split(","), default=["inbound", "outbound"], help="inbound, outbound or both")
+    parser.add_argument("--mongo-uri", default=None, help="run against this mongod instead of mongomock_motor")
+    parser.add_argument("--mock-max-records", type=int, default=10_000, help="largest size run with mongomock_motor")
+    parser.add_argument("--inbound-format", choices=("ndjson", "files"), default="ndjson", help="NDJSON exports or one JSON file per workorder")
+    parser.add_argument("--records-per-file", type=int, default=10_000, help="workorders per inbound NDJSON file")
+    parser.add_argument("--work-dir", default=None, help="where the inbound and outbound folders are created")
+    parser.add_argument("--log-level", default="WARNING", help="log level of the pipeline during the runs")
+    parser.add_argument("--output", default="pipeline_benchmark.json", help="JSON results file")
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
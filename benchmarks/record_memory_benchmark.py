@@ -0,0 +1,79 @@
+"""Compare the memory held by a backlog of parsed workorders: dicts versus slotted records."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator
+from bson import ObjectId
+from src.core.records import TracOSRecord
+from setup import TracOSWorkorder
+
+
+def make_documents(count: int) -> Iterator[Dict[str, Any]]:
+    """MongoDB-shaped TracOS documents, generated one at a time like a cursor returns them"""
+    base_time = datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc)
+    statuses = ("pending", "in_progress", "completed", "on_hold", "cancelled")
+    for number in range(count):
+        yield {
+            "_id": ObjectId(),
+            "number": number,
+            "status": statuses[number % 5],
+            "title": f"Example workorder #{number}",
+            "description": f"Example workorder #{number} description",
+            "createdAt": base_time + timedelta(minutes=number),
+            "updatedAt": base_time + timedelta(minutes=number, seconds=30),
+            "deleted": False,
+            "deletedAt": None,
+            "isSynced": False,
+            "syncedAt": None,
+        }
+
+
+def parse_as_dict(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The previous parse_data: a TypedDict built field by field, then copied into another dict"""
+    workorder = TracOSWorkorder(
+        _id=doc["_id"],
+        number=doc["number"],
+        status=doc["status"],
+        title=doc["title"],
+        description=doc["description"],
+        createdAt=doc["createdAt"],
+        updatedAt=doc["updatedAt"],
+        deleted=doc["deleted"],
+        deletedAt=doc.get("deletedAt"),
+    )
+    return dict(workorder)
+
+
+def measure(parse: Callable[[Dict[str, Any]], Any], count: int) -> Dict[str, float]:
+    """Retained and peak traced memory, in MiB, of parsing count documents into a list"""
+    gc.collect()
+    tracemalloc.start()
+    backlog = [parse(doc) for doc in make_documents(count)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    container = sys.getsizeof(backlog[0]) if backlog else 0
+    del backlog
+    gc.collect()
+    return {"retained": current / 2**20, "peak": peak / 2**20, "container": container}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000, help="workorders held in the backlog")
+    args = parser.parse_args()
+
+    print(f"{args.records} workorders")
+    print(f"{'representation':<16}{'retained MiB':>14}{'peak MiB':>12}{'bytes/container':>18}")
+    for name, parse in (("dict", parse_as_dict), ("TracOSRecord", TracOSRecord.from_document)):
+        result = measure(parse, args.records)
+        print(f"{name:<16}{result['retained']:>14.1f}{result['peak']:>12.1f}{result['container']:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,478 @@
-from typing import List
+from typing import Any, Dict, List, Iterable, Iterator, AsyncIterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
 from setup import CustomerSystemWorkorder
+from src.core.file_ledger import ProcessedFileLedger
+from src.core.json_codec import get_codec
+from src.core.segment_writer import NdjsonSegmentWriter
+from src.core.durable_io import fsync_directory, fsync_path, temp_path_for
+from src.core.logging_config import record_log
+from src.core.inbound_formats import (
+    NDJSON_SUFFIXES,
+    is_inbound_file,
+    is_multi_record_file,
+    iter_json_array_records,
+    iter_ndjson_records,
+)
 import os
-import json
+import asyncio
+import hashlib
+import threading
 from loguru import logger
 
 
+# Returned by _read_workorder for NDJSON and JSON-array files, whose workorders are streamed
+MULTI_RECORD_FILE = object()
+
+
+class _StreamedFile:
+    """Progress of a multi-record file whose workorders may span several chunks"""
+
+    def __init__(self):
+        # Workorders read but not yet reported through finish_files
+        self.outstanding = 0
+        self.complete = False
+        self.failed = False
+
+
 class CustomerHandler:
     def __init__(self):
         self.inbound_folder = os.getenv("DATA_INBOUND_DIR", "data/inbound")
         self.outbound_folder = os.getenv("DATA_OUTBOUND_DIR", "data/outbound")
-        logger.info("CustomerHandler module initialized")
+        self.chunk_size = int(os.getenv("INBOUND_CHUNK_SIZE", "500"))
+        self.io_threads = int(os.getenv("CUSTOMER_IO_THREADS", "8"))
+        self.io_concurrency = int(os.getenv("CUSTOMER_IO_CONCURRENCY", "32"))
+        self._executor = None
+        self._io_semaphore = None
+        self.codec = get_codec()
+        # Outbound files are flushed to disk before they are renamed into place and marked as synced
+        self.outbound_fsync = os.getenv("OUTBOUND_FSYNC", "true").lower() == "true"
 
-    def get_workorders(self) -> List[CustomerSystemWorkorder]:
-        """Get the workorder and return as a list of dicts"""
-        workorders = []
+        # "files" writes one JSON file per workorder, "ndjson" appends to rolling segments
+        self.outbound_format = os.getenv("OUTBOUND_FORMAT", "files").lower()
+        self.segment_writer = None
+        if self.outbound_format == "ndjson":
+            # One record per line, whatever CUSTOMER_JSON_COMPACT says
+            self.segment_writer = NdjsonSegmentWriter(
+                self.outbound_folder, get_codec(self.codec.name, compact=True), fsync=self.outbound_fsync
+            )
+
+        self.archive_folder = os.getenv("INBOUND_ARCHIVE_DIR", "")
+        self.ledger = None
+        if os.getenv("INBOUND_LEDGER_ENABLED", "true").lower() == "true":
+            ledger_path = os.getenv("INBOUND_LEDGER_PATH") or os.path.join(self.inbound_folder, ".processed_files.sqlite3")
+            self.ledger = ProcessedFileLedger(ledger_path)
+        # (size, mtime_ns, content_hash) of files read but not yet applied
+        self._read_signatures: Dict[str, Tuple[int, int, str]] = {}
+        self._streamed_files: Dict[str, _StreamedFile] = {}
+        self._streamed_lock = threading.Lock()
+        logger.info(f"CustomerHandler module initialized ({self.codec.name} JSON codec)")
+
+    def _scan_inbound_files(self) -> Iterator[str]:
+        """Lazily yield the path of every workorder file in the inbound folder"""
+        with os.scandir(self.inbound_folder) as entries:
+            for entry in entries:
+                if is_inbound_file(entry.name) and entry.is_file():
+                    yield entry.path
+
+    def _read_workorder(self, file_path: str) -> Optional[CustomerSystemWorkorder]:
+        """Load a single workorder file, returning None if it can't be read or was already applied.
+
+        NDJSON and JSON-array files are not read here: MULTI_RECORD_FILE is returned and
+        their workorders are streamed with _iter_file_records.
+        """
+        file = os.path.basename(file_path)
         try:
-            files = os.listdir(self.inbound_folder)
-            json_files = [f for f in files if f.endswith('.json')]
+            stat = os.stat(file_path)
+            if self.ledger is not None and self.ledger.is_applied(file_path, stat.st_size, stat.st_mtime_ns):
+                logger.debug("Skipping {}, already applied", file)
+                self._archive_file(file_path)
+                return None
 
-            if not json_files:
-                logger.info(f"No JSON files found in {self.inbound_folder}.")
-                return workorders
-            
-            for file in json_files:
-                file_path = os.path.join(self.inbound_folder, file)
+            with open(file_path, 'rb') as f:
+                if is_multi_record_file(file_path, f):
+                    return MULTI_RECORD_FILE
+                content = f.read()
+
+            if self.ledger is not None:
+                signature = (stat.st_size, stat.st_mtime_ns, hashlib.sha256(content).hexdigest())
+                applied = self.ledger.get(file_path)
+                if applied is not None and applied[2] == signature[2]:
+                    # Touched or copied again without changes
+                    logger.debug("Skipping {}, content already applied", file)
+                    self.ledger.mark_applied([(file_path, *signature)])
+                    self._archive_file(file_path)
+                    return None
+                self._read_signatures[file_path] = signature
+
+            workorder_data = self.codec.loads(content)
+            logger.debug("Successfully loaded workorder from {}", file)
+            return workorder_data
+        except ValueError as e:
+            logger.error(f"Error decoding JSON from file {file}: {e}")
+        except Exception as e:
+            logger.error(f"Error reading file {file}: {e}")
+        self._read_signatures.pop(file_path, None)
+        return None
+
+    def _archive_file(self, file_path: str) -> None:
+        """Move an applied file to the archive folder with an atomic rename, if archiving is enabled"""
+        if not self.archive_folder:
+            return
+        try:
+            os.makedirs(self.archive_folder, exist_ok=True)
+            os.replace(file_path, os.path.join(self.archive_folder, os.path.basename(file_path)))
+        except OSError as e:
+            logger.error(f"Failed to archive {file_path}: {e}")
+
+    def _iter_file_records(self, file_path: str) -> Iterator[CustomerSystemWorkorder]:
+        """Stream the workorders of an NDJSON or JSON-array file without loading it whole.
+
+        The file is only finished (ledgered and archived) once every workorder read from
+        it was reported through finish_files, and is retried if any of them failed.
+        """
+        file = os.path.basename(file_path)
+        streamed = _StreamedFile()
+        with self._streamed_lock:
+            self._streamed_files[file_path] = streamed
+
+        def _on_error(line_number: int, error: Exception) -> None:
+            logger.error(f"Error decoding JSON from line {line_number} of {file}: {error}")
+            streamed.failed = True
+
+        try:
+            stat = os.stat(file_path)
+            with open(file_path, 'rb') as f:
+                applied = self.ledger.get(file_path) if self.ledger is not None else None
+                if applied is not None:
+                    # Touched or copied again: hash it first so an unchanged export isn't parsed
+                    content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+                    if content_hash == applied[2]:
+                        logger.debug("Skipping {}, content already applied", file)
+                        with self._streamed_lock:
+                            del self._streamed_files[file_path]
+                        self.ledger.mark_applied([(file_path, stat.st_size, stat.st_mtime_ns, content_hash)])
+                        self._archive_file(file_path)
+                        return
+                    f.seek(0)
+
+                hasher = hashlib.sha256()
+                if file_path.endswith(NDJSON_SUFFIXES):
+                    records = iter_ndjson_records(f, self.codec.loads, hasher, _on_error)
+                else:
+                    records = iter_json_array_records(f, hasher)
+
+                record_count = 0
+                for record in records:
+                    with self._streamed_lock:
+                        streamed.outstanding += 1
+                    record_count += 1
+                    yield record
+
+            self._read_signatures[file_path] = (stat.st_size, stat.st_mtime_ns, hasher.hexdigest())
+            logger.debug("Successfully streamed {} workorders from {}", record_count, file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading file {file}: {e}")
+            streamed.failed = True
+
+        with self._streamed_lock:
+            streamed.complete = True
+            if streamed.outstanding:
+                return
+            del self._streamed_files[file_path]
+        # Nothing left to report, e.g. an empty array
+        self._finish(applied_paths=[] if streamed.failed else [file_path], failed_paths=[file_path] if streamed.failed else [])
+
+    def finish_files(self, applied_paths: List[str], failed_paths: Iterable[str] = ()) -> None:
+        """Record applied files in the ledger and archive them; failed files are left to be retried.
+
+        Paths are reported once per workorder. A multi-record file is finished once all of
+        its workorders were reported, and is retried if any of them failed.
+        """
+        applied_files = []
+        failed_files = []
+        with self._streamed_lock:
+            reports = chain(((path, False) for path in applied_paths), ((path, True) for path in failed_paths))
+            for file_path, failed in reports:
+                streamed = self._streamed_files.get(file_path)
+                if streamed is None:
+                    (failed_files if failed else applied_files).append(file_path)
+                    continue
+
+                streamed.outstanding -= 1
+                streamed.failed = streamed.failed or failed
+                if streamed.complete and not streamed.outstanding:
+                    del self._streamed_files[file_path]
+                    (failed_files if streamed.failed else applied_files).append(file_path)
+
+        self._finish(applied_files, failed_files)
+
+    def _finish(self, applied_paths: List[str], failed_paths: List[str]) -> None:
+        for file_path in failed_paths:
+            self._read_signatures.pop(file_path, None)
+
+        entries = []
+        for file_path in applied_paths:
+            signature = self._read_signatures.pop(file_path, None)
+            if signature is not None:
+                entries.append((file_path, *signature))
+
+        # Ledger first: after a crash before the move, the file is skipped and archived next run
+        if self.ledger is not None and entries:
+            self.ledger.mark_applied(entries)
+
+        for file_path in applied_paths:
+            self._archive_file(file_path)
+
+    async def finish_files_async(self, applied_paths: List[str], failed_paths: Iterable[str] = ()) -> None:
+        """Async counterpart of finish_files running on the thread pool"""
+        await self._run_io(self.finish_files, applied_paths, list(failed_paths))
+
+    def iter_workorder_chunks(self, chunk_size: Optional[int] = None) -> Iterator[List[Tuple[str, CustomerSystemWorkorder]]]:
+        """Yield fixed-size chunks of (source path, workorder) pairs while scanning the inbound folder"""
+        chunk_size = chunk_size or self.chunk_size
+        chunk = []
+        try:
+            for file_path in self._scan_inbound_files():
+                workorder = self._read_workorder(file_path)
+                if workorder is None:
+                    continue
+
+                records = self._iter_file_records(file_path) if workorder is MULTI_RECORD_FILE else (workorder,)
+                for record in records:
+                    chunk.append((file_path, record))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        except OSError as e:
+            logger.error(f"Failed to scan {self.inbound_folder}: {e}")
+
+        if chunk:
+            yield chunk
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Lazily create the thread pool used for file I/O"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="customer-io")
+        return self._executor
+
+    async def _run_io(self, func, *args):
+        """Run a blocking file operation on the thread pool, bounded by the concurrency limit"""
+        if self._io_semaphore is None:
+            self._io_semaphore = asyncio.Semaphore(self.io_concurrency)
+
+        async with self._io_semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), partial(func, *args))
+
+    def close(self) -> None:
+        """Shut down the file I/O thread pool and close the ledger"""
+        if self.segment_writer is not None:
+            # Segments still open here were never published, so their records stay unsynced
+            self.segment_writer.abort()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._io_semaphore = None
+        if self.ledger is not None:
+            self.ledger.close()
+        with self._streamed_lock:
+            self._streamed_files.clear()
+
+    async def read_workorder_async(self, file_path: str) -> Optional[CustomerSystemWorkorder]:
+        """Async counterpart of _read_workorder running on the thread pool"""
+        return await self._run_io(self._read_workorder, file_path)
+
+    async def _read_next_chunk(self, file_paths: Iterator[str], chunk_size: int) -> Optional[List[Tuple[str, CustomerSystemWorkorder]]]:
+        """Read the next chunk of files concurrently, returning None once the scan is exhausted"""
+        chunk_paths = await self._run_io(lambda: list(islice(file_paths, chunk_size)))
+        if not chunk_paths:
+            return None
+
+        workorders = await asyncio.gather(*(self.read_workorder_async(path) for path in chunk_paths))
+        return [(path, workorder) for path, workorder in zip(chunk_paths, workorders) if workorder is not None]
+
+    async def aiter_workorder_chunks(
+        self,
+        chunk_size: Optional[int] = None,
+        file_paths: Optional[Iterable[str]] = None
+    ) -> AsyncIterator[List[Tuple[str, CustomerSystemWorkorder]]]:
+        """Async counterpart of iter_workorder_chunks.
+
+        Files are read on the thread pool and the next chunk is prefetched while the
+        caller processes the current one, so disk I/O overlaps with MongoDB writes.
+        file_paths restricts the read to the given files instead of scanning the folder.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        file_paths = iter(file_paths) if file_paths is not None else self._scan_inbound_files()
+        next_chunk = asyncio.ensure_future(self._read_next_chunk(file_paths, chunk_size))
+
+        try:
+            while True:
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        workorder_data = json.load(f)
-                        workorders.append(workorder_data)
-                        logger.debug(f"Successfully loaded workorder from {file}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON from file {file}: {e}")
-                except Exception as e:
-                    logger.error(f"Error reading file {file}: {e}")
-            
-            logger.info(f"Loaded {len(workorders)} workorders from {self.inbound_folder}")
+                    chunk = await next_chunk
+                except OSError as e:
+                    logger.error(f"Failed to scan {self.inbound_folder}: {e}")
+                    return
+
+                if chunk is None:
+                    return
+
+                next_chunk = asyncio.ensure_future(self._read_next_chunk(file_paths, chunk_size))
+                single_records = [(path, workorder) for path, workorder in chunk if workorder is not MULTI_RECORD_FILE]
+                if single_records:
+                    yield single_records
+
+                for path in [path for path, workorder in chunk if workorder is MULTI_RECORD_FILE]:
+                    async for records in self._aiter_file_records(path, chunk_size):
+                        yield records
+        finally:
+            next_chunk.cancel()
+
+    async def _aiter_file_records(self, file_path: str, chunk_size: int) -> AsyncIterator[List[Tuple[str, CustomerSystemWorkorder]]]:
+        """Stream a multi-record file in chunks, reading the next chunk while the caller processes this one"""
+        records = self._iter_file_records(file_path)
+
+        def _read_records() -> List[Tuple[str, CustomerSystemWorkorder]]:
+            return [(file_path, record) for record in islice(records, chunk_size)]
+
+        next_chunk = asyncio.ensure_future(self._run_io(_read_records))
+        try:
+            while True:
+                chunk = await next_chunk
+                if not chunk:
+                    return
+                next_chunk = asyncio.ensure_future(self._run_io(_read_records))
+                yield chunk
+        finally:
+            next_chunk.cancel()
+
+    def get_workorders(self) -> List[CustomerSystemWorkorder]:
+        """Get the workorder and return as a list of dicts"""
+        workorders = [
+            workorder
+            for chunk in self.iter_workorder_chunks()
+            for _, workorder in chunk
+        ]
+
+        if not workorders:
+            logger.info(f"No JSON files found in {self.inbound_folder}.")
             return workorders
-        
-        except Exception as e:
-            logger.error(f"Failed to load workorders: {e}")
-            return []
+
+        logger.info(f"Loaded {len(workorders)} workorders from {self.inbound_folder}")
+        return workorders
+
+    def _write_temp_file(self, workorder: CustomerSystemWorkorder) -> Tuple[str, str]:
+        """Write a workorder under a hidden temporary name, returning (temp path, final path).
+
+        The file is not synced here, so a group can be written before any of it is synced.
+        """
+        file_path = os.path.join(self.outbound_folder, f"workorder_{workorder['orderNo']}.json")
+        temp_path = temp_path_for(file_path)
+        try:
+            content = self.codec.dumps(workorder)
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path, file_path
+
+    def _sync_temp_file(self, temp_path: str) -> None:
+        """fdatasync a written temp file, removing it if that fails"""
+        try:
+            fsync_path(temp_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _publish_files(self, written: List[Tuple[str, str]]) -> List[bool]:
+        """Rename synced temp files into place, then fsync the folder once for all of them.
+
+        Returns whether each file was published; if the folder can't be synced none are.
+        """
+        published = []
+        for temp_path, file_path in written:
+            try:
+                os.replace(temp_path, file_path)
+                published.append(True)
+            except OSError as e:
+                logger.error(f"Failed to publish {file_path}: {e}")
+                published.append(False)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        if self.outbound_fsync and any(published):
+            try:
+                fsync_directory(self.outbound_folder)
+            except OSError as e:
+                logger.error(f"Failed to sync {self.outbound_folder}: {e}")
+                return [False] * len(written)
+        return published
 
     def create_workorder(self, workorder: CustomerSystemWorkorder) -> None:
-        """Create a workorder on outbound folder"""
+        """Create a workorder on outbound folder, replacing any previous version atomically"""
         try:
-            file_path = os.path.join(self.outbound_folder, f"workorder_{workorder['orderNo']}.json")
+            temp_path, file_path = self._write_temp_file(workorder)
+            if self.outbound_fsync:
+                self._sync_temp_file(temp_path)
+            if not self._publish_files([(temp_path, file_path)])[0]:
+                raise OSError(f"Could not publish workorder {workorder['orderNo']}")
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(workorder, f, default=str, indent=4)
-            
-            logger.info(f"Created workorder {workorder['orderNo']} in {self.outbound_folder}")
+            record_log.debug(workorder['orderNo'], "Created in {}", self.outbound_folder)
         
         except Exception as e:
-            logger.error(f"Failed to create workorder {workorder['orderNo']}: {e}")
+            record_log.error(workorder['orderNo'], "Failed to create: {}", e)
             raise e
+
+    async def create_workorder_async(self, workorder: CustomerSystemWorkorder) -> None:
+        """Async counterpart of create_workorder running on the thread pool"""
+        await self._run_io(self.create_workorder, workorder)
+
+    async def create_workorders_async(self, workorders: List[CustomerSystemWorkorder]) -> List[bool]:
+        """Write workorders durably as a group, returning whether each one was written.
+
+        Files are written in parallel under temporary names, then fdatasynced concurrently
+        once the whole group is written, so the filesystem can share journal commits
+        between them. They are renamed into place with a single fsync of the folder, so a
+        crash never leaves a truncated file and a True result means the file is on disk.
+        """
+        results = await asyncio.gather(
+            *(self._run_io(self._write_temp_file, workorder) for workorder in workorders),
+            return_exceptions=True
+        )
+        if self.outbound_fsync:
+            pending = [index for index, result in enumerate(results) if not isinstance(result, Exception)]
+            synced = await asyncio.gather(
+                *(self._run_io(self._sync_temp_file, results[index][0]) for index in pending),
+                return_exceptions=True
+            )
+            for index, result in zip(pending, synced):
+                if isinstance(result, Exception):
+                    results[index] = result
+
+        for workorder, result in zip(workorders, results):
+            if isinstance(result, Exception):
+                record_log.error(workorder.get('orderNo', 'unknown'), "Failed to create: {}", result)
+
+        written = [result for result in results if not isinstance(result, Exception)]
+        published = iter(await self._run_io(self._publish_files, written) if written else [])
+
+        statuses = [False if isinstance(result, Exception) else next(published) for result in results]
+        logger.debug("Created {}/{} workorders in {}", sum(statuses), len(workorders), self.outbound_folder)
+        return statuses
+
+    async def append_to_segments_async(self, workorders: List[CustomerSystemWorkorder], keys: List[Any]) -> List[Any]:
+        """Append workorders to the NDJSON segments, returning the keys of the segments closed meanwhile"""
+        return await self._run_io(self.segment_writer.append_many, workorders, keys)
+
+    async def close_segment_async(self, expired_only: bool = False) -> List[Any]:
+        """Publish the open segment (or only if it reached its maximum age), returning its keys"""
+        if self.segment_writer is None:
+            return []
+        if expired_only:
+            return await self._run_io(self.segment_writer.roll_if_expired)
+        return await self._run_io(self.segment_writer.close)
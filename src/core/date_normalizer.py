@@ -0,0 +1,100 @@
+from typing import Any, Dict, Optional
+from loguru import logger
+import datetime
+import os
+
+
+_UTC = datetime.timezone.utc
+
+
+class DateNormalizer:
+    """Convert the date shapes found in workorders to timezone-aware UTC datetimes.
+
+    Accepts datetimes, ISO 8601 strings and MongoDB {"$date": ...} wrappers; None becomes
+    "". Parsed strings are memoized, since exports repeat the same timestamps many times.
+    The memo is bounded by starting over once it holds cache_size entries, which keeps a
+    hit to a single dict lookup; hits and misses are counted for the metrics.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None):
+        self.cache_size = cache_size if cache_size is not None else int(os.getenv("TRANSLATOR_DATE_CACHE_SIZE", "65536"))
+        self._cache: Dict[str, datetime.datetime] = {}
+        self.hits = 0
+        self.misses = 0
+        self._reported_hits = 0
+        self._reported_misses = 0
+
+    def normalize(self, value: Any) -> Any:
+        """Normalize one date, raising ValueError for anything that isn't one"""
+        if value.__class__ is str:
+            return self._normalize_string(value)
+        if value is None:
+            return ""
+
+        date = value['$date'] if isinstance(value, dict) and '$date' in value else value
+        if isinstance(date, str):
+            return self._normalize_string(date)
+        try:
+            if date.tzinfo is None:
+                return date.replace(tzinfo=_UTC)
+            if date.tzinfo != _UTC:
+                return date.astimezone(_UTC)
+            return date
+        except Exception as e:
+            logger.debug("Failed to convert date {} to ISO 8601 format: {}", date, e)
+            raise ValueError(f"Invalid date format: {date}")
+
+    def _normalize_string(self, date: str) -> datetime.datetime:
+        parsed = self._cache.get(date)
+        if parsed is not None:
+            self.hits += 1
+            return parsed
+
+        try:
+            parsed = self._parse_string(date)
+        except Exception as e:
+            logger.debug("Failed to convert date {} to ISO 8601 format: {}", date, e)
+            raise ValueError(f"Invalid date format: {date}")
+        self.misses += 1
+        if self.cache_size > 0:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[date] = parsed
+        return parsed
+
+    @staticmethod
+    def _parse_string(date: str) -> datetime.datetime:
+        if date.endswith('Z') and 'T' in date:
+            # Canonical UTC timestamps: fromisoformat reads the Z itself and returns timezone.utc
+            try:
+                return datetime.datetime.fromisoformat(date)
+            except ValueError:
+                pass
+
+        parsed = datetime.datetime.fromisoformat(date.replace('Z', '+00:00') if 'T' in date else date)
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo=_UTC)
+        if parsed.tzinfo != _UTC:
+            return parsed.astimezone(_UTC)
+        return parsed
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Cumulative cache statistics of this normalizer"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def drain_counts(self) -> Dict[str, int]:
+        """Cache hits and misses since the previous call, named for the metrics"""
+        counts = {
+            "translator.date_cache.hits": self.hits - self._reported_hits,
+            "translator.date_cache.misses": self.misses - self._reported_misses,
+        }
+        self._reported_hits = self.hits
+        self._reported_misses = self.misses
+        return counts
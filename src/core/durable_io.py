@@ -0,0 +1,40 @@
+from typing import BinaryIO
+import os
+
+
+# fdatasync skips flushing metadata like mtime, which a reader never needs
+_datasync = getattr(os, "fdatasync", os.fsync)
+
+
+def fsync_file(f: BinaryIO) -> None:
+    """Flush a file's buffered data and force it to disk"""
+    f.flush()
+    _datasync(f.fileno())
+
+
+def fsync_path(path: str) -> None:
+    """Force a file that was already written and closed to disk"""
+    # Windows only commits files opened for writing
+    fd = os.open(path, os.O_RDWR)
+    try:
+        _datasync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path: str) -> None:
+    """Force the entries of a directory (e.g. files just renamed into it) to disk"""
+    if os.name == "nt":
+        # Directories can't be opened for fsync on Windows; NTFS journals renames itself
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def temp_path_for(file_path: str) -> str:
+    """Hidden temporary name next to the final path, so the rename stays on one filesystem"""
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.tmp")
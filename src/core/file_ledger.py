@@ -0,0 +1,73 @@
+from typing import Iterable, Optional, Tuple
+from datetime import datetime, timezone
+from loguru import logger
+import os
+import sqlite3
+import threading
+
+
+class ProcessedFileLedger:
+    """On-disk index of inbound files already applied to TracOS.
+
+    Entries are keyed by path and store the size, mtime and content hash of the version
+    that was applied, so an unchanged file can be skipped from a stat() alone.
+    """
+
+    def __init__(self, ledger_path: str):
+        self.ledger_path = ledger_path
+        self._connection = None
+        # Lookups come from the file I/O thread pool
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the ledger database, creating it on first use"""
+        if self._connection is None:
+            directory = os.path.dirname(self.ledger_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._connection = sqlite3.connect(self.ledger_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS processed_files ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " applied_at TEXT NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get(self, path: str) -> Optional[Tuple[int, int, str]]:
+        """Return the (size, mtime_ns, content_hash) applied for a path, if any"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT size, mtime_ns, content_hash FROM processed_files WHERE path = ?",
+                (path,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def is_applied(self, path: str, size: int, mtime_ns: int) -> bool:
+        """Whether this exact version of the file was already applied"""
+        entry = self.get(path)
+        return entry is not None and entry[0] == size and entry[1] == mtime_ns
+
+    def mark_applied(self, entries: Iterable[Tuple[str, int, int, str]]) -> None:
+        """Record (path, size, mtime_ns, content_hash) entries as applied"""
+        applied_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO processed_files (path, size, mtime_ns, content_hash, applied_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(*entry, applied_at) for entry in entries]
+            )
+            connection.commit()
+
+    def close(self) -> None:
+        """Close the ledger database"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                logger.debug(f"Closed processed-file ledger {self.ledger_path}")
@@ -0,0 +1,139 @@
+from typing import Any, BinaryIO, Callable, Iterator, Optional
+import os
+import json
+import codecs
+
+
+# Files holding one workorder (.json) or many: one per line, or a top-level JSON array
+INBOUND_SUFFIXES = ('.json', '.ndjson', '.jsonl')
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+READ_BLOCK_SIZE = 1024 * 1024
+# Largest array element decoded, in characters; MongoDB couldn't store a bigger workorder anyway
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+# A decode error this close to the end of the buffer may be a token cut by the block boundary
+_TOKEN_LOOKAHEAD = 16
+_WHITESPACE = " \t\r\n"
+
+
+def is_inbound_file(path: str) -> bool:
+    """Only complete workorder files count, not hidden or temporary ones"""
+    name = os.path.basename(path)
+    return name.endswith(INBOUND_SUFFIXES) and not name.startswith('.')
+
+
+def is_multi_record_file(path: str, f: BinaryIO) -> bool:
+    """Whether a file holds several workorders, peeking at its first bytes without consuming them"""
+    if path.endswith(NDJSON_SUFFIXES):
+        return True
+    head = f.peek(64)[:64].lstrip(codecs.BOM_UTF8).lstrip(b" \t\r\n")
+    return head[:1] == b"["
+
+
+def iter_ndjson_records(
+    f: BinaryIO,
+    loads: Callable[[bytes], Any],
+    hasher=None,
+    on_error: Optional[Callable[[int, Exception], None]] = None,
+) -> Iterator[Any]:
+    """Yield one record per non-empty line, holding a single line in memory at a time.
+
+    Malformed lines are reported to on_error (or raised) and skipped.
+    """
+    for line_number, line in enumerate(f, 1):
+        if hasher is not None:
+            hasher.update(line)
+        if not line.strip():
+            continue
+        try:
+            yield loads(line)
+        except ValueError as e:
+            if on_error is None:
+                raise
+            on_error(line_number, e)
+
+
+def iter_json_array_records(
+    f: BinaryIO,
+    hasher=None,
+    block_size: int = READ_BLOCK_SIZE,
+    max_record_size: int = MAX_RECORD_SIZE,
+) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array, reading the file block by block.
+
+    Only the current block and the element being decoded are held in memory, and an
+    element is never read past max_record_size characters. Raises ValueError if the file
+    is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def _fill(min_chars: int = 1) -> None:
+        """Append at least min_chars characters (or up to the end of the file) in one copy"""
+        nonlocal buffer, pos, eof
+        parts = []
+        read = 0
+        while read < min_chars and not eof:
+            block = f.read(block_size)
+            if hasher is not None:
+                hasher.update(block)
+            eof = not block
+            part = text_decoder.decode(block, final=eof)
+            parts.append(part)
+            read += len(part)
+        buffer = buffer[pos:] + "".join(parts)
+        pos = 0
+
+    def _next_char() -> str:
+        """Skip whitespace and return the next character, or "" at the end of the file"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos:pos + 1]
+            _fill()
+
+    if _next_char() != "[":
+        raise ValueError("Expected a top-level JSON array")
+    pos += 1
+
+    if _next_char() == "]":
+        pos += 1
+    else:
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                cut_at_boundary = e.pos >= len(buffer) - _TOKEN_LOOKAHEAD or e.msg.startswith("Unterminated string")
+                if eof or not cut_at_boundary:
+                    raise ValueError(f"Malformed array element: {e}") from e
+                pending = len(buffer) - pos
+                if pending > max_record_size:
+                    raise ValueError(f"Array element larger than {max_record_size} characters, or malformed") from e
+                # The element continues in the next blocks; doubling what is pending keeps
+                # the number of decode attempts and copies logarithmic in its size
+                _fill(max(pending, block_size))
+                continue
+            if end == len(buffer) and not eof:
+                # A scalar could continue in the next block, decode it again with more data
+                _fill()
+                continue
+
+            pos = end
+            yield record
+
+            separator = _next_char()
+            pos += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {separator or 'end of file'!r}")
+            _next_char()
+
+    # Reads the rest of the file, so the hasher covers all of it
+    if _next_char() != "":
+        raise ValueError("Unexpected data after the JSON array")
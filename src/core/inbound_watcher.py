@@ -0,0 +1,254 @@
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from itertools import chain
+from src.core.inbound_formats import is_inbound_file
+from loguru import logger
+import os
+import time
+import asyncio
+
+try:
+    # watchdog uses inotify on Linux; without it the watcher polls the folder
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Return (size, mtime_ns) of a file, or None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _InboundEventHandler(FileSystemEventHandler):
+    """Forward watchdog events from the observer thread to the watcher's event loop"""
+
+    def __init__(self, notify, forget):
+        self.notify = notify
+        self.forget = forget
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.notify(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.notify(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.notify(event.src_path)
+
+    def on_moved(self, event):
+        # Producers that write to a temp name and rename show up as moves
+        if not event.is_directory:
+            self.forget(event.src_path)
+            self.notify(event.dest_path)
+
+    def on_deleted(self, event):
+        # Includes files moved out of the folder, e.g. archived ones
+        if not event.is_directory:
+            self.forget(event.src_path)
+
+
+class InboundWatcher:
+    """Watch the inbound folder and group settled files into micro-batches.
+
+    A file is only emitted once its size and mtime stayed unchanged for the debounce
+    period, so partially written files are not picked up. Settled files are emitted when
+    a batch is full or when the oldest one has waited for the batch window. Files whose
+    processing failed are handed back with retry_later() and emitted again after the
+    retry delay.
+    """
+
+    def __init__(self, folder: str, backend: Optional[str] = None):
+        self.folder = folder
+        self.debounce = float(os.getenv("DAEMON_DEBOUNCE_MS", "200")) / 1000
+        self.batch_size = int(os.getenv("DAEMON_BATCH_SIZE", "500"))
+        self.batch_window = float(os.getenv("DAEMON_BATCH_WINDOW_MS", "100")) / 1000
+        self.poll_interval = float(os.getenv("DAEMON_POLL_INTERVAL_MS", "1000")) / 1000
+        # With inotify the folder is still rescanned now and then, to catch missed events
+        self.rescan_interval = float(os.getenv("DAEMON_RESCAN_INTERVAL_MS", "60000")) / 1000
+        self.retry_delay = float(os.getenv("DAEMON_RETRY_DELAY_MS", "5000")) / 1000
+
+        backend = (backend or os.getenv("DAEMON_WATCH_BACKEND", "auto")).lower()
+        if backend == "inotify" and Observer is None:
+            logger.warning("watchdog is not installed, falling back to polling the inbound folder")
+        self.use_events = backend in ("auto", "inotify") and Observer is not None
+
+        # path -> (signature, time of the last change seen)
+        self._pending: Dict[str, Tuple[Optional[Tuple[int, int]], float]] = {}
+        # path -> (signature, time it settled), in settle order
+        self._ready: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        # path -> signature of the version already emitted
+        self._emitted: Dict[str, Tuple[int, int]] = {}
+        # path -> time a failed file is registered again
+        self._deferred: Dict[str, float] = {}
+
+        self._observer = None
+        self._loop = None
+        self._wakeup = None
+        self._stopped = False
+        logger.info(f"InboundWatcher initialized ({'inotify' if self.use_events else 'polling'} backend)")
+
+    def _register(self, path: str) -> None:
+        """Record a new or changed file, restarting its debounce period"""
+        if not is_inbound_file(path) or path in self._deferred:
+            return
+
+        signature = _file_signature(path)
+        if signature is not None and self._emitted.get(path) == signature:
+            return
+
+        self._ready.pop(path, None)
+        self._pending[path] = (signature, time.monotonic())
+        self._wakeup.set()
+
+    def _notify_threadsafe(self, path: str) -> None:
+        """Called from the observer thread"""
+        self._loop.call_soon_threadsafe(self._register, path)
+
+    def _forget_threadsafe(self, path: str) -> None:
+        """Called from the observer thread when a file is deleted or moved away"""
+        self._loop.call_soon_threadsafe(self._forget, path)
+
+    def _forget(self, path: str) -> None:
+        """Drop a file that left the folder, so the emitted index stays bounded"""
+        self._emitted.pop(path, None)
+        self._deferred.pop(path, None)
+
+    def retry_later(self, paths: List[str]) -> None:
+        """Emit files whose processing failed again once the retry delay has passed"""
+        retry_at = time.monotonic() + self.retry_delay
+        for path in paths:
+            self._emitted.pop(path, None)
+            self._deferred[path] = retry_at
+        if paths:
+            logger.warning(f"Retrying {len(paths)} inbound files in {self.retry_delay:.1f}s")
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _release_deferred(self, now: float) -> None:
+        """Register the failed files whose retry delay has passed"""
+        for path, retry_at in list(self._deferred.items()):
+            if now >= retry_at:
+                del self._deferred[path]
+                self._register(path)
+
+    def _poll(self) -> None:
+        """Scan the folder for files that are new or changed since they were emitted"""
+        present = set()
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if not is_inbound_file(entry.path) or not entry.is_file():
+                        continue
+                    present.add(entry.path)
+                    if entry.path in self._pending or entry.path in self._ready or entry.path in self._deferred:
+                        continue
+                    stat = entry.stat()
+                    if self._emitted.get(entry.path) != (stat.st_size, stat.st_mtime_ns):
+                        self._register(entry.path)
+        except OSError as e:
+            logger.error(f"Failed to scan {self.folder}: {e}")
+            return
+
+        # Forget files that were moved away so the emitted index stays bounded
+        for path in [path for path in chain(self._emitted, self._deferred) if path not in present]:
+            self._forget(path)
+
+    def _settle(self, now: float) -> None:
+        """Move files whose debounce period elapsed without changes to the ready set"""
+        for path, (signature, changed_at) in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+
+            current = _file_signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature:
+                self._pending[path] = (current, now)
+            else:
+                del self._pending[path]
+                self._ready[path] = (current, now)
+
+    def _take_batch(self, now: float) -> List[str]:
+        """Return a batch if it is full or its oldest file waited for the whole window"""
+        if not self._ready:
+            return []
+
+        oldest_ready_at = next(iter(self._ready.values()))[1]
+        if len(self._ready) < self.batch_size and now - oldest_ready_at < self.batch_window:
+            return []
+
+        batch = list(self._ready)[:self.batch_size]
+        for path in batch:
+            self._emitted[path] = self._ready.pop(path)[0]
+
+        logger.debug(f"Emitting batch of {len(batch)} inbound files (oldest waited {(now - oldest_ready_at) * 1000:.1f} ms)")
+        return batch
+
+    def _next_timeout(self, now: float, next_poll: Optional[float]) -> Optional[float]:
+        """Time until the next debounce, batch window or poll deadline"""
+        deadlines = [changed_at + self.debounce for _, changed_at in self._pending.values()]
+        if self._ready:
+            deadlines.append(next(iter(self._ready.values()))[1] + self.batch_window)
+        if self._deferred:
+            deadlines.append(min(self._deferred.values()))
+        if next_poll is not None:
+            deadlines.append(next_poll)
+        return max(min(deadlines) - now, 0) if deadlines else None
+
+    def _start(self) -> None:
+        """Start the observer, if available, and pick up files already in the folder"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+
+        if self.use_events:
+            self._observer = Observer()
+            self._observer.schedule(_InboundEventHandler(self._notify_threadsafe, self._forget_threadsafe), self.folder, recursive=False)
+            self._observer.start()
+
+        self._poll()
+
+    def stop(self) -> None:
+        """Stop watching; the batches() iterator finishes on its next wake up"""
+        self._stopped = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def batches(self) -> AsyncIterator[List[str]]:
+        """Yield micro-batches of settled inbound file paths until stop() is called"""
+        self._start()
+        poll_interval = self.rescan_interval if self.use_events else self.poll_interval
+        next_poll = time.monotonic() + poll_interval
+
+        try:
+            while not self._stopped:
+                now = time.monotonic()
+                if now >= next_poll:
+                    self._poll()
+                    next_poll = now + poll_interval
+
+                self._release_deferred(now)
+                self._settle(now)
+                batch = self._take_batch(now)
+                if batch:
+                    yield batch
+                    continue
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_timeout(now, next_poll))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer.join()
+                self._observer = None
@@ -0,0 +1,121 @@
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Union
+from datetime import date, datetime
+from bson import ObjectId
+from loguru import logger
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _encode_default(value: Any) -> Any:
+    """Encode values JSON has no type for: dates as ISO 8601, ObjectId and the rest as strings"""
+    if isinstance(value, Mapping):
+        # Slotted records; orjson and msgspec encode them natively as dataclasses
+        return dict(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+class JsonCodec:
+    """Encode and decode customer workorder files.
+
+    dumps() returns UTF-8 bytes ready to be written, loads() accepts bytes or str and
+    raises ValueError for malformed documents, whatever the backend.
+    """
+
+    name = "stdlib"
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+
+    def dumps(self, obj: Any) -> bytes:
+        if self.compact:
+            return json.dumps(obj, default=_encode_default, separators=(",", ":")).encode("utf-8")
+        return json.dumps(obj, default=_encode_default, indent=4).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson backend; datetimes are encoded natively. Pretty output is indented by 2"""
+
+    name = "orjson"
+
+    def __init__(self, compact: bool = False):
+        super().__init__(compact)
+        self._option = 0 if compact else orjson.OPT_INDENT_2
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_encode_default, option=self._option)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    """msgspec backend; datetimes are encoded natively, with UTC written as Z"""
+
+    name = "msgspec"
+
+    def __init__(self, compact: bool = False):
+        super().__init__(compact)
+        self._encoder = msgspec.json.Encoder(enc_hook=_encode_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        encoded = self._encoder.encode(obj)
+        return encoded if self.compact else msgspec.json.format(encoded, indent=4)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+
+# Backends in order of preference for CUSTOMER_JSON_CODEC=auto
+JSON_CODECS: Dict[str, Callable[[bool], JsonCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "stdlib": JsonCodec,
+}
+
+_AVAILABLE = {"orjson": orjson is not None, "msgspec": msgspec is not None, "stdlib": True}
+
+
+def available_codecs() -> List[str]:
+    """Names of the backends that can be used in this environment"""
+    return [name for name in JSON_CODECS if _AVAILABLE[name]]
+
+
+def get_codec(name: Optional[str] = None, compact: Optional[bool] = None) -> JsonCodec:
+    """Build the configured codec, falling back to the stdlib one if the backend is missing"""
+    name = (name or os.getenv("CUSTOMER_JSON_CODEC", "auto")).lower()
+    if compact is None:
+        compact = os.getenv("CUSTOMER_JSON_COMPACT", "false").lower() == "true"
+
+    if name == "auto":
+        name = available_codecs()[0]
+    elif name not in JSON_CODECS:
+        logger.warning(f"Unknown JSON codec {name!r}, using stdlib json")
+        name = "stdlib"
+    elif not _AVAILABLE[name]:
+        logger.warning(f"JSON codec {name!r} is not installed, using stdlib json")
+        name = "stdlib"
+
+    return JSON_CODECS[name](compact)
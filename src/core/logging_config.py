@@ -0,0 +1,108 @@
+from typing import Any, Iterable, Optional
+from loguru import logger
+import os
+import sys
+import time
+import threading
+
+
+def configure_logging(level: Optional[str] = None, enqueue: Optional[bool] = None) -> None:
+    """Replace loguru's default sink with the configured stderr sink.
+
+    With enqueue, records are handed to a background thread and the caller never
+    blocks on the write; call `await logger.complete()` before exiting to flush them.
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    if enqueue is None:
+        enqueue = os.getenv("LOG_ENQUEUE", "false").lower() == "true"
+
+    logger.remove()
+    logger.add(sys.stderr, level=level, enqueue=enqueue)
+    record_log.reload(level=level)
+
+
+class RecordLog:
+    """Per-workorder log lines, kept off the hot path.
+
+    Every line is prefixed with "[workorder <number>]". Detail lines (debug) are logged
+    at INFO for the numbers listed in LOG_TRACE_WORKORDERS and at DEBUG otherwise.
+    Per-record problems (warning/error) are rate limited to LOG_RECORD_RATE lines per
+    second, except for traced numbers; the dropped ones are counted and reported by flush().
+
+    Messages use loguru's "{}" placeholders, so the arguments are only formatted when a
+    sink accepts the line.
+    """
+
+    def __init__(self, traced: Optional[Iterable[Any]] = None, per_second: Optional[int] = None, level: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.reload(traced, per_second, level)
+
+    def reload(self, traced: Optional[Iterable[Any]] = None, per_second: Optional[int] = None, level: Optional[str] = None) -> None:
+        """Read the traced numbers, rate limit and log level, from the arguments or the environment"""
+        if traced is None:
+            traced = [number.strip() for number in os.getenv("LOG_TRACE_WORKORDERS", "").split(",") if number.strip()]
+        # Compared as strings, since numbers arrive as ints or strings depending on the source
+        self.traced = frozenset(str(number) for number in traced)
+        self.per_second = per_second if per_second is not None else int(os.getenv("LOG_RECORD_RATE", "20"))
+        level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+        # Skips building untraced detail lines entirely unless the sink shows DEBUG
+        self.detail_enabled = logger.level(level).no <= logger.level("DEBUG").no
+        self._window_started_at = 0.0
+        self._window_count = 0
+        self.suppressed = 0
+
+    def is_traced(self, number: Any) -> bool:
+        return bool(self.traced) and str(number) in self.traced
+
+    def debug(self, number: Any, message: str, *args: Any) -> None:
+        """Detail line about one workorder"""
+        if self.traced and str(number) in self.traced:
+            logger.opt(depth=1).info("[workorder {}] " + message, number, *args)
+        elif self.detail_enabled:
+            logger.opt(depth=1).debug("[workorder {}] " + message, number, *args)
+
+    def warning(self, number: Any, message: str, *args: Any) -> None:
+        self._problem("WARNING", number, message, args)
+
+    def error(self, number: Any, message: str, *args: Any) -> None:
+        self._problem("ERROR", number, message, args)
+
+    def _problem(self, level: str, number: Any, message: str, args: tuple) -> None:
+        if not self.is_traced(number) and not self._allow():
+            return
+        logger.opt(depth=2).log(level, "[workorder {}] " + message, number, *args)
+
+    def _allow(self) -> bool:
+        """Whether the current one-second window still has room for a line"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_started_at >= 1.0:
+                self._window_started_at = now
+                self._window_count = 0
+            if self._window_count < self.per_second:
+                self._window_count += 1
+                return True
+            self.suppressed += 1
+            return False
+
+    def flush(self) -> None:
+        """Log how many per-record lines were dropped since the last flush"""
+        with self._lock:
+            suppressed, self.suppressed = self.suppressed, 0
+        if suppressed:
+            logger.warning(f"Suppressed {suppressed} per-record log lines over the {self.per_second}/s limit")
+
+
+# Shared by every component of the process
+record_log = RecordLog()
+
+
+def log_batch(label: str, started_at: float, **counts: int) -> None:
+    """Log one summary line for a batch, then the count of per-record lines it suppressed.
+
+    started_at is a time.monotonic() value; counts are logged in the given order, e.g.
+    log_batch("Inbound chunk", started_at, read=500, failed=2).
+    """
+    summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+    logger.opt(depth=1).info("{}: {} in {:.1f} ms", label, summary, (time.monotonic() - started_at) * 1000)
+    record_log.flush()
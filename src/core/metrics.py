@@ -0,0 +1,63 @@
+from collections import defaultdict
+from typing import Dict, Mapping
+from loguru import logger
+import threading
+
+
+class Metrics:
+    """Process-wide counters, read as one snapshot.
+
+    Counters are named "<component>.<counter>". Pairs named "<prefix>.hits" and
+    "<prefix>.misses" are reported with a derived "<prefix>.hit_rate". Components that
+    count in a hot loop keep local counts and add them here once per batch.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def add(self, counts: Mapping[str, int]) -> None:
+        """Add several counters at once, e.g. the counts a worker process returned"""
+        with self._lock:
+            for name, value in counts.items():
+                if value:
+                    self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current counters plus the hit rate of every hits/misses pair"""
+        with self._lock:
+            values: Dict[str, float] = dict(self._counters)
+
+        for name in list(values):
+            if name.endswith(".hits"):
+                prefix = name[:-len(".hits")]
+                lookups = values[name] + values.get(f"{prefix}.misses", 0)
+                values[f"{prefix}.hit_rate"] = values[name] / lookups if lookups else 0.0
+        return dict(sorted(values.items()))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+    def log_summary(self) -> None:
+        """Log every metric on one line"""
+        values = self.snapshot()
+        if not values:
+            return
+        summary = ", ".join(
+            f"{name}={value:.1%}" if name.endswith(".hit_rate") else f"{name}={value}"
+            for name, value in values.items()
+        )
+        logger.info(f"Metrics: {summary}")
+
+
+# Shared by every component of the process
+metrics = Metrics()
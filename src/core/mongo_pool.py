@@ -0,0 +1,83 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from typing import Optional, Set, Tuple
+from loguru import logger
+import os
+import asyncio
+
+
+class MongoClientPool:
+    """Single MongoDB client shared by every TracOsHandler of the process.
+
+    The client (and its connection pool) is created lazily on first use, warmed up
+    once, and only closed when the owner of the pool calls close().
+    """
+
+    def __init__(self):
+        self.mongo_db_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+        self.max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+        self.min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+        self.max_idle_time_ms = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+        self.connect_timeout_ms = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+        self.server_selection_timeout_ms = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+
+        self.client_factory = AsyncIOMotorClient
+        self.client = None
+        # (database, collection) pairs whose indexes were already ensured by a handler
+        self.bootstrapped: Set[Tuple[str, str]] = set()
+        self._lock = None
+        logger.info("MongoClientPool module initialized")
+
+    def _create_client(self):
+        """Create the client with the configured pool options"""
+        return self.client_factory(
+            self.mongo_db_uri,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=self.min_pool_size,
+            maxIdleTimeMS=self.max_idle_time_ms,
+            connectTimeoutMS=self.connect_timeout_ms,
+            serverSelectionTimeoutMS=self.server_selection_timeout_ms,
+        )
+
+    async def warm_up(self) -> None:
+        """Ping the server and open minPoolSize connections up front"""
+        await self.client.admin.command('ping')
+
+        # Concurrent pings force the driver to establish that many sockets now
+        if self.min_pool_size > 1:
+            await asyncio.gather(*(self.client.admin.command('ping') for _ in range(self.min_pool_size)))
+
+        logger.info(f"Connected to MongoDB at {self.mongo_db_uri} (pool size {self.min_pool_size}-{self.max_pool_size})")
+
+    async def get_client(self):
+        """Return the shared client, creating and warming it up on first use"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self.client is None:
+                client = self._create_client()
+                self.client = client
+                try:
+                    await self.warm_up()
+                except Exception:
+                    self.client = None
+                    client.close()
+                    raise
+            return self.client
+
+    async def reconnect(self, failed_client: Optional[AsyncIOMotorClient] = None):
+        """Replace the shared client, unless another handler already replaced failed_client"""
+        if failed_client is not None and failed_client is not self.client:
+            return await self.get_client()
+
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        return await self.get_client()
+
+    def close(self) -> None:
+        """Close the shared client and its connection pool"""
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            logger.info("Closed MongoDB client pool")
@@ -0,0 +1,87 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+
+class _RecordMapping(Mapping):
+    """Read-only mapping view over the fields of a slotted record.
+
+    Lets records stand in wherever the pipeline used the TypedDict workorders:
+    record["number"], record.get("status"), dict(record) and comparisons with dicts.
+    """
+
+    __slots__ = ()
+    _keys: tuple = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+
+# eq=False keeps Mapping equality, so a record compares equal to the dict it replaced
+@dataclass(slots=True, eq=False)
+class TracOSRecord(_RecordMapping):
+    """TracOS workorder as it flows through the pipeline"""
+
+    _id: Any
+    number: int
+    status: str
+    title: str
+    description: str
+    createdAt: Any
+    updatedAt: Any
+    deleted: bool
+    deletedAt: Optional[datetime] = None
+    isSynced: bool = False
+    # Document version when read, kept out of the mapping view so it is never exported
+    version: Optional[int] = None
+
+    @classmethod
+    def from_document(cls, doc: Mapping) -> "TracOSRecord":
+        """Build a record straight from a MongoDB document, ignoring bookkeeping fields"""
+        return cls(
+            doc["_id"],
+            doc["number"],
+            doc["status"],
+            doc["title"],
+            doc["description"],
+            doc["createdAt"],
+            doc["updatedAt"],
+            doc["deleted"],
+            doc.get("deletedAt"),
+            doc.get("isSynced", False),
+            doc.get("version"),
+        )
+
+
+@dataclass(slots=True, eq=False)
+class CustomerRecord(_RecordMapping):
+    """Customer workorder as produced by the translator and written to outbound files"""
+
+    orderNo: int
+    isActive: bool
+    isCanceled: bool
+    isDeleted: bool
+    isDone: bool
+    isOnHold: bool
+    isPending: bool
+    isSynced: bool
+    summary: str
+    creationDate: Any
+    lastUpdateDate: Any
+    deletedDate: Any = None
+
+
+TracOSRecord._keys = tuple(field.name for field in fields(TracOSRecord) if field.name != "version")
+CustomerRecord._keys = tuple(field.name for field in fields(CustomerRecord))
@@ -0,0 +1,223 @@
+from typing import Any, Awaitable, Callable, Optional
+from bson.errors import BSONError
+from pymongo.errors import (
+    BulkWriteError,
+    ConfigurationError,
+    ConnectionFailure,
+    DocumentTooLarge,
+    ExecutionTimeout,
+    InvalidOperation,
+    NotPrimaryError,
+    OperationFailure,
+    PyMongoError,
+    WTimeoutError,
+)
+from src.core.metrics import metrics
+from loguru import logger
+import os
+import time
+import random
+import asyncio
+
+
+# How an error is handled
+TRANSIENT = "transient"      # retry after a backoff
+CONNECTION = "connection"    # retry after a backoff and a reconnect; counts towards opening the circuit
+PERMANENT = "permanent"      # the same request will fail again, raise at once
+
+# Server error codes worth retrying: network, failover, shutdown and shard routing errors
+RETRYABLE_CODES = frozenset({
+    6,      # HostUnreachable
+    7,      # HostNotFound
+    43,     # CursorNotFound, the cursor is reopened
+    89,     # NetworkTimeout
+    91,     # ShutdownInProgress
+    112,    # WriteConflict
+    133,    # FailedToSatisfyReadPreference
+    189,    # PrimarySteppedDown
+    262,    # ExceededTimeLimit
+    9001,   # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+    63,     # StaleShardVersion
+    150,    # StaleEpoch
+    13388,  # StaleConfig
+})
+
+RETRYABLE_LABELS = ("RetryableWriteError", "TransientTransactionError", "ResumableChangeStreamError")
+
+
+def classify_error(error: BaseException) -> str:
+    """Sort an error into TRANSIENT, CONNECTION or PERMANENT by its type, code and labels"""
+    if isinstance(error, PyMongoError) and any(error.has_error_label(label) for label in RETRYABLE_LABELS):
+        return TRANSIENT
+    if isinstance(error, (NotPrimaryError, ExecutionTimeout, WTimeoutError)):
+        # Failover or a slow server, the driver finds the new primary by itself
+        return TRANSIENT
+    if isinstance(error, ConnectionFailure):
+        # AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError, ...
+        return CONNECTION
+    if isinstance(error, BulkWriteError):
+        write_errors = error.details.get("writeErrors", [])
+        if write_errors and all(item.get("code") not in RETRYABLE_CODES for item in write_errors):
+            return PERMANENT
+        return TRANSIENT
+    if isinstance(error, OperationFailure):
+        # Duplicate keys, validation failures, bad updates, authorization...
+        return TRANSIENT if error.code in RETRYABLE_CODES else PERMANENT
+    if isinstance(error, (DocumentTooLarge, InvalidOperation, ConfigurationError, BSONError)):
+        return PERMANENT
+    if isinstance(error, (ValueError, TypeError, KeyError, AttributeError)):
+        # Bad data or a bug, retrying won't change the outcome
+        return PERMANENT
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return CONNECTION
+    return TRANSIENT
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling MongoDB while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fail fast across every operation once MongoDB looks down.
+
+    After failure_threshold consecutive connection errors the circuit opens and calls
+    are rejected for reset_timeout seconds. Then a single probe call is let through:
+    success closes the circuit, another connection error opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv("MONGO_CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(os.getenv("MONGO_CIRCUIT_RESET_S", "30"))
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may go to MongoDB"""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        metrics.increment("mongo.circuit.rejected")
+        raise CircuitOpenError("MongoDB circuit breaker is open, failing fast")
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("MongoDB circuit breaker closed")
+            self.reset()
+        elif self.failures:
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Count a connection error, opening the circuit at the threshold or after a failed probe"""
+        self._probing = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            metrics.increment("mongo.circuit.opened")
+            logger.error(f"MongoDB circuit breaker opened after {self.failures} connection failures, failing fast for {self.reset_timeout:.0f}s")
+
+    def release_probe(self) -> None:
+        """Let another call probe the server, when the probe ended without a verdict"""
+        self._probing = False
+
+
+# Shared by every handler of the process, so concurrent operations fail fast together
+mongo_circuit_breaker = CircuitBreaker()
+
+
+class RetryPolicy:
+    """Run MongoDB operations with error classification, capped exponential backoff and
+    full jitter, behind the shared circuit breaker.
+
+    Counters: mongo.retries, mongo.retries_exhausted, mongo.permanent_errors,
+    mongo.circuit.opened and mongo.circuit.rejected.
+    """
+
+    def __init__(
+        self,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("MONGO_MAX_RETRIES", "3"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("MONGO_RETRY_DELAY", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("MONGO_RETRY_MAX_DELAY", "10.0"))
+        self.breaker = breaker or mongo_circuit_breaker
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number attempt (from 0): uniform up to base * 2^attempt, capped"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(
+        self,
+        operation: Callable[..., Awaitable[Any]],
+        *args: Any,
+        on_connection_error: Optional[Callable[[], Awaitable[Any]]] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Await operation(*args, **kwargs), retrying it as its errors allow.
+
+        on_connection_error is awaited after the backoff of a connection error, e.g. to
+        reconnect the client.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await operation(*args, **kwargs)
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == CONNECTION:
+                    self.breaker.record_failure()
+                elif kind == PERMANENT:
+                    # The server answered, so it is up
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release_probe()
+
+                if kind == PERMANENT:
+                    metrics.increment("mongo.permanent_errors")
+                    logger.error(f"MongoDB operation failed with a non-retryable error: {e}")
+                    raise
+                if attempt >= self.max_retries:
+                    metrics.increment("mongo.retries_exhausted")
+                    logger.error(f"MongoDB operation failed after {attempt + 1} attempts: {e}")
+                    raise
+
+                delay = self.backoff(attempt)
+                attempt += 1
+                metrics.increment("mongo.retries")
+                logger.warning(f"MongoDB operation failed ({kind}, attempt {attempt}/{self.max_retries + 1}), retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+
+                if kind == CONNECTION and on_connection_error is not None:
+                    try:
+                        await on_connection_error()
+                    except Exception:
+                        # The next attempt fails and is counted like any other
+                        pass
+            else:
+                self.breaker.record_success()
+                return result
@@ -0,0 +1,183 @@
+from typing import Any, Iterable, List, Optional
+from datetime import datetime, timezone
+from src.core.json_codec import JsonCodec
+from src.core.durable_io import fsync_directory, fsync_file, temp_path_for
+from loguru import logger
+import os
+import time
+import threading
+
+
+SEGMENT_SUFFIX = ".ndjson"
+# Each segment gets an index file named after it, <segment>.manifest, holding one JSON line
+MANIFEST_SUFFIX = ".manifest"
+
+
+class NdjsonSegmentWriter:
+    """Append outbound workorders to rolling NDJSON segment files.
+
+    A segment is written under a hidden temporary name and renamed into place when it
+    is closed, after reaching the record count, size or age limit. Every closed segment
+    then gets its own manifest next to it, listing the orderNos it contains, written
+    the same way; closing a segment costs the same however many were closed before.
+
+    Each record is appended with a key (the TracOS _id); closing a segment returns the
+    keys of its records, which are only then safe to mark as synced.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        codec: JsonCodec,
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        fsync: bool = True,
+    ):
+        self.folder = folder
+        self.codec = codec
+        self.max_records = max_records or int(os.getenv("OUTBOUND_SEGMENT_MAX_RECORDS", "10000"))
+        self.max_bytes = max_bytes or int(os.getenv("OUTBOUND_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.max_age = max_age if max_age is not None else float(os.getenv("OUTBOUND_SEGMENT_MAX_AGE_S", "60"))
+        self.fsync = fsync
+
+        self._file = None
+        self._name = None
+        self._temp_path = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._order_nos: List[Any] = []
+        self._keys: List[Any] = []
+        self._sequence = 0
+        # Appends come from the file I/O thread pool
+        self._lock = threading.Lock()
+
+    @property
+    def pending_count(self) -> int:
+        """Records in the open segment, not visible to the customer yet"""
+        return len(self._keys)
+
+    def _open(self) -> None:
+        """Start a new segment under its temporary name"""
+        os.makedirs(self.folder, exist_ok=True)
+        self._sequence += 1
+        opened_at = datetime.now(timezone.utc)
+        self._name = f"workorders_{opened_at:%Y%m%dT%H%M%S%fZ}_{os.getpid()}_{self._sequence:06d}{SEGMENT_SUFFIX}"
+        self._temp_path = os.path.join(self.folder, f".{self._name}.tmp")
+        self._file = open(self._temp_path, "wb")
+        self._opened_at = time.monotonic()
+        self._size = 0
+
+    def _reset(self) -> List[Any]:
+        """Forget the open segment, returning the keys it held"""
+        keys = self._keys
+        self._file = None
+        self._name = None
+        self._temp_path = None
+        self._order_nos = []
+        self._keys = []
+        return keys
+
+    def _expired(self) -> bool:
+        return self._file is not None and self.max_age > 0 and time.monotonic() - self._opened_at >= self.max_age
+
+    def _close(self) -> List[Any]:
+        """Publish the open segment with an atomic rename and record it in the manifest"""
+        if self._file is None:
+            return []
+
+        if self.fsync:
+            fsync_file(self._file)
+        self._file.close()
+        os.replace(self._temp_path, os.path.join(self.folder, self._name))
+
+        entry = {
+            "segment": self._name,
+            "records": len(self._order_nos),
+            "bytes": self._size,
+            "orderNos": self._order_nos,
+            "closedAt": datetime.now(timezone.utc),
+        }
+        # Written after the segment, so a manifest always points at a published segment
+        self._write_manifest(os.path.join(self.folder, f"{self._name}{MANIFEST_SUFFIX}"), self.codec.dumps(entry) + b"\n")
+        if self.fsync:
+            # Persists both renames before the records are marked as synced
+            fsync_directory(self.folder)
+
+        logger.info(f"Closed outbound segment {self._name} with {len(self._order_nos)} workorders ({self._size} bytes)")
+        return self._reset()
+
+    def _write_manifest(self, manifest_path: str, content: bytes) -> None:
+        """Write a segment's manifest under a temporary name and rename it into place"""
+        temp_path = temp_path_for(manifest_path)
+        try:
+            with open(temp_path, "wb") as manifest:
+                manifest.write(content)
+                if self.fsync:
+                    fsync_file(manifest)
+            os.replace(temp_path, manifest_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _abort(self) -> None:
+        """Drop the open segment; its records were never marked as synced"""
+        if self._file is None:
+            return
+        logger.warning(f"Discarding outbound segment {self._name} with {len(self._keys)} unpublished workorders")
+        try:
+            self._file.close()
+            os.remove(self._temp_path)
+        except OSError as e:
+            logger.error(f"Failed to remove {self._temp_path}: {e}")
+        self._reset()
+
+    def append_many(self, records: Iterable[dict], keys: Iterable[Any]) -> List[Any]:
+        """Append records, returning the keys of every segment closed meanwhile.
+
+        If a write fails the open segment is discarded and the error is raised.
+        """
+        closed_keys = []
+        with self._lock:
+            try:
+                for record, key in zip(records, keys):
+                    line = self.codec.dumps(record) + b"\n"
+                    if self._expired() or (self._keys and self._size + len(line) > self.max_bytes):
+                        closed_keys.extend(self._close())
+                    if self._file is None:
+                        self._open()
+
+                    self._file.write(line)
+                    self._size += len(line)
+                    self._order_nos.append(record.get("orderNo"))
+                    self._keys.append(key)
+
+                    if len(self._keys) >= self.max_records:
+                        closed_keys.extend(self._close())
+            except Exception:
+                self._abort()
+                raise
+        return closed_keys
+
+    def _close_or_abort(self) -> List[Any]:
+        try:
+            return self._close()
+        except Exception:
+            self._abort()
+            raise
+
+    def roll_if_expired(self) -> List[Any]:
+        """Close the open segment if it reached its maximum age"""
+        with self._lock:
+            return self._close_or_abort() if self._expired() else []
+
+    def close(self) -> List[Any]:
+        """Close the open segment, if any, returning the keys of its records"""
+        with self._lock:
+            return self._close_or_abort()
+
+    def abort(self) -> None:
+        """Discard the open segment, if any"""
+        with self._lock:
+            self._abort()
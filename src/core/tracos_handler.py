@@ -1,58 +1,136 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 from setup import TracOSWorkorder
-from typing import List, Dict, Any
+from src.core.mongo_pool import MongoClientPool
+from src.core.records import TracOSRecord
+from src.core.logging_config import record_log
+from src.core.retry_policy import RetryPolicy
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from collections import defaultdict
 from datetime import datetime, timezone
 from loguru import logger
 import os
-import asyncio
+import json
+import hashlib
+
+
+# Writes through the handler always set isSynced, but TracOS or setup.py may insert
+# workorders without it; those are unsynced too. null matches the missing field and
+# both values are point ranges of the index below, so this is never a collection scan.
+# The index also carries _id so the streaming cursor can sort and resume on it
+UNSYNCED_QUERY = {"isSynced": {"$in": [False, None]}}
+
+WORKORDER_INDEXES = [
+    {"keys": [("number", 1)], "name": "number_unique", "unique": True},
+    # Not partial: a partial filter can't select documents missing a field
+    {"keys": [("isSynced", 1), ("_id", 1)], "name": "is_synced_id"},
+    # Keyset pagination of the incremental outbound scan
+    {"keys": [("updatedAt", 1), ("_id", 1)], "name": "updated_at_id"},
+]
+
+# Indexes replaced by the ones above, dropped by ensure_indexes
+OBSOLETE_INDEXES = ["unsynced_partial"]
+
+# Inserts and updates that leave a workorder unsynced. With updateLookup the match
+# runs on the current document, so changes that were already exported are dropped,
+# and so are customer-origin writes, which never set isSynced=False. Updates of a
+# document deleted since have no fullDocument and are dropped as well
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {
+        "operationType": {"$in": ["insert", "update", "replace"]},
+        "fullDocument._id": {"$exists": True},
+        "fullDocument.isSynced": UNSYNCED_QUERY["isSynced"],
+    }}
+]
+
+# InvalidResumeToken, ChangeStreamFatalError and ChangeStreamHistoryLost
+RESUME_TOKEN_LOST_CODES = {260, 280, 286}
+
+
+# Where the last change written through the handler came from. Customer changes are
+# already known to the customer, so they never put a synced workorder back in the
+# outbound backlog; only TracOS-side changes (isSynced=False) are exported
+ORIGIN_CUSTOMER = "customer"
+ORIGIN_TRACOS = "tracos"
+
+# Bookkeeping fields written by the sync itself, not part of the workorder content
+SYNC_METADATA_FIELDS = frozenset({"_id", "isSynced", "syncedAt", "ingestedAt", "contentHash", "origin", "version"})
+
+
+def _normalize_value(value: Any) -> Any:
+    """Bring datetimes to the form MongoDB returns them in: UTC, millisecond precision"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.astimezone(timezone.utc)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+def workorder_content(workorder: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the workorder fields that make up its content, normalized for comparison"""
+    return {key: _normalize_value(value) for key, value in workorder.items() if key not in SYNC_METADATA_FIELDS}
+
+
+def content_fingerprint(content: Dict[str, Any]) -> str:
+    """Stable hash of normalized workorder content, independent of key order"""
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _utc_now_ms() -> datetime:
+    """Current UTC time truncated to the millisecond precision MongoDB stores"""
+    utc_time = datetime.now(timezone.utc)
+    return utc_time.replace(microsecond=utc_time.microsecond // 1000 * 1000)
 
 
 class TracOsHandler:
-    def __init__(self):
+    def __init__(self, mongo_pool: Optional[MongoClientPool] = None):
         self.mongo_db_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
         self.db_name = os.getenv("MONGO_DATABASE", "tractian")
         self.collection_name = os.getenv("MONGO_COLLECTION", "workorders")
         
-        self.max_retries = int(os.getenv("MONGO_MAX_RETRIES", "3"))
-        self.retry_delay = float(os.getenv("MONGO_RETRY_DELAY", "1.0"))
+        self.retry_policy = RetryPolicy()
+        self.bulk_batch_size = int(os.getenv("MONGO_BULK_BATCH_SIZE", "1000"))
+        self.sync_batch_size = int(os.getenv("MONGO_SYNC_BATCH_SIZE", "500"))
+        self.cursor_batch_size = int(os.getenv("MONGO_CURSOR_BATCH_SIZE", "500"))
+        self.ensure_indexes_on_connect = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+        self.index_dry_run = os.getenv("MONGO_INDEX_DRY_RUN", "false").lower() == "true"
+        self._indexes_ensured = False
+        self.state_collection_name = os.getenv("MONGO_STATE_COLLECTION", "sync_state")
+        self.change_stream_batch_size = int(os.getenv("MONGO_CHANGE_STREAM_BATCH_SIZE", "500"))
+        self.change_stream_max_await_ms = int(os.getenv("MONGO_CHANGE_STREAM_MAX_AWAIT_MS", "1000"))
         
+        self.mongo_pool = mongo_pool
         self.client = None
         self.db = None
         self.collection = None
         logger.info("TracOsHandler module initialized")
 
     async def _retry_operation(self, operation, *args, **kwargs):
-        """Generic retry wrapper for MongoDB operations"""
-        last_exception = None   # Store the last exception to raise if all retries fail
-        
-        for attempt in range(self.max_retries + 1):
-            try:
-                return await operation(*args, **kwargs)
-            except Exception as e:
-                last_exception = e
-                if attempt < self.max_retries:
-                    logger.warning(f"MongoDB operation failed (attempt {attempt + 1}/{self.max_retries + 1}): {e}")
-                    await asyncio.sleep(self.retry_delay)   # Sleep before retrying
-                    
-                    # Try to reconnect on connection errors
-                    if "connection" in str(e).lower():
-                        await self._reconnect()
-                    
-                    # TODO: Implement immediate fail for critical errors
-                else:
-                    logger.error(f"MongoDB operation failed after {self.max_retries + 1} attempts: {e}")
-        
-        raise last_exception
+        """Run a MongoDB operation under the retry policy, reconnecting after connection errors"""
+        return await self.retry_policy.run(operation, *args, on_connection_error=self._reconnect, **kwargs)
+
+    def _bind_client(self, client) -> None:
+        """Point the handler at the database and collection of a client"""
+        self.client = client
+        self.db = self.client[self.db_name]
+        self.collection = self.db[self.collection_name]
 
     async def _reconnect(self):
         """Attempt to reconnect to MongoDB"""
         try:
+            if self.mongo_pool is not None:
+                # The pool only replaces the client once, even if several handlers hit the failure
+                self._bind_client(await self.mongo_pool.reconnect(self.client))
+                logger.info("Successfully reconnected to MongoDB")
+                return
+
             if self.client:
                 self.client.close()
             
-            self.client = AsyncIOMotorClient(self.mongo_db_uri)
-            self.db = self.client[self.db_name]
-            self.collection = self.db[self.collection_name]
+            self._bind_client(AsyncIOMotorClient(self.mongo_db_uri))
             await self.client.admin.command('ping')
             logger.info("Successfully reconnected to MongoDB")
 
@@ -65,56 +143,123 @@ class TracOsHandler:
         # Skip connection if client is already set (for testing)
         if self.client is not None:
             logger.info("Using pre-configured MongoDB client (test mode)")
-            return
-        
-        async def _connect_operation():
-            self.client = AsyncIOMotorClient(self.mongo_db_uri)
-            self.db = self.client[self.db_name]
-            self.collection = self.db[self.collection_name]
-            await self.client.admin.command('ping')
-            logger.info(f"Connected to MongoDB at {self.mongo_db_uri}")
-        
-        await self._retry_operation(_connect_operation)
+        elif self.mongo_pool is not None:
+            async def _acquire_operation():
+                self._bind_client(await self.mongo_pool.get_client())
+
+            await self._retry_operation(_acquire_operation)
+        else:
+            async def _connect_operation():
+                self._bind_client(AsyncIOMotorClient(self.mongo_db_uri))
+                await self.client.admin.command('ping')
+                logger.info(f"Connected to MongoDB at {self.mongo_db_uri}")
+
+            await self._retry_operation(_connect_operation)
+
+        if self.ensure_indexes_on_connect and not self._indexes_ensured:
+            if self.mongo_pool is not None and (self.db_name, self.collection_name) in self.mongo_pool.bootstrapped:
+                self._indexes_ensured = True
+            else:
+                await self.ensure_indexes(dry_run=self.index_dry_run)
+
+    async def ensure_indexes(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Create the workorder indexes, drop the obsolete ones and normalize documents missing isSynced.
+
+        In dry-run mode nothing is written; the missing and obsolete indexes and the
+        explain() plan of each query are reported instead.
+        """
+        existing = await self.collection.index_information()
+        missing = [index for index in WORKORDER_INDEXES if index["name"] not in existing]
+        obsolete = [name for name in OBSOLETE_INDEXES if name in existing]
+
+        if dry_run:
+            report = {
+                "missing_indexes": [index["name"] for index in missing],
+                "obsolete_indexes": obsolete,
+                "plans": await self.explain_queries(),
+            }
+            logger.info(f"Index dry run for {self.collection_name}: {report}")
+            return report
+
+        for index in missing:
+            options = {key: value for key, value in index.items() if key != "keys"}
+            try:
+                await self.collection.create_index(index["keys"], **options)
+                logger.info(f"Created index {index['name']} on {self.collection_name}")
+            except Exception as e:
+                logger.error(f"Failed to create index {index['name']} on {self.collection_name}: {e}")
+        for name in obsolete:
+            try:
+                await self.collection.drop_index(name)
+                logger.info(f"Dropped obsolete index {name} on {self.collection_name}")
+            except Exception as e:
+                logger.error(f"Failed to drop index {name} on {self.collection_name}: {e}")
+
+        await self.backfill_is_synced()
+
+        self._indexes_ensured = True
+        if self.mongo_pool is not None:
+            self.mongo_pool.bootstrapped.add((self.db_name, self.collection_name))
+        return {"created_indexes": [index["name"] for index in missing], "dropped_indexes": obsolete}
+
+    async def backfill_is_synced(self) -> int:
+        """Set isSynced=False on workorders missing the flag, returning how many were changed.
+
+        Only a normalization: the unsynced queries already match the missing flag. The
+        null lookup is served by the is_synced_id index, so it is cheap on every connect.
+        """
+        # Documents written by other producers may lack the flag entirely
+        result = await self.collection.update_many(
+            {"isSynced": None},
+            {"$set": {"isSynced": False}}
+        )
+        if result.modified_count:
+            logger.info(f"Normalized isSynced=False on {result.modified_count} workorders")
+        return result.modified_count
+
+    async def explain_queries(self) -> Dict[str, Any]:
+        """Return the winning explain() plan for each query the handler issues"""
+        queries = {
+            "get_unsynced_workorders": (UNSYNCED_QUERY, [("_id", 1)]),
+            "create_workorder": ({"number": 0}, None),
+            "iter_changed_workorder_pages": (
+                {**UNSYNCED_QUERY, **self._after_checkpoint({"updatedAt": datetime.now(timezone.utc), "_id": None})},
+                [("updatedAt", 1), ("_id", 1)],
+            ),
+        }
+
+        plans = {}
+        for name, (query, sort) in queries.items():
+            try:
+                cursor = self.collection.find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                explanation = await cursor.explain()
+                plans[name] = explanation.get("queryPlanner", {}).get("winningPlan", explanation)
+            except Exception as e:
+                logger.warning(f"Could not explain query {name}: {e}")
+                plans[name] = None
+        return plans
 
     async def disconnect(self) -> None:
         """Disconnect from MongoDB"""
-        if self.client:
+        if self.client and self.mongo_pool is not None and self.client is self.mongo_pool.client:
+            # The shared client outlives the handler, only the pool owner closes it
+            self.client = self.db = self.collection = None
+            logger.info("Released shared MongoDB client")
+        elif self.client:
             self.client.close()
             logger.info("Disconnected from MongoDB")
 
-    def parse_data(self, doc: Dict[str, Any]) -> TracOSWorkorder:
-        """Parse MongoDB document into TracOSWorkorder object"""
-        
-        workorder = TracOSWorkorder(
-            _id=doc["_id"],
-            number=doc["number"],
-            status=doc["status"],
-            title=doc["title"],
-            description=doc["description"],
-            createdAt=doc["createdAt"],
-            updatedAt=doc["updatedAt"],
-            deleted=doc["deleted"],
-            deletedAt=doc.get("deletedAt")
-        )
-        
-        # Convert to dictionary to add the isSynced field
-        workorder_dict = dict(workorder)
-            
-        return workorder_dict
+    def parse_data(self, doc: Dict[str, Any]) -> TracOSRecord:
+        """Parse MongoDB document into a slotted TracOSRecord, without an intermediate dict"""
+        return TracOSRecord.from_document(doc)
 
-    async def get_unsynced_workorders(self) -> List[TracOSWorkorder]:
+    async def get_unsynced_workorders(self) -> List[TracOSRecord]:
         """Read workorders from MongoDB that need to be synced with retry logic"""
         
         async def _get_operation():
-            # Query for records that either have isSynced=False OR don't have the field
-            query = {
-                "$or": [
-                    {"isSynced": False},
-                    {"isSynced": {"$exists": False}}
-                ]
-            }
-            
-            cursor = self.collection.find(query)
+            cursor = self.collection.find(UNSYNCED_QUERY)
             workorders = []
 
             async for doc in cursor:
@@ -126,29 +271,71 @@ class TracOsHandler:
         
         return await self._retry_operation(_get_operation)
 
-    async def create_workorder(self, workorder: TracOSWorkorder) -> None:
-        """Write workorder to MongoDB with retry logic"""
-        
-        async def _create_operation():
-            workorder_dict = dict(workorder)
-            
-            existing_doc = await self.collection.find_one({"number": workorder_dict["number"]})
-            
-            if existing_doc:
-                original_id = existing_doc["_id"]
-                if "_id" in workorder_dict:
-                    del workorder_dict["_id"]
-                    
-                result = await self.collection.update_one(
-                    {"_id": original_id},
-                    {"$set": workorder_dict}
-                )
-                logger.info(f"Workorder with number {workorder_dict['number']} updated successfully")
-            else:
-                result = await self.collection.insert_one(workorder_dict)
-                logger.info(f"New workorder created with ID: {result.inserted_id}")
-        
-        await self._retry_operation(_create_operation)
+    async def iter_unsynced_workorders(
+        self,
+        batch_size: Optional[int] = None,
+        ingested_before: Optional[datetime] = None,
+        updated_before: Optional[datetime] = None
+    ) -> AsyncIterator[TracOSRecord]:
+        """Yield unsynced workorders lazily from a batched cursor.
+
+        The cursor is sorted on _id, so after a failure it is reopened past the last
+        yielded document instead of starting over. When ingested_before is given,
+        workorders written by the inbound flow at or after that time are skipped; when
+        updated_before is given, only workorders updated before it (or never) are read.
+        """
+        batch_size = batch_size or self.cursor_batch_size
+        base_query = dict(UNSYNCED_QUERY)
+        if ingested_before is not None:
+            # Truncate like MongoDB does, so writes in the same millisecond stay excluded
+            cutoff = ingested_before.replace(microsecond=ingested_before.microsecond // 1000 * 1000)
+            base_query["ingestedAt"] = {"$not": {"$gte": cutoff}}
+        if updated_before is not None:
+            base_query["updatedAt"] = {"$not": {"$gte": updated_before}}
+        last_id = None
+        cursor = None
+
+        async def _next_document():
+            nonlocal cursor
+            try:
+                if cursor is None:
+                    query = dict(base_query)
+                    if last_id is not None:
+                        query["_id"] = {"$gt": last_id}
+                    cursor = self.collection.find(query).sort("_id", 1).batch_size(batch_size)
+                return await cursor.next()
+            except StopAsyncIteration:
+                return None
+            except Exception:
+                # Reopened past the last yielded document on the next attempt
+                cursor = None
+                raise
+
+        while True:
+            doc = await self._retry_operation(_next_document)
+            if doc is None:
+                return
+
+            last_id = doc["_id"]
+            try:
+                workorder = self.parse_data(doc)
+            except Exception as e:
+                record_log.error(doc.get("number", "unknown"), "Failed to parse document {}: {}", last_id, e)
+                continue
+            yield workorder
+
+    async def create_workorder(self, workorder: TracOSWorkorder, origin: str = ORIGIN_TRACOS) -> None:
+        """Write workorder to MongoDB with retry logic, skipping it if nothing changed"""
+        results = await self._bulk_upsert_chunk([workorder], origin)
+
+        if results["failed"]:
+            raise RuntimeError(f"Failed to write workorder {workorder['number']}")
+        if results["inserted"]:
+            record_log.debug(workorder["number"], "Created with ID {}", workorder.get("_id"))
+        elif results["updated"]:
+            record_log.debug(workorder["number"], "Updated")
+        else:
+            record_log.debug(workorder["number"], "Unchanged")
 
     async def mark_as_synced(self, workorder_id) -> None:
         """Mark workorder as synced with retry logic"""
@@ -165,6 +352,358 @@ class TracOsHandler:
                 logger.warning(f"No workorder found with ID: {workorder_id}")
                 return
             
-            logger.info(f"Marked workorder {workorder_id} as synced at {utc_time}")
+            logger.debug("Marked workorder {} as synced at {}", workorder_id, utc_time)
         
         await self._retry_operation(_mark_operation)
+
+
+    def _build_upsert(self, workorder: TracOSWorkorder, ingested_at: datetime, fingerprint: str, origin: str) -> UpdateOne:
+        """Build an upsert operation keyed on the workorder number"""
+        workorder_dict = dict(workorder)
+        workorder_id = workorder_dict.pop("_id", None)
+        is_synced = workorder_dict.pop("isSynced", None)
+        workorder_dict["ingestedAt"] = ingested_at
+        workorder_dict["contentHash"] = fingerprint
+        workorder_dict["origin"] = origin
+
+        on_insert = {}
+        if workorder_id is not None:
+            # Keep the existing _id on updates, only use the translated one on insert
+            on_insert["_id"] = workorder_id
+        if origin == ORIGIN_CUSTOMER:
+            # The customer already has it; set on insert only so a pending TracOS change is kept
+            on_insert["isSynced"] = True
+            on_insert["syncedAt"] = ingested_at
+        else:
+            workorder_dict["isSynced"] = bool(is_synced)
+
+        update = {"$set": workorder_dict, "$inc": {"version": 1}}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+
+        return UpdateOne({"number": workorder_dict["number"]}, update, upsert=True)
+
+    def _build_write(
+        self, workorder: TracOSWorkorder, ingested_at: datetime, existing: Optional[Dict[str, Any]], origin: str
+    ) -> Tuple[str, Optional[UpdateOne]]:
+        """Return the write for a workorder and the outcome it stands for.
+
+        New workorders are upserted whole. Existing ones only get a $set of the fields that
+        differ from the stored document, and no write at all when nothing differs. The stored
+        document is compared field by field rather than through its contentHash, which goes
+        stale when TracOS edits the document without going through this handler.
+        Every content change records its origin and bumps the document version.
+        """
+        content = workorder_content(workorder)
+        fingerprint = content_fingerprint(content)
+
+        if existing is None:
+            return "upserted", self._build_upsert(workorder, ingested_at, fingerprint, origin)
+
+        changed = {
+            key: workorder[key]
+            for key, value in content.items()
+            if key not in existing or _normalize_value(existing[key]) != value
+        }
+        if not changed:
+            if existing.get("contentHash") == fingerprint:
+                return "unchanged", None
+            # Stored before fingerprints existed, or edited elsewhere: refresh the hash without touching the sync state
+            return "unchanged", UpdateOne({"_id": existing["_id"]}, {"$set": {"contentHash": fingerprint}})
+
+        if origin != ORIGIN_CUSTOMER:
+            changed["isSynced"] = bool(workorder.get("isSynced", False))
+        changed["ingestedAt"] = ingested_at
+        changed["contentHash"] = fingerprint
+        changed["origin"] = origin
+        return "updated", UpdateOne({"_id": existing["_id"]}, {"$set": changed, "$inc": {"version": 1}})
+
+    async def _bulk_upsert_chunk(self, chunk: List[TracOSWorkorder], origin: str = ORIGIN_TRACOS) -> Dict[str, List[Any]]:
+        """Send a single unordered bulk_write for a chunk and classify each record.
+
+        The stored documents are fetched with one query per chunk, so unchanged records
+        are skipped and changed ones only send the fields that differ.
+        """
+
+        async def _bulk_operation():
+            existing_docs = {}
+            async for doc in self.collection.find({"number": {"$in": [w["number"] for w in chunk]}}):
+                existing_docs[doc["number"]] = doc
+
+            ingested_at = _utc_now_ms()
+            outcomes = []
+            operations = []
+            # Chunk position of the record behind each operation
+            operation_indexes = []
+            for index, workorder in enumerate(chunk):
+                outcome, operation = self._build_write(workorder, ingested_at, existing_docs.get(workorder["number"]), origin)
+                outcomes.append(outcome)
+                if operation is not None:
+                    operations.append(operation)
+                    operation_indexes.append(index)
+
+            if not operations:
+                return outcomes, operation_indexes, {}, {}
+            try:
+                result = await self.collection.bulk_write(operations, ordered=False)
+                return outcomes, operation_indexes, result.upserted_ids, {}
+            except BulkWriteError as e:
+                # Unordered writes keep going after a failure, so collect what succeeded
+                upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+                errors = {item["index"]: item.get("errmsg", "") for item in e.details.get("writeErrors", [])}
+                return outcomes, operation_indexes, upserted, errors
+
+        outcomes, operation_indexes, upserted, errors = await self._retry_operation(_bulk_operation)
+
+        # Match inserts on the _id sent with $setOnInsert, falling back to the operation index
+        upserted_ids = set(upserted.values())
+        for op_index, index in enumerate(operation_indexes):
+            workorder = chunk[index]
+            workorder_id = workorder.get("_id")
+            if op_index in errors:
+                record_log.error(workorder["number"], "Failed to upsert: {}", errors[op_index])
+                outcomes[index] = "failed"
+            elif outcomes[index] == "upserted":
+                inserted = (workorder_id in upserted_ids) if workorder_id is not None else (op_index in upserted)
+                outcomes[index] = "inserted" if inserted else "updated"
+
+        results = {"inserted": [], "updated": [], "unchanged": [], "failed": []}
+        for workorder, outcome in zip(chunk, outcomes):
+            results[outcome].append(workorder["number"])
+        return results
+
+    async def create_workorders(self, workorders: List[TracOSWorkorder], origin: str = ORIGIN_TRACOS) -> Dict[str, List[Any]]:
+        """Upsert workorders in chunks of unordered bulk writes keyed on number.
+
+        Workorders written with origin=ORIGIN_CUSTOMER are not exported back to the
+        customer: new ones are stored as synced and updates leave isSynced untouched.
+
+        Returns the workorder numbers grouped by outcome: inserted, updated, unchanged
+        (skipped because their content fingerprint matched) and failed.
+        """
+        results = {"inserted": [], "updated": [], "unchanged": [], "failed": []}
+
+        for start in range(0, len(workorders), self.bulk_batch_size):
+            chunk = workorders[start:start + self.bulk_batch_size]
+            try:
+                chunk_results = await self._bulk_upsert_chunk(chunk, origin)
+            except Exception as e:
+                logger.error(f"Failed to upsert chunk of {len(chunk)} workorders: {e}")
+                chunk_results = {"inserted": [], "updated": [], "unchanged": [], "failed": [w["number"] for w in chunk]}
+
+            for outcome, numbers in chunk_results.items():
+                results[outcome].extend(numbers)
+
+            logger.debug(
+                "Upserted chunk of {} workorders: {} inserted, {} updated, {} unchanged, {} failed",
+                len(chunk), len(chunk_results['inserted']), len(chunk_results['updated']),
+                len(chunk_results['unchanged']), len(chunk_results['failed'])
+            )
+
+        return results
+
+    async def mark_as_synced_many(self, workorders: List[Tuple[Any, Optional[int]]]) -> List[Any]:
+        """Mark workorders as synced with one update_many per chunk.
+
+        Takes (id, version) pairs as read from TracOS and only marks a document whose
+        version is unchanged, so an edit made since it was read is still exported.
+        Every chunk shares a single syncedAt timestamp, which is used to read back
+        the ids that were actually modified.
+        """
+        modified_ids = []
+
+        for start in range(0, len(workorders), self.sync_batch_size):
+            chunk = workorders[start:start + self.sync_batch_size]
+            chunk_ids = [workorder_id for workorder_id, _ in chunk]
+            ids_by_version = defaultdict(list)
+            for workorder_id, version in chunk:
+                ids_by_version[version].append(workorder_id)
+            # version None also matches documents written before versions were tracked
+            query = {"$or": [{"_id": {"$in": ids}, "version": version} for version, ids in ids_by_version.items()]}
+
+            async def _mark_chunk_operation():
+                # MongoDB stores milliseconds, truncate so the read back matches exactly
+                utc_time = _utc_now_ms()
+
+                result = await self.collection.update_many(
+                    query,
+                    {"$set": {"isSynced": True, "syncedAt": utc_time}}
+                )
+                if result.modified_count == len(chunk):
+                    return list(chunk_ids)
+
+                cursor = self.collection.find({"_id": {"$in": chunk_ids}, "syncedAt": utc_time}, {"_id": 1})
+                return [doc["_id"] async for doc in cursor]
+
+            try:
+                chunk_modified = await self._retry_operation(_mark_chunk_operation)
+            except Exception as e:
+                logger.error(f"Failed to mark chunk of {len(chunk)} workorders as synced: {e}")
+                continue
+
+            if len(chunk_modified) < len(chunk):
+                logger.warning(
+                    f"{len(chunk) - len(chunk_modified)} workorders were not marked as synced, "
+                    "they were deleted or changed since they were read"
+                )
+
+            modified_ids.extend(chunk_modified)
+            logger.debug("Marked {}/{} workorders as synced", len(chunk_modified), len(chunk))
+
+        return modified_ids
+
+    @property
+    def state_collection(self):
+        """Small collection holding sync checkpoints next to the workorders"""
+        return self.db[self.state_collection_name]
+
+    async def get_state(self, key: str) -> Any:
+        """Read a persisted sync checkpoint, or None if it was never saved"""
+
+        async def _get_state_operation():
+            doc = await self.state_collection.find_one({"_id": key})
+            return doc["value"] if doc else None
+
+        return await self._retry_operation(_get_state_operation)
+
+    async def set_state(self, key: str, value: Any) -> None:
+        """Persist a sync checkpoint"""
+
+        async def _set_state_operation():
+            await self.state_collection.update_one(
+                {"_id": key},
+                {"$set": {"value": value, "updatedAt": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+        await self._retry_operation(_set_state_operation)
+
+    async def delete_state(self, key: str) -> None:
+        """Drop a persisted sync checkpoint"""
+
+        async def _delete_state_operation():
+            await self.state_collection.delete_one({"_id": key})
+
+        await self._retry_operation(_delete_state_operation)
+
+    @staticmethod
+    def is_resume_token_lost(error: Exception) -> bool:
+        """Whether a change stream error means the stored resume token can't be used anymore"""
+        return isinstance(error, OperationFailure) and error.code in RESUME_TOKEN_LOST_CODES
+
+    async def current_resume_token(self) -> Dict[str, Any]:
+        """Resume token for the current point in the change stream"""
+
+        async def _token_operation():
+            async with self.collection.watch(CHANGE_STREAM_PIPELINE) as stream:
+                return stream.resume_token
+
+        return await self._retry_operation(_token_operation)
+
+    async def watch_unsynced_workorders(self, resume_after: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[List[TracOSRecord], Dict[str, Any]]]:
+        """Yield batches of workorders left unsynced by inserts and updates, read from a change stream.
+
+        Each batch comes with the resume token to persist once it is exported. Idle periods
+        yield empty batches whenever the server advances the token, so a stored token
+        does not fall out of the oplog while nothing changes.
+        """
+        async with self.collection.watch(
+            CHANGE_STREAM_PIPELINE,
+            full_document="updateLookup",
+            resume_after=resume_after,
+            batch_size=self.change_stream_batch_size,
+            max_await_time_ms=self.change_stream_max_await_ms,
+        ) as stream:
+            batch = []
+            last_token = resume_after
+
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    try:
+                        batch.append(self.parse_data(change["fullDocument"]))
+                    except Exception as e:
+                        record_log.error(change["fullDocument"].get("number", "unknown"), "Failed to parse change event: {}", e)
+                    if len(batch) < self.change_stream_batch_size:
+                        continue
+
+                if batch or stream.resume_token != last_token:
+                    last_token = stream.resume_token
+                    yield batch, last_token
+                    batch = []
+
+    @staticmethod
+    def _after_checkpoint(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        """Keyset filter for documents ordered after an (updatedAt, _id) checkpoint.
+
+        A checkpoint without _id includes every document at its updatedAt.
+        """
+        if checkpoint.get("_id") is None:
+            return {"updatedAt": {"$gte": checkpoint["updatedAt"]}}
+        return {
+            "$or": [
+                {"updatedAt": {"$gt": checkpoint["updatedAt"]}},
+                {"updatedAt": checkpoint["updatedAt"], "_id": {"$gt": checkpoint["_id"]}},
+            ]
+        }
+
+    async def iter_changed_workorder_pages(
+        self,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[Tuple[List[TracOSRecord], Dict[str, Any]]]:
+        """Yield pages of unsynced workorders changed after a checkpoint, in (updatedAt, _id) order.
+
+        Each page comes with the checkpoint of its last document; the next page starts
+        right after it, so the cost follows the number of changes, not the collection size.
+        """
+        page_size = page_size or self.cursor_batch_size
+
+        while True:
+            query = dict(UNSYNCED_QUERY)
+            if checkpoint is not None:
+                query.update(self._after_checkpoint(checkpoint))
+
+            async def _page_operation():
+                cursor = self.collection.find(query).sort([("updatedAt", 1), ("_id", 1)]).limit(page_size)
+                return [doc async for doc in cursor]
+
+            docs = await self._retry_operation(_page_operation)
+            if not docs:
+                return
+
+            page = []
+            for doc in docs:
+                try:
+                    page.append(self.parse_data(doc))
+                except Exception as e:
+                    record_log.error(doc.get("number", "unknown"), "Failed to parse document {}: {}", doc.get("_id"), e)
+
+            checkpoint = {"updatedAt": docs[-1]["updatedAt"], "_id": docs[-1]["_id"]}
+            yield page, checkpoint
+
+            if len(docs) < page_size:
+                return
+
+    async def find_rebuilt_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Compute a checkpoint from the collection itself.
+
+        It starts at the oldest unsynced workorder, or after the most recent workorder
+        when everything is synced. Returns None for an empty collection.
+        """
+
+        async def _rebuild_operation():
+            cursor = self.collection.aggregate([
+                {"$match": UNSYNCED_QUERY},
+                {"$group": {"_id": None, "updatedAt": {"$min": "$updatedAt"}}},
+            ])
+            oldest_unsynced = [doc async for doc in cursor]
+            if oldest_unsynced and oldest_unsynced[0]["updatedAt"] is not None:
+                return {"updatedAt": oldest_unsynced[0]["updatedAt"], "_id": None}
+
+            latest = await self.collection.find_one({}, sort=[("updatedAt", -1), ("_id", -1)])
+            if latest is None:
+                return None
+            return {"updatedAt": latest["updatedAt"], "_id": latest["_id"]}
+
+        return await self._retry_operation(_rebuild_operation)
@@ -1,31 +1,367 @@
 from setup import CustomerSystemWorkorder
 from setup import TracOSWorkorder
+from src.core.records import CustomerRecord, TracOSRecord
+from src.core.date_normalizer import DateNormalizer
+from src.core.metrics import metrics
+from src.core.logging_config import configure_logging, record_log
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
 import datetime
+import os
+import re
 from bson import ObjectId
 from loguru import logger
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Customer status flags packed into a bitmask, in the priority order customer_to_tracos checks them
+_CANCELED, _DONE, _ON_HOLD, _ACTIVE = 1, 2, 4, 8
+
+
+def _status_for_flags(flags: int) -> str:
+    if flags & _CANCELED:
+        return 'cancelled'
+    if flags & _DONE:
+        return 'completed'
+    if flags & _ON_HOLD:
+        return 'on_hold'
+    if flags & _ACTIVE:
+        return 'in_progress'
+    return 'pending'
+
+
+# TracOS status for every combination of customer flags
+STATUS_BY_FLAGS = tuple(_status_for_flags(flags) for flags in range(16))
+
+# Customer (isActive, isCanceled, isDone, isOnHold, isPending) for every TracOS status
+FLAGS_BY_STATUS = {
+    'in_progress': (True, False, False, False, False),
+    'cancelled': (False, True, False, False, False),
+    'completed': (False, False, True, False, False),
+    'on_hold': (False, False, False, True, False),
+    'pending': (False, False, False, False, True),
+}
+_NO_FLAGS = (False, False, False, False, False)
+
+# ISO strings that numpy's datetime64 parses exactly like datetime.fromisoformat: UTC or naive,
+# at most microsecond precision, years 0001-9999 (numpy also takes year 0, which datetime can't hold)
+_NUMPY_ISO_PATTERN = re.compile(r"(?!0000)\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?Z?")
+
+
+# Translator instance reused by each worker process of the batch translation pool
+_worker_translator = None
+
+
+def _translate_chunk(direction: str, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]], Dict[str, int]]:
+    """Translate a chunk of workorders inside a worker process.
+
+    Also returns the worker's metric counts, which only the parent process reports.
+    """
+    global _worker_translator
+    if _worker_translator is None:
+        _worker_translator = Translator()
+    results, failures = _worker_translator.translate_chunk(direction, workorders)
+    return results, failures, _worker_translator.dates.drain_counts()
+
 
 class Translator:
     def __init__(self):
+        # Matches the pipeline chunk sizes, so every full chunk is translated on the pool
+        self.parallel_threshold = int(os.getenv("TRANSLATOR_PARALLEL_THRESHOLD", "500"))
+        self.parallel_chunk_size = int(os.getenv("TRANSLATOR_CHUNK_SIZE", "1000"))
+        self.max_workers = int(os.getenv("TRANSLATOR_WORKERS", "0")) or os.cpu_count()
+        # Chunks translate_ahead keeps in translation while the caller writes the current one
+        self.pipeline_depth = int(os.getenv("TRANSLATOR_PIPELINE_DEPTH", "0")) or self.max_workers
+        self.columnar = os.getenv("TRANSLATOR_COLUMNAR", "true").lower() == "true"
+        self.dates = DateNormalizer()
+        self._executor = None
         logger.info("Translator module initialized")
 
-    def tracos_to_costumer(self, workorder: TracOSWorkorder) -> CustomerSystemWorkorder:
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Lazily create the process pool used for large batches"""
+        if self._executor is None:
+            # spawn avoids forking a process that already runs event loop and driver threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                # Workers start with loguru's default DEBUG sink otherwise
+                initializer=configure_logging
+            )
+        return self._executor
+
+    def close(self) -> None:
+        """Shut down the batch translation process pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def translate_chunk(self, direction: str, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Translate workorders in-process, collecting failures instead of raising.
+
+        Results keep the input order, with None where a record failed.
+        """
+        if self.columnar:
+            return self.translate_batch(direction, workorders)
+        return self._translate_each(direction, workorders)
+
+    def _translate_each(self, direction: str, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Translate record by record with the scalar methods"""
+        translate = self.customer_to_tracos if direction == "customer_to_tracos" else self.tracos_to_costumer
+
+        results = []
+        failures = []
+        for index, workorder in enumerate(workorders):
+            try:
+                results.append(translate(workorder))
+            except Exception as e:
+                results.append(None)
+                failures.append({"index": index, "error": str(e)})
+        return results, failures
+
+    def translate_batch(self, direction: str, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Translate a chunk column by column, with the same results and failures as translate_chunk.
+
+        Status flags become a table lookup and each date column is parsed in one pass.
+        Chunks holding something other than mappings go through the per-record path.
+        """
+        if not all(isinstance(workorder, Mapping) for workorder in workorders):
+            return self._translate_each(direction, workorders)
+
+        if direction == "customer_to_tracos":
+            results, failures = self._customer_to_tracos_columns(workorders)
+        else:
+            results, failures = self._tracos_to_costumer_columns(workorders)
+        logger.debug("Translated {}/{} workorders ({})", len(workorders) - len(failures), len(workorders), direction)
+        return results, failures
+
+    def _customer_to_tracos_columns(self, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[TracOSRecord]], List[Dict[str, Any]]]:
+        order_nos = [workorder.get('orderNo') for workorder in workorders]
+        statuses = [
+            STATUS_BY_FLAGS[
+                bool(workorder.get('isCanceled')) * _CANCELED
+                | bool(workorder.get('isDone')) * _DONE
+                | bool(workorder.get('isOnHold')) * _ON_HOLD
+                | bool(workorder.get('isActive')) * _ACTIVE
+            ]
+            for workorder in workorders
+        ]
+        created_at, created_errors = self.parse_date_column([workorder.get('creationDate') for workorder in workorders])
+        updated_at, updated_errors = self.parse_date_column([workorder.get('lastUpdateDate') for workorder in workorders])
+        deleted_at, deleted_errors = self.parse_date_column([workorder.get('deletedDate') or None for workorder in workorders])
+        deleted_at = [value or None for value in deleted_at]
+
+        results = []
+        failures = []
+        for index, workorder in enumerate(workorders):
+            try:
+                if not order_nos[index]:
+                    raise ValueError("Customer work order number is required")
+                for errors in (created_errors, updated_errors, deleted_errors):
+                    if index in errors:
+                        raise errors[index]
+                summary = workorder.get('summary')
+                results.append(TracOSRecord(
+                    ObjectId(),
+                    order_nos[index],
+                    statuses[index],
+                    summary,
+                    summary,
+                    created_at[index],
+                    updated_at[index],
+                    workorder.get('isDeleted', False),
+                    deleted_at[index],
+                    False,
+                ))
+            except Exception as e:
+                record_log.debug(workorder.get('orderNo', 'unknown'), "Failed to translate to TracOS format: {}", e)
+                results.append(None)
+                failures.append({"index": index, "error": str(e)})
+        return results, failures
+
+    def _tracos_to_costumer_columns(self, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[CustomerRecord]], List[Dict[str, Any]]]:
+        flags = [FLAGS_BY_STATUS.get(workorder.get('status'), _NO_FLAGS) for workorder in workorders]
+        created_at, created_errors = self.parse_date_column([workorder.get('createdAt') for workorder in workorders])
+        updated_at, updated_errors = self.parse_date_column([workorder.get('updatedAt') for workorder in workorders])
+        deleted_at, deleted_errors = self.parse_date_column([workorder.get('deletedAt') for workorder in workorders])
+
+        results = []
+        failures = []
+        for index, workorder in enumerate(workorders):
+            try:
+                if not workorder.get('number'):
+                    raise ValueError("Work order number is required")
+                if not workorder.get('status'):
+                    raise ValueError("Work order status is required")
+                if not workorder.get('createdAt'):
+                    raise ValueError("Work order createdAt is required")
+                for errors in (created_errors, updated_errors):
+                    if index in errors:
+                        raise errors[index]
+                creation_date = created_at[index].isoformat()
+                last_update_date = updated_at[index].isoformat()
+                if workorder.get('deletedAt') is not None:
+                    if index in deleted_errors:
+                        raise deleted_errors[index]
+                    deleted_date = deleted_at[index].isoformat()
+                else:
+                    deleted_date = None
+
+                is_active, is_canceled, is_done, is_on_hold, is_pending = flags[index]
+                results.append(CustomerRecord(
+                    workorder.get('number'),
+                    is_active,
+                    is_canceled,
+                    workorder.get('deleted', False),
+                    is_done,
+                    is_on_hold,
+                    is_pending,
+                    False,
+                    workorder.get('description'),
+                    creation_date,
+                    last_update_date,
+                    deleted_date,
+                ))
+            except Exception as e:
+                record_log.debug(workorder.get('number', 'unknown'), "Failed to translate to Customer format: {}", e)
+                results.append(None)
+                failures.append({"index": index, "error": str(e)})
+        return results, failures
+
+    def parse_date_column(self, values: List[Any]) -> Tuple[List[Any], Dict[int, Exception]]:
+        """Apply date_to_iso_8601 to a whole column.
+
+        Returns the converted values and the error raised for each index that failed.
+        With numpy installed, plain UTC/naive ISO strings are parsed in bulk; everything
+        else goes through the memoized DateNormalizer.
+        """
+        parsed: List[Any] = [None] * len(values)
+        errors: Dict[int, Exception] = {}
+        normalize = self.dates.normalize
+        bulk_indexes = []
+        bulk_strings = []
+
+        for index, value in enumerate(values):
+            if np is not None and isinstance(value, str) and _NUMPY_ISO_PATTERN.fullmatch(value):
+                bulk_indexes.append(index)
+                bulk_strings.append(value[:-1] if value.endswith('Z') else value)
+                continue
+            try:
+                parsed[index] = normalize(value)
+            except Exception as e:
+                errors[index] = e
+
+        if bulk_strings:
+            try:
+                bulk_parsed = np.array(bulk_strings, dtype="datetime64[us]").astype(object)
+            except ValueError:
+                bulk_parsed = None
+            utc = datetime.timezone.utc
+            for position, index in enumerate(bulk_indexes):
+                try:
+                    # Anything numpy can't return as a datetime gets the scalar result and error
+                    if bulk_parsed is None or not isinstance(bulk_parsed[position], datetime.datetime):
+                        parsed[index] = normalize(values[index])
+                    else:
+                        parsed[index] = bulk_parsed[position].replace(tzinfo=utc)
+                except Exception as e:
+                    errors[index] = e
+        return parsed, errors
+
+    async def translate_many(self, direction: str, workorders: List[Dict[str, Any]]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """Translate a batch of workorders, fanning out to the process pool for large batches
+        when there are at least two workers.
+
+        direction is either "customer_to_tracos" or "tracos_to_costumer".
+        """
+        # A single worker only adds pickling: on one core nothing runs in parallel
+        if len(workorders) < self.parallel_threshold or self.max_workers < 2:
+            results, failures = self.translate_chunk(direction, workorders)
+            metrics.add(self.dates.drain_counts())
+            return results, failures
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        offsets = range(0, len(workorders), self.parallel_chunk_size)
+        chunk_results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _translate_chunk, direction, workorders[offset:offset + self.parallel_chunk_size])
+            for offset in offsets
+        ))
+
+        results = []
+        failures = []
+        for offset, (chunk_translated, chunk_failures, chunk_counts) in zip(offsets, chunk_results):
+            results.extend(chunk_translated)
+            failures.extend({**failure, "index": failure["index"] + offset} for failure in chunk_failures)
+            metrics.add(chunk_counts)
+
+        logger.debug("Translated {} workorders across {} worker chunks", len(workorders), len(offsets))
+        return results, failures
+
+    async def translate_ahead(
+        self,
+        translate: Callable[[List[Any]], Awaitable[Tuple[List[Any], List[Dict[str, Any]]]]],
+        chunks: AsyncIterator[Any],
+        workorders_of: Optional[Callable[[Any], List[Any]]] = None,
+    ) -> AsyncIterator[Tuple[Any, Tuple[List[Any], List[Dict[str, Any]]]]]:
+        """Yield (chunk, (results, failures)) in chunk order, translating up to pipeline_depth chunks ahead.
+
+        translate is one of the *_many methods and workorders_of extracts the workorders
+        of a chunk (the chunk itself by default). With the process pool, the next chunks
+        are translated on the workers while the caller writes the current one.
+        """
+        pending = deque()
+        iterator = chunks.__aiter__()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.pipeline_depth:
+                    try:
+                        chunk = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    workorders = workorders_of(chunk) if workorders_of is not None else chunk
+                    pending.append((chunk, asyncio.ensure_future(translate(workorders))))
+
+                if not pending:
+                    return
+                chunk, translation = pending.popleft()
+                yield chunk, await translation
+        finally:
+            for _, translation in pending:
+                translation.cancel()
+
+    async def customer_to_tracos_many(self, workorders: List[CustomerSystemWorkorder]) -> Tuple[List[Optional[TracOSRecord]], List[Dict[str, Any]]]:
+        """Translate a batch of Customer workorders to TracOS format."""
+        return await self.translate_many("customer_to_tracos", workorders)
+
+    async def tracos_to_costumer_many(self, workorders: List[TracOSWorkorder]) -> Tuple[List[Optional[CustomerRecord]], List[Dict[str, Any]]]:
+        """Translate a batch of TracOS workorders to Customer format."""
+        return await self.translate_many("tracos_to_costumer", workorders)
+
+    def tracos_to_costumer(self, workorder: TracOSWorkorder) -> CustomerRecord:
         """Translate a TracOS workorder to Customer format."""
-        logger.debug(f"Starting TracOS to Customer translation for workorder {workorder.get('number', 'unknown')}")
+        number = workorder.get('number', 'unknown')
+        record_log.debug(number, "Starting TracOS to Customer translation")
         
         try:
             # Validate required fields
             if not workorder.get('number'):
-                logger.error("Validation failed: Work order number is required")
                 raise ValueError("Work order number is required")
             if not workorder.get('status'):
-                logger.error(f"Validation failed: Work order status is required for workorder {workorder.get('number')}")
                 raise ValueError("Work order status is required")
             if not workorder.get('createdAt'):
-                logger.error(f"Validation failed: Work order createdAt is required for workorder {workorder.get('number')}")
                 raise ValueError("Work order createdAt is required")
             
-            logger.debug(f"Validation passed for workorder {workorder.get('number')}")
+            record_log.debug(number, "Validation passed")
             
             status = workorder.get('status')
             is_canceled = status == 'cancelled'
@@ -40,7 +376,7 @@ class Translator:
             last_update_date = self.date_to_iso_8601(workorder.get('updatedAt')).isoformat()
             deleted_date = self.date_to_iso_8601(workorder.get('deletedAt')).isoformat() if workorder.get('deletedAt') is not None else None
 
-            result = CustomerSystemWorkorder(
+            result = CustomerRecord(
                 orderNo=workorder.get('number'),
                 isActive=is_active,
                 isCanceled=is_canceled,
@@ -55,25 +391,25 @@ class Translator:
                 deletedDate=deleted_date
             )
             
-            logger.info(f"Successfully translated TracOS workorder {workorder.get('number')} to Customer format")
+            record_log.debug(number, "Translated to Customer format")
             
             return result
             
         except Exception as e:
-            logger.error(f"Failed to translate TracOS workorder {workorder.get('number', 'unknown')} to Customer format: {str(e)}")
+            record_log.error(number, "Failed to translate to Customer format: {}", e)
             raise
 
-    def customer_to_tracos(self, workorder: CustomerSystemWorkorder) -> TracOSWorkorder:
+    def customer_to_tracos(self, workorder: CustomerSystemWorkorder) -> TracOSRecord:
         """Translate a Customer workorder to TracOS format."""
-        logger.debug(f"Starting Customer to TracOS translation for workorder {workorder.get('orderNo', 'unknown')}")
+        number = workorder.get('orderNo', 'unknown')
+        record_log.debug(number, "Starting Customer to TracOS translation")
         
         try:
             # Validate required fields
             if not workorder.get('orderNo'):
-                logger.error("Validation failed: Customer work order number is required")
                 raise ValueError("Customer work order number is required")
             
-            logger.debug(f"Validation passed for customer workorder {workorder.get('orderNo')}")
+            record_log.debug(number, "Validation passed")
             
             status = 'pending'
             if workorder.get('isCanceled'):
@@ -89,7 +425,7 @@ class Translator:
             updated_at = self.date_to_iso_8601(workorder.get('lastUpdateDate'))
             deleted_at = self.date_to_iso_8601(workorder.get('deletedDate')) if workorder.get('deletedDate') else None
 
-            result = TracOSWorkorder(
+            result = TracOSRecord(
                 _id=ObjectId(),
                 number=workorder.get('orderNo'),
                 status=status,
@@ -102,46 +438,14 @@ class Translator:
                 isSynced=False
             )
             
-            logger.info(f"Successfully translated Customer workorder {workorder.get('orderNo')} to TracOS format")
+            record_log.debug(number, "Translated to TracOS format")
             
             return result
             
         except Exception as e:
-            logger.error(f"Failed to translate Customer workorder {workorder.get('orderNo', 'unknown')} to TracOS format: {str(e)}")
+            record_log.error(number, "Failed to translate to TracOS format: {}", e)
             raise
 
     def date_to_iso_8601(self, date) -> str:
-        """Convert various date formats to ISO 8601 format."""
-        if date is None:
-            logger.debug("Date conversion: received None, returning empty string")
-            return ""
-        
-        try:
-            original_date = date
-            
-            # Handle MongoDB date format
-            if isinstance(date, dict) and '$date' in date:
-                logger.debug("Detected MongoDB date format")
-                date = date['$date']
-            
-            if isinstance(date, str):
-                if 'T' in date:
-                    date = datetime.datetime.fromisoformat(date.replace('Z', '+00:00'))
-                    logger.debug("Parsed ISO format string to datetime")
-                else:
-                    date = datetime.datetime.fromisoformat(date)
-                    logger.debug("Parsed simple format string to datetime")
-            
-            if date.tzinfo is None:
-                date = date.replace(tzinfo=datetime.timezone.utc)
-                logger.debug("Added UTC timezone to naive datetime")
-            elif date.tzinfo != datetime.timezone.utc:
-                date = date.astimezone(datetime.timezone.utc)
-                logger.debug("Converted timezone to UTC")
-            
-            logger.debug(f"Date conversion successful: {original_date} -> {date}")
-            return date
-            
-        except Exception as e:
-            logger.error(f"Failed to convert date {date} to ISO 8601 format: {str(e)}")
-            raise ValueError(f"Invalid date format: {date}")
\ No newline at end of file
+        """Convert various date formats to a UTC datetime, see DateNormalizer."""
+        return self.dates.normalize(date)
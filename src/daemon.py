@@ -0,0 +1,81 @@
+"""Long-running entrypoint that ingests inbound files as soon as they arrive."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import signal
+import time
+from loguru import logger
+from src.processors.inbound_processor import InboundProcessor
+from src.processors.outbound_processor import OutboundProcessor
+from src.core.inbound_watcher import InboundWatcher
+from src.core.mongo_pool import MongoClientPool
+from src.core.metrics import metrics
+from src.core.logging_config import configure_logging
+
+
+async def run_inbound_watcher(inbound_processor: InboundProcessor, watcher: InboundWatcher) -> None:
+    """Feed micro-batches of settled inbound files to the inbound pipeline, handing failed files back to the watcher"""
+    async for batch in watcher.batches():
+        started_at = time.monotonic()
+        try:
+            failed_paths = (await inbound_processor.process_files(batch))["failed"]
+        except Exception as e:
+            logger.error(f"Error during inbound processing of batch: {e}")
+            failed_paths = batch
+        watcher.retry_later(failed_paths)
+        logger.info(f"Processed batch of {len(batch)} inbound files in {(time.monotonic() - started_at) * 1000:.1f} ms")
+
+
+async def run_outbound_change_stream(outbound_processor: OutboundProcessor) -> None:
+    """Export TracOS changes from the change stream, logging errors instead of propagating them"""
+    try:
+        await outbound_processor.process_change_stream()
+    except Exception as e:
+        logger.error(f"Error during outbound change stream processing: {e}")
+
+
+async def run_daemon() -> None:
+    configure_logging()
+    logger.info("Starting TracOS ↔ Client Integration Daemon")
+
+    # Client, pools and interpreter are set up once for the whole process lifetime
+    mongo_pool = MongoClientPool()
+    inbound_processor = InboundProcessor(mongo_pool=mongo_pool)
+    watcher = InboundWatcher(inbound_processor.customer_handler.inbound_folder)
+
+    outbound_mode = os.getenv("DAEMON_OUTBOUND_MODE", "none").lower()
+    outbound_processor = OutboundProcessor(mongo_pool=mongo_pool) if outbound_mode == "change_stream" else None
+
+    def _stop():
+        watcher.stop()
+        if outbound_processor is not None:
+            outbound_processor.stop()
+
+    loop = asyncio.get_running_loop()
+    handled_signals = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, _stop)
+            handled_signals.append(sig)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    try:
+        async with asyncio.TaskGroup() as task_group:
+            task_group.create_task(run_inbound_watcher(inbound_processor, watcher))
+            if outbound_processor is not None:
+                task_group.create_task(run_outbound_change_stream(outbound_processor))
+    finally:
+        for sig in handled_signals:
+            loop.remove_signal_handler(sig)
+        await inbound_processor.close()
+        mongo_pool.close()
+        metrics.log_summary()
+        logger.info("=== Daemon stopped ===")
+        await logger.complete()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_daemon())
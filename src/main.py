@@ -4,29 +4,68 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import asyncio
+from datetime import datetime, timezone
+from typing import Optional
 from loguru import logger
 from src.processors.inbound_processor import InboundProcessor
 from src.processors.outbound_processor import OutboundProcessor
+from src.core.mongo_pool import MongoClientPool
+from src.core.metrics import metrics
+from src.core.logging_config import configure_logging
 
 
-async def main():
-    logger.info("Starting TracOS ↔ Client Integration Flow")
-
+async def run_inbound(mongo_pool: MongoClientPool) -> None:
+    """Run the inbound flow, logging errors instead of propagating them"""
     try:
         logger.info("=== Processing inbound flow ===")
-        inbound_processor = InboundProcessor()
+        inbound_processor = InboundProcessor(mongo_pool=mongo_pool)
         await inbound_processor.process()
     except Exception as e:
         logger.error(f"Error during inbound processing: {e}")
 
+
+async def run_outbound(mongo_pool: MongoClientPool, ingested_before: Optional[datetime] = None) -> None:
+    """Run the outbound flow, logging errors instead of propagating them"""
     try:
         logger.info("=== Processing outbound flow ===")
-        outbound_processor = OutboundProcessor()
-        await outbound_processor.process()
+        outbound_processor = OutboundProcessor(mongo_pool=mongo_pool)
+        if os.getenv("OUTBOUND_SCAN_MODE", "full").lower() == "incremental":
+            await outbound_processor.process_incremental()
+        else:
+            await outbound_processor.process(ingested_before=ingested_before)
     except Exception as e:
         logger.error(f"Error during outbound processing: {e}")
 
+
+async def main():
+    configure_logging()
+    logger.info("Starting TracOS ↔ Client Integration Flow")
+
+    run_mode = os.getenv("SYNC_RUN_MODE", "sequential").lower()
+
+    # One client and connection pool shared by both flows
+    mongo_pool = MongoClientPool()
+
+    try:
+        if run_mode == "concurrent":
+            # Workorders the inbound flow writes during this cycle are left for the next
+            # outbound pass, so the result doesn't depend on how the two flows interleave
+            cycle_started_at = datetime.now(timezone.utc)
+
+            # Each flow handles its own errors; cancelling main cancels both
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(run_inbound(mongo_pool))
+                task_group.create_task(run_outbound(mongo_pool, ingested_before=cycle_started_at))
+        else:
+            await run_inbound(mongo_pool)
+            await run_outbound(mongo_pool)
+    finally:
+        mongo_pool.close()
+
+    metrics.log_summary()
     logger.info("=== Processing finished ===")
+    # Drains the background sink when LOG_ENQUEUE is on
+    await logger.complete()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,18 @@
-from src.core.tracos_handler import TracOsHandler
+from src.core.tracos_handler import TracOsHandler, ORIGIN_CUSTOMER
+from src.core.mongo_pool import MongoClientPool
 from src.core.customer_handler import CustomerHandler
 from src.core.translator import Translator
-from setup import TracOSWorkorder
+from src.core.records import TracOSRecord
 from setup import CustomerSystemWorkorder
+from src.core.logging_config import log_batch, record_log
 from loguru import logger
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import time
 
 
 class InboundProcessor:
-    def __init__(self):
-        self.tracos_handler = TracOsHandler()
+    def __init__(self, mongo_pool: Optional[MongoClientPool] = None):
+        self.tracos_handler = TracOsHandler(mongo_pool=mongo_pool)
         self.customer_handler = CustomerHandler()
         self.translator = Translator()
         logger.info("InboundProcessor initialized")
@@ -17,33 +21,102 @@ class InboundProcessor:
         """Process inbound workorders from the customer system and create them in TracOS."""
         logger.info("Starting inbound processing")
         await self.tracos_handler.connect()
-        
-        inbound_workorder: list[CustomerSystemWorkorder] = []
-        inbound_workorder = self.customer_handler.get_workorders()
-        
-        if not inbound_workorder:
+
+        results = await self._process_chunks(self.customer_handler.aiter_workorder_chunks())
+
+        if not results["read"]:
             logger.info("No workorders found to process")
-            await self.tracos_handler.disconnect()
+            await self._shutdown()
             return
-        
-        logger.info(f"Retrieved {len(inbound_workorder)} workorders from customer system")
-        
-        translated_workorders: list[TracOSWorkorder] = []
-        for workerorder in inbound_workorder:
-            translated_workorders.append(self.translator.customer_to_tracos(workerorder))
 
-        logger.info(f"Translated {len(translated_workorders)} workorders")
+        await self._shutdown()
+        logger.info("Inbound processing completed")
+
+    async def process_files(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """Process the given inbound files, keeping connections and pools open for the next call.
+
+        Returns the "applied" and "failed" paths; failed files were left unapplied so the
+        caller can retry them. Files skipped as already applied or unreadable are in neither.
+        """
+        if self.tracos_handler.client is None:
+            await self.tracos_handler.connect()
 
-        # TODO: Check if it is necessary to add a validation step here
-        # for example, it is not possible to have a status "completed" if value before was "cancelled"
+        return await self._process_chunks(self.customer_handler.aiter_workorder_chunks(file_paths=file_paths))
+
+    async def close(self) -> None:
+        """Release everything held open by process_files."""
+        await self._shutdown()
+
+    async def _process_chunks(self, chunks: AsyncIterator[List[Tuple[str, CustomerSystemWorkorder]]]) -> Dict[str, list]:
+        """Translate and upsert chunk by chunk.
+
+        Returns how many workorders were "read" and the "applied" and "failed" source
+        paths; a multi-record file with any failed workorder is failed.
+        """
+        # Writes start as soon as the first chunk is read, not after the whole scan, and the
+        # next chunks are translated while this one is written; writes still go in file order
+        total_count = 0
+        all_applied_paths: Dict[str, None] = {}
+        all_failed_paths: Dict[str, None] = {}
+        translated_count = 0
         processed_count = 0
-        for workorder in translated_workorders:
-            try:
-                await self.tracos_handler.create_workorder(workorder)
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Failed to create workorder {workorder.id if hasattr(workorder, 'id') else 'unknown'}: {e}")
-
-        logger.info(f"Successfully processed {processed_count}/{len(translated_workorders)} workorders")
+
+        translated_chunks = self.translator.translate_ahead(
+            self.translator.customer_to_tracos_many, chunks, workorders_of=lambda chunk: [workorder for _, workorder in chunk]
+        )
+        async for chunk, (translated, failures) in translated_chunks:
+            started_at = time.monotonic()
+            total_count += len(chunk)
+
+            for failure in failures:
+                source_path, workorder = chunk[failure['index']]
+                number = workorder.get('orderNo', 'unknown') if isinstance(workorder, dict) else 'unknown'
+                record_log.error(number, "Failed to translate workorder from {}: {}", source_path, failure['error'])
+
+            translated_workorders: list[TracOSRecord] = [workorder for workorder in translated if workorder is not None]
+            translated_count += len(translated_workorders)
+
+            results = {"inserted": [], "updated": [], "unchanged": [], "failed": []}
+            if translated_workorders:
+                # TODO: Check if it is necessary to add a validation step here
+                # for example, it is not possible to have a status "completed" if value before was "cancelled"
+                results = await self.tracos_handler.create_workorders(translated_workorders, origin=ORIGIN_CUSTOMER)
+                processed_count += len(results["inserted"]) + len(results["updated"]) + len(results["unchanged"])
+
+                if results["failed"]:
+                    logger.error(f"Failed to create {len(results['failed'])} workorders")
+            failed_numbers = set(results["failed"])
+
+            # Each workorder reports its source file once. Applied files go to the ledger (and
+            # archive), failed ones are retried next run; multi-record files wait for all of theirs
+            applied_paths = []
+            failed_paths = []
+            for (source_path, _), workorder in zip(chunk, translated):
+                if workorder is None or workorder["number"] in failed_numbers:
+                    failed_paths.append(source_path)
+                else:
+                    applied_paths.append(source_path)
+            await self.customer_handler.finish_files_async(applied_paths, failed_paths)
+            all_applied_paths.update(dict.fromkeys(applied_paths))
+            all_failed_paths.update(dict.fromkeys(failed_paths))
+
+            log_batch(
+                "Inbound chunk", started_at,
+                read=len(chunk), translated=len(translated_workorders), inserted=len(results["inserted"]),
+                updated=len(results["updated"]), unchanged=len(results["unchanged"]), failed=len(failures) + len(results["failed"]),
+            )
+
+        if total_count:
+            logger.info(f"Translated {translated_count}/{total_count} workorders")
+            logger.info(f"Successfully processed {processed_count}/{total_count} workorders")
+        return {
+            "read": total_count,
+            "applied": [path for path in all_applied_paths if path not in all_failed_paths],
+            "failed": list(all_failed_paths),
+        }
+
+    async def _shutdown(self) -> None:
+        """Disconnect from TracOS and release the file I/O and translation pools."""
         await self.tracos_handler.disconnect()
-        logger.info("Inbound processing completed")
\ No newline at end of file
+        self.customer_handler.close()
+        self.translator.close()
\ No newline at end of file
@@ -1,57 +1,343 @@
 from src.core.tracos_handler import TracOsHandler
+from src.core.mongo_pool import MongoClientPool
 from src.core.customer_handler import CustomerHandler
 from src.core.translator import Translator
-from setup import TracOSWorkorder
-from setup import CustomerSystemWorkorder
+from src.core.records import CustomerRecord, TracOSRecord
+from src.core.logging_config import log_batch, record_log
 from loguru import logger
+from typing import AsyncIterator, Optional
+from datetime import datetime, timedelta
+import os
+import time
+import asyncio
+
+
+RESUME_TOKEN_STATE_KEY = "outbound_resume_token"
+WATERMARK_STATE_KEY = "outbound_watermark"
+SWEEP_STATE_KEY = "outbound_sweep"
 
 
 class OutboundProcessor:
-    def __init__(self):
-        self.tracos_handler = TracOsHandler()
+    def __init__(self, mongo_pool: Optional[MongoClientPool] = None):
+        self.tracos_handler = TracOsHandler(mongo_pool=mongo_pool)
         self.customer_handler = CustomerHandler()
         self.translator = Translator()
+        self.batch_size = int(os.getenv("OUTBOUND_BATCH_SIZE", "500"))
+        # Incremental passes re-read this far behind the watermark, for writes that commit late
+        self.watermark_lag = timedelta(milliseconds=int(os.getenv("OUTBOUND_WATERMARK_LAG_MS", "60000")))
+        # Unsynced workorders further behind are swept at most this often (0 disables the sweep)
+        self.sweep_interval = float(os.getenv("OUTBOUND_SWEEP_INTERVAL_S", "3600"))
+        self._stopping = False
+        self._stop_requested = None
         logger.info("OutboundProcessor initialized")
 
-    async def process(self) -> None:
-        """Process outbound workorders from TracOS and create them in the customer system."""
+    async def process(self, ingested_before: Optional[datetime] = None) -> None:
+        """Process outbound workorders from TracOS and create them in the customer system.
+
+        When ingested_before is given, workorders the inbound flow wrote from that time on
+        are left for the next pass.
+        """
         logger.info("Starting outbound processing")
         await self.tracos_handler.connect()
-        
-        outbound_workorder: list[TracOSWorkorder] = []
-        outbound_workorder = await self.tracos_handler.get_unsynced_workorders()
 
-        if not outbound_workorder:
+        total_count = await self._export_unsynced(ingested_before=ingested_before)
+
+        if not total_count:
             logger.info("No unsynced workorders found to process")
-            await self.tracos_handler.disconnect()
+            await self._shutdown()
             return
 
-        logger.info(f"Retrieved {len(outbound_workorder)} unsynced workorders from TracOS")
+        await self._shutdown()
+        logger.info("Outbound processing completed")
+
+    async def process_change_stream(self) -> None:
+        """Export TracOS changes continuously from a change stream until stop() is called.
+
+        The resume token is persisted after every exported batch. Without a usable token
+        (first start, or expired from the oplog) a full scan catches up first; the stream
+        position is taken before the scan so changes made during it are not lost. Any other
+        error (MongoDB down, circuit breaker open, files that could not be written...) is
+        retried after a backoff, resuming from the last persisted token.
+        """
+        logger.info("Starting outbound change stream processing")
+        self._stopping = False
+        self._stop_requested = asyncio.Event()
+
+        resume_token = None
+        # Last token persisted, where the stream resumes after an error
+        saved_token = None
+        token_loaded = False
+        drop_saved_token = False
+        failures = 0
+
+        try:
+            while not self._stopping:
+                try:
+                    if self.tracos_handler.client is None:
+                        await self.tracos_handler.connect()
+                    if drop_saved_token:
+                        await self.tracos_handler.delete_state(RESUME_TOKEN_STATE_KEY)
+                        drop_saved_token = False
+                    if not token_loaded:
+                        saved_token = resume_token = await self.tracos_handler.get_state(RESUME_TOKEN_STATE_KEY)
+                        token_loaded = True
+
+                    if resume_token is None:
+                        resume_token = await self.tracos_handler.current_resume_token()
+                        logger.info("No usable resume token, running a full scan before streaming")
+                        await self._export_unsynced()
+                        await self.tracos_handler.set_state(RESUME_TOKEN_STATE_KEY, resume_token)
+                        saved_token = resume_token
+
+                    async for batch, resume_token in self.tracos_handler.watch_unsynced_workorders(resume_after=resume_token):
+                        if batch:
+                            created, synced, write_failures = await self._process_chunk(batch)
+                            logger.info(f"Exported {created}/{len(batch)} changed workorders, {synced} marked as synced")
+                            if write_failures:
+                                # Replayed from the saved token; the workorders exported meanwhile
+                                # are synced by then, so the stream filters them out
+                                raise RuntimeError(f"{write_failures} changed workorders could not be written")
+                        await self._publish_segments(expired_only=True)
+                        # Changes still in an open segment would be lost if the token moved past them
+                        if not self._has_open_segment():
+                            await self.tracos_handler.set_state(RESUME_TOKEN_STATE_KEY, resume_token)
+                            saved_token = resume_token
+                        failures = 0
+                        if self._stopping:
+                            break
+                except Exception as e:
+                    if self.tracos_handler.is_resume_token_lost(e):
+                        logger.warning(f"Resume token can no longer be used, falling back to a full scan: {e}")
+                        resume_token = saved_token = None
+                        drop_saved_token = True
+                        continue
+
+                    delay = self.tracos_handler.retry_policy.backoff(failures)
+                    failures += 1
+                    logger.error(f"Change stream export failed ({failures} in a row), resuming from the last saved token in {delay:.2f}s: {e}")
+                    resume_token = saved_token
+                    await self._wait_for_stop(delay)
+
+            if self._has_open_segment() and await self._publish_segments() is not None and resume_token is not None:
+                await self.tracos_handler.set_state(RESUME_TOKEN_STATE_KEY, resume_token)
+        finally:
+            await self._shutdown()
+            logger.info("Outbound change stream processing stopped")
 
-        translated_workorders: list[CustomerSystemWorkorder] = []
-        for workorder in outbound_workorder:
-            translated_workorders.append(self.translator.tracos_to_costumer(workorder))
+    async def _wait_for_stop(self, delay: float) -> None:
+        """Sleep for delay seconds, returning early if stop() is called"""
+        try:
+            await asyncio.wait_for(self._stop_requested.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
 
-        logger.info(f"Translated {len(translated_workorders)} workorders")
+    async def process_incremental(self) -> None:
+        """Export workorders changed since the persisted (updatedAt, _id) watermark.
 
+        The watermark advances after every page whose files were all written. Workorders
+        that can't be translated don't hold it back, so they are not re-read every cycle;
+        a page with failed writes stops the pass so it is retried from the same point.
+        With NDJSON segments it only advances once the pages' segments are published.
+
+        updatedAt is set by the writers, so a change can commit after the watermark moved
+        past it. Each pass starts watermark_lag before the watermark, and unsynced
+        workorders behind that window are swept every sweep_interval; synced workorders
+        are filtered out, so re-reading them is harmless.
+        """
+        logger.info("Starting incremental outbound processing")
+        await self.tracos_handler.connect()
+
+        checkpoint = await self.tracos_handler.get_state(WATERMARK_STATE_KEY)
+        window_start = self._lagged(checkpoint)
+        unsaved_checkpoint = None
+        total_count = 0
         processed_count = 0
-        for workorder in translated_workorders:
-            try:
-                self.customer_handler.create_workorder(workorder)
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Failed to create workorder in customer system {workorder.id if hasattr(workorder, 'id') else 'unknown'}: {e}")
 
-        logger.info(f"Successfully created {processed_count}/{len(translated_workorders)} workorders in customer system")
+        async for page, page_checkpoint in self.tracos_handler.iter_changed_workorder_pages(window_start, page_size=self.batch_size):
+            total_count += len(page)
+            created, synced, write_failures = await self._process_chunk(page) if page else (0, 0, 0)
+            processed_count += created
+
+            if write_failures:
+                logger.error(f"{write_failures} workorders could not be written, keeping the watermark at {checkpoint}")
+                unsaved_checkpoint = None
+                break
+
+            if not self._advances(checkpoint, page_checkpoint):
+                # Still in the lag window, behind the watermark
+                continue
+            if self._has_open_segment():
+                unsaved_checkpoint = page_checkpoint
+            else:
+                checkpoint = page_checkpoint
+                unsaved_checkpoint = None
+                await self.tracos_handler.set_state(WATERMARK_STATE_KEY, checkpoint)
+
+        if unsaved_checkpoint is not None and await self._publish_segments() is not None:
+            await self.tracos_handler.set_state(WATERMARK_STATE_KEY, unsaved_checkpoint)
+
+        if window_start is not None and await self._sweep_due():
+            logger.info(f"Sweeping unsynced workorders updated before {window_start['updatedAt']}")
+            total_count += await self._export_unsynced(updated_before=window_start["updatedAt"])
+            await self.tracos_handler.set_state(SWEEP_STATE_KEY, {"sweptAt": time.time()})
+
+        if not total_count:
+            logger.info("No changed workorders found since the last watermark")
+        else:
+            logger.info(f"Successfully created {processed_count}/{total_count} changed workorders in customer system")
+
+        await self._shutdown()
+        logger.info("Incremental outbound processing completed")
+
+    def _lagged(self, checkpoint: Optional[dict]) -> Optional[dict]:
+        """Checkpoint watermark_lag before the given one, including every workorder from there"""
+        if checkpoint is None or not self.watermark_lag:
+            return checkpoint
+        return {"updatedAt": checkpoint["updatedAt"] - self.watermark_lag, "_id": None}
 
+    @staticmethod
+    def _advances(checkpoint: Optional[dict], page_checkpoint: dict) -> bool:
+        """Whether a page checkpoint is past the watermark, which never moves backward"""
+        if checkpoint is None:
+            return True
+        if page_checkpoint["updatedAt"] != checkpoint["updatedAt"]:
+            return page_checkpoint["updatedAt"] > checkpoint["updatedAt"]
+        return checkpoint["_id"] is None or page_checkpoint["_id"] > checkpoint["_id"]
+
+    async def _sweep_due(self) -> bool:
+        """Whether sweep_interval has passed since the last sweep behind the watermark"""
+        if self.sweep_interval <= 0:
+            return False
+        state = await self.tracos_handler.get_state(SWEEP_STATE_KEY)
+        return state is None or time.time() - state["sweptAt"] >= self.sweep_interval
+
+    async def rebuild_watermark(self) -> Optional[dict]:
+        """Recompute the incremental watermark from the collection and persist it."""
+        await self.tracos_handler.connect()
+        try:
+            checkpoint = await self.tracos_handler.find_rebuilt_checkpoint()
+            if checkpoint is None:
+                await self.tracos_handler.delete_state(WATERMARK_STATE_KEY)
+            else:
+                await self.tracos_handler.set_state(WATERMARK_STATE_KEY, checkpoint)
+            logger.info(f"Rebuilt outbound watermark: {checkpoint}")
+            return checkpoint
+        finally:
+            await self._shutdown()
+
+    def stop(self) -> None:
+        """Ask process_change_stream to return after the batch in progress."""
+        self._stopping = True
+        if self._stop_requested is not None:
+            self._stop_requested.set()
+
+    async def _export_unsynced(self, ingested_before: Optional[datetime] = None, updated_before: Optional[datetime] = None) -> int:
+        """Stream every unsynced workorder through the pipeline, returning how many were read."""
+        # Stream read -> translate -> write -> mark-synced. The next chunks are translated
+        # while this one is written, so at most pipeline_depth + 1 chunks are held in memory
+        total_count = 0
+        processed_count = 0
         synced_count = 0
-        for workorder in outbound_workorder:
+
+        translated_chunks = self.translator.translate_ahead(
+            self.translator.tracos_to_costumer_many, self._unsynced_chunks(ingested_before, updated_before)
+        )
+        async for chunk, (translated, failures) in translated_chunks:
+            total_count += len(chunk)
+            created, synced, _ = await self._write_chunk(chunk, translated, failures, time.monotonic())
+            processed_count += created
+            synced_count += synced
+
+        synced_count += await self._publish_segments() or 0
+
+        if total_count:
+            logger.info(f"Successfully created {processed_count}/{total_count} workorders in customer system")
+            logger.info(f"Successfully marked {synced_count}/{total_count} workorders as synced")
+        return total_count
+
+    async def _unsynced_chunks(
+        self, ingested_before: Optional[datetime] = None, updated_before: Optional[datetime] = None
+    ) -> AsyncIterator[list[TracOSRecord]]:
+        """Group the unsynced workorders streamed from the cursor into chunks of batch_size"""
+        chunk: list[TracOSRecord] = []
+        async for workorder in self.tracos_handler.iter_unsynced_workorders(ingested_before=ingested_before, updated_before=updated_before):
+            chunk.append(workorder)
+            if len(chunk) >= self.batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def _shutdown(self) -> None:
+        """Disconnect from TracOS and release the file I/O and translation pools."""
+        await self.tracos_handler.disconnect()
+        self.customer_handler.close()
+        self.translator.close()
+
+    def _has_open_segment(self) -> bool:
+        """Whether written workorders are waiting in an unpublished NDJSON segment"""
+        segment_writer = self.customer_handler.segment_writer
+        return segment_writer is not None and segment_writer.pending_count > 0
+
+    async def _publish_segments(self, expired_only: bool = False) -> Optional[int]:
+        """Publish the open NDJSON segment and mark its workorders as synced.
+
+        Returns how many were marked, or None if the segment could not be published.
+        """
+        try:
+            published_keys = await self.customer_handler.close_segment_async(expired_only=expired_only)
+        except Exception as e:
+            logger.error(f"Failed to publish outbound segment: {e}")
+            return None
+        synced_ids = await self.tracos_handler.mark_as_synced_many(published_keys) if published_keys else []
+        return len(synced_ids)
+
+    async def _process_chunk(self, chunk: list[TracOSRecord]) -> tuple[int, int, int]:
+        """Translate and write a chunk of workorders, then mark the written ones as synced.
+
+        Returns how many workorders were written, how many were marked as synced and how
+        many translated workorders failed to be written. With NDJSON segments, workorders
+        are only marked once the segment holding them is published.
+        """
+        started_at = time.monotonic()
+        translated, failures = await self.translator.tracos_to_costumer_many(chunk)
+        return await self._write_chunk(chunk, translated, failures, started_at)
+
+    async def _write_chunk(
+        self,
+        chunk: list[TracOSRecord],
+        translated: list[Optional[CustomerRecord]],
+        failures: list[dict],
+        started_at: float,
+    ) -> tuple[int, int, int]:
+        """Write the translated workorders of a chunk and mark them as synced, like _process_chunk"""
+        for failure in failures:
+            record_log.error(chunk[failure['index']].get('number', 'unknown'), "Failed to translate: {}", failure['error'])
+
+        # Versions go along with the ids, so a workorder edited meanwhile is not marked as synced
+        sync_keys = [(workorder['_id'], workorder.version) for workorder, result in zip(chunk, translated) if result is not None]
+        customer_workorders: list[CustomerRecord] = [result for result in translated if result is not None]
+
+        if self.customer_handler.segment_writer is not None:
             try:
-                await self.tracos_handler.mark_as_synced(workorder.get('_id'))
-                synced_count += 1
+                published_keys = await self.customer_handler.append_to_segments_async(customer_workorders, sync_keys)
             except Exception as e:
-                logger.error(f"Failed to mark workorder {workorder.get('_id', 'unknown')} as synced: {e}")
-        
-        logger.info(f"Successfully marked {synced_count}/{len(outbound_workorder)} workorders as synced")
-        await self.tracos_handler.disconnect()
-        logger.info("Outbound processing completed")
\ No newline at end of file
+                logger.error(f"Failed to append {len(customer_workorders)} workorders to the outbound segment: {e}")
+                return 0, 0, len(customer_workorders)
+            synced_ids = await self.tracos_handler.mark_as_synced_many(published_keys) if published_keys else []
+            log_batch(
+                "Outbound chunk", started_at,
+                read=len(chunk), translated=len(customer_workorders), appended=len(customer_workorders), marked_as_synced=len(synced_ids),
+            )
+            return len(customer_workorders), len(synced_ids), 0
+
+        written = await self.customer_handler.create_workorders_async(customer_workorders)
+        written_keys = [sync_key for sync_key, ok in zip(sync_keys, written) if ok]
+
+        # Only files that were written are marked, so a crash re-sends at most this chunk
+        synced_ids = await self.tracos_handler.mark_as_synced_many(written_keys) if written_keys else []
+        log_batch(
+            "Outbound chunk", started_at,
+            read=len(chunk), translated=len(customer_workorders), written=len(written_keys), marked_as_synced=len(synced_ids),
+        )
+        return len(written_keys), len(synced_ids), len(customer_workorders) - len(written_keys)
@@ -0,0 +1,24 @@
+"""Recompute the incremental outbound watermark from the workorders collection."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from loguru import logger
+from src.processors.outbound_processor import OutboundProcessor
+from src.core.mongo_pool import MongoClientPool
+
+
+async def rebuild_watermark() -> None:
+    logger.info("Rebuilding the incremental outbound watermark")
+
+    mongo_pool = MongoClientPool()
+    try:
+        outbound_processor = OutboundProcessor(mongo_pool=mongo_pool)
+        await outbound_processor.rebuild_watermark()
+    finally:
+        mongo_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_watermark())
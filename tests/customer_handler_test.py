@@ -5,6 +5,7 @@ import tempfile
 import shutil
 from unittest import mock
 from src.core.customer_handler import CustomerHandler
+from src.core import durable_io
 
 
 @pytest.fixture
@@ -117,3 +118,266 @@ def test_customer_handler_workflow(temp_dirs, sample_workorder):
     expected_file_path = os.path.join(temp_outbound_dir, f"workorder_{sample_workorder['orderNo']}.json")
     assert os.path.exists(expected_file_path)
 
+
+
+def test_iter_workorder_chunks_yields_fixed_size_chunks(customer_handler, temp_dirs, sample_workorder):
+    """Test iter_workorder_chunks groups parsed workorders with their source paths"""
+    temp_inbound_dir, _ = temp_dirs
+
+    for order_no in range(1, 6):
+        workorder = dict(sample_workorder, orderNo=order_no)
+        with open(os.path.join(temp_inbound_dir, f"{order_no}.json"), 'w', encoding='utf-8') as f:
+            json.dump(workorder, f)
+    with open(os.path.join(temp_inbound_dir, "broken.json"), 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    with open(os.path.join(temp_inbound_dir, "notes.txt"), 'w', encoding='utf-8') as f:
+        f.write("ignored")
+
+    chunks = list(customer_handler.iter_workorder_chunks(chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    pairs = [pair for chunk in chunks for pair in chunk]
+    assert sorted(workorder["orderNo"] for _, workorder in pairs) == [1, 2, 3, 4, 5]
+    for source_path, workorder in pairs:
+        assert source_path == os.path.join(temp_inbound_dir, f"{workorder['orderNo']}.json")
+
+
+def test_iter_workorder_chunks_missing_directory(customer_handler):
+    """Test iter_workorder_chunks yields nothing when the inbound folder is missing"""
+    customer_handler.inbound_folder = os.path.join(customer_handler.inbound_folder, "missing")
+    assert list(customer_handler.iter_workorder_chunks()) == []
+
+
+@pytest.mark.asyncio
+async def test_aiter_workorder_chunks_reads_on_thread_pool(customer_handler, temp_dirs, sample_workorder):
+    """Test the async chunk iterator returns the same workorders as the sync one"""
+    temp_inbound_dir, _ = temp_dirs
+
+    for order_no in range(1, 6):
+        workorder = dict(sample_workorder, orderNo=order_no)
+        with open(os.path.join(temp_inbound_dir, f"{order_no}.json"), 'w', encoding='utf-8') as f:
+            json.dump(workorder, f)
+
+    chunks = [chunk async for chunk in customer_handler.aiter_workorder_chunks(chunk_size=2)]
+    customer_handler.close()
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert chunks == list(customer_handler.iter_workorder_chunks(chunk_size=2))
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_async_reports_each_write(customer_handler, temp_dirs, sample_workorder):
+    """Test create_workorders_async writes files in parallel and flags failures"""
+    _, temp_outbound_dir = temp_dirs
+    workorders = [dict(sample_workorder, orderNo=order_no) for order_no in (1, 2)]
+    workorders.append({"summary": "missing orderNo"})
+
+    written = await customer_handler.create_workorders_async(workorders)
+    customer_handler.close()
+
+    assert written == [True, True, False]
+    assert sorted(os.listdir(temp_outbound_dir)) == ["workorder_1.json", "workorder_2.json"]
+
+
+def test_applied_files_are_skipped_without_opening(customer_handler, temp_dirs, sample_workorder):
+    """Test files recorded in the ledger are not opened again until they change"""
+    temp_inbound_dir, _ = temp_dirs
+    file_path = os.path.join(temp_inbound_dir, "1.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(sample_workorder, f)
+
+    assert len(customer_handler.get_workorders()) == 1
+    customer_handler.finish_files([file_path])
+
+    with mock.patch("builtins.open", side_effect=AssertionError("file should not be opened")):
+        assert customer_handler.get_workorders() == []
+
+    # Touching the file without changing it only refreshes the ledger entry
+    os.utime(file_path, ns=(0, 10**18))
+    assert customer_handler.get_workorders() == []
+    assert customer_handler.ledger.get(file_path)[1] == 10**18
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sample_workorder, summary="Changed"), f)
+    assert [workorder["summary"] for workorder in customer_handler.get_workorders()] == ["Changed"]
+    customer_handler.close()
+
+
+def test_failed_files_are_retried(customer_handler, temp_dirs, sample_workorder):
+    """Test files that failed to apply are read again on the next run"""
+    temp_inbound_dir, _ = temp_dirs
+    file_path = os.path.join(temp_inbound_dir, "1.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(sample_workorder, f)
+
+    customer_handler.get_workorders()
+    customer_handler.finish_files([], failed_paths=[file_path])
+
+    assert len(customer_handler.get_workorders()) == 1
+    customer_handler.close()
+
+
+def test_applied_files_are_archived(temp_dirs, sample_workorder):
+    """Test applied files are moved to the archive folder when it is configured"""
+    temp_inbound_dir, _ = temp_dirs
+    archive_dir = os.path.join(temp_inbound_dir, "archive")
+    file_path = os.path.join(temp_inbound_dir, "1.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(sample_workorder, f)
+
+    with mock.patch.dict(os.environ, {'INBOUND_ARCHIVE_DIR': archive_dir}):
+        handler = CustomerHandler()
+
+    handler.get_workorders()
+    handler.finish_files([file_path])
+    handler.close()
+
+    assert not os.path.exists(file_path)
+    assert os.listdir(archive_dir) == ["1.json"]
+
+
+def write_multi_record_files(temp_inbound_dir, sample_workorder):
+    """Write an NDJSON file with orderNos 1-3 and a JSON-array file with orderNos 4-5"""
+    ndjson_path = os.path.join(temp_inbound_dir, "export.ndjson")
+    with open(ndjson_path, 'w', encoding='utf-8') as f:
+        for order_no in (1, 2, 3):
+            f.write(json.dumps(dict(sample_workorder, orderNo=order_no)) + "\n")
+
+    array_path = os.path.join(temp_inbound_dir, "export.json")
+    with open(array_path, 'w', encoding='utf-8') as f:
+        json.dump([dict(sample_workorder, orderNo=order_no) for order_no in (4, 5)], f, indent=4)
+    return ndjson_path, array_path
+
+
+@pytest.mark.asyncio
+async def test_aiter_workorder_chunks_streams_multi_record_files(customer_handler, temp_dirs, sample_workorder):
+    """Test NDJSON and JSON-array files are split into chunks like single workorder files"""
+    temp_inbound_dir, _ = temp_dirs
+    ndjson_path, array_path = write_multi_record_files(temp_inbound_dir, sample_workorder)
+    single_path = os.path.join(temp_inbound_dir, "6.json")
+    with open(single_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sample_workorder, orderNo=6), f)
+
+    chunks = [chunk async for chunk in customer_handler.aiter_workorder_chunks(chunk_size=2)]
+    customer_handler.close()
+
+    assert all(len(chunk) <= 2 for chunk in chunks)
+    records = sorted((workorder["orderNo"], path) for chunk in chunks for path, workorder in chunk)
+    assert records == [
+        (1, ndjson_path), (2, ndjson_path), (3, ndjson_path),
+        (4, array_path), (5, array_path), (6, single_path),
+    ]
+
+
+def test_multi_record_file_is_finished_after_all_workorders(customer_handler, temp_dirs, sample_workorder):
+    """Test a multi-record file is only ledgered once every workorder read from it was applied"""
+    temp_inbound_dir, _ = temp_dirs
+    ndjson_path, array_path = write_multi_record_files(temp_inbound_dir, sample_workorder)
+
+    chunks = customer_handler.iter_workorder_chunks(chunk_size=2)
+    first = next(chunks)
+    assert [workorder["orderNo"] for _, workorder in first] == [1, 2]
+    customer_handler.finish_files([path for path, _ in first])
+    assert customer_handler.ledger.get(ndjson_path) is None
+
+    for chunk in chunks:
+        # Workorder 5 fails, so the array file is retried next run
+        customer_handler.finish_files(
+            [path for path, workorder in chunk if workorder["orderNo"] != 5],
+            [path for path, workorder in chunk if workorder["orderNo"] == 5],
+        )
+
+    assert customer_handler.ledger.get(ndjson_path) is not None
+    assert customer_handler.ledger.get(array_path) is None
+    assert [workorder["orderNo"] for workorder in customer_handler.get_workorders()] == [4, 5]
+    customer_handler.close()
+
+
+def test_malformed_ndjson_line_is_skipped_and_file_retried(customer_handler, temp_dirs, sample_workorder):
+    """Test a bad line doesn't stop the other workorders but keeps the file out of the ledger"""
+    temp_inbound_dir, _ = temp_dirs
+    file_path = os.path.join(temp_inbound_dir, "export.jsonl")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(dict(sample_workorder, orderNo=1)) + "\n{not json\n\n")
+        f.write(json.dumps(dict(sample_workorder, orderNo=2)) + "\n")
+
+    workorders = customer_handler.get_workorders()
+    customer_handler.finish_files([file_path, file_path])
+
+    assert [workorder["orderNo"] for workorder in workorders] == [1, 2]
+    assert customer_handler.ledger.get(file_path) is None
+    customer_handler.close()
+
+
+def test_touched_multi_record_file_is_not_parsed_again(customer_handler, temp_dirs, sample_workorder):
+    """Test a multi-record file copied again without changes is skipped by its content hash"""
+    temp_inbound_dir, _ = temp_dirs
+    ndjson_path, array_path = write_multi_record_files(temp_inbound_dir, sample_workorder)
+
+    for chunk in customer_handler.iter_workorder_chunks():
+        customer_handler.finish_files([path for path, _ in chunk])
+
+    os.utime(array_path, ns=(0, 10**18))
+    with mock.patch("src.core.customer_handler.iter_json_array_records", side_effect=AssertionError("parsed again")):
+        assert customer_handler.get_workorders() == []
+    assert customer_handler.ledger.get(array_path)[1] == 10**18
+    customer_handler.close()
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_async_syncs_the_folder_once(customer_handler, temp_dirs, sample_workorder):
+    """Test every file is synced once the whole group is written, before the renames and the single folder sync"""
+    _, temp_outbound_dir = temp_dirs
+    workorders = [dict(sample_workorder, orderNo=order_no) for order_no in (1, 2, 3)]
+    events = []
+
+    def _fsync_path(path):
+        events.append(("file", path, sorted(os.listdir(temp_outbound_dir))))
+
+    with mock.patch("src.core.customer_handler.fsync_path", side_effect=_fsync_path), \
+            mock.patch("src.core.customer_handler.fsync_directory", side_effect=lambda folder: events.append(("dir", folder))):
+        written = await customer_handler.create_workorders_async(workorders)
+    customer_handler.close()
+
+    assert written == [True, True, True]
+    assert [event[0] for event in events] == ["file", "file", "file", "dir"]
+    # Every sync sees the three temp files written and none renamed yet
+    for _, path, listing in events[:3]:
+        assert path.endswith(".tmp") and len(listing) == 3 and all(name.endswith(".tmp") for name in listing)
+    assert events[3] == ("dir", temp_outbound_dir)
+    assert sorted(os.listdir(temp_outbound_dir)) == ["workorder_1.json", "workorder_2.json", "workorder_3.json"]
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_async_reports_unpublished_files(customer_handler, temp_dirs, sample_workorder):
+    """Test failed renames or file syncs leave no partial file behind, and a failed folder sync fails the group"""
+    _, temp_outbound_dir = temp_dirs
+    workorders = [dict(sample_workorder, orderNo=order_no) for order_no in (1, 2)]
+    replace = os.replace
+
+    def _failing_replace(source, destination):
+        if destination.endswith("workorder_2.json"):
+            raise OSError("rename failed")
+        replace(source, destination)
+
+    with mock.patch("src.core.customer_handler.os.replace", side_effect=_failing_replace):
+        assert await customer_handler.create_workorders_async(workorders) == [True, False]
+    assert os.listdir(temp_outbound_dir) == ["workorder_1.json"]
+
+    with mock.patch("src.core.customer_handler.fsync_directory", side_effect=OSError("EIO")):
+        assert await customer_handler.create_workorders_async(workorders) == [False, False]
+
+    # A file that can't be synced is not published and its temporary file is removed
+    for name in os.listdir(temp_outbound_dir):
+        os.remove(os.path.join(temp_outbound_dir, name))
+    fsync_path = durable_io.fsync_path
+
+    def _failing_fsync(path):
+        if "workorder_2.json" in path:
+            raise OSError("EIO")
+        fsync_path(path)
+
+    with mock.patch("src.core.customer_handler.fsync_path", side_effect=_failing_fsync):
+        assert await customer_handler.create_workorders_async(workorders) == [True, False]
+    assert os.listdir(temp_outbound_dir) == ["workorder_1.json"]
+    customer_handler.close()
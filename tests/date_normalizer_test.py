@@ -0,0 +1,84 @@
+import random
+import datetime
+import pytest
+from datetime import timezone
+from src.core.date_normalizer import DateNormalizer
+from tests.translator_test import _random_date
+
+
+def _reference_normalize(date):
+    """The conversion date_to_iso_8601 did before it had fast paths and a cache"""
+    if date is None:
+        return ""
+    try:
+        if isinstance(date, dict) and '$date' in date:
+            date = date['$date']
+        if isinstance(date, str):
+            if 'T' in date:
+                date = datetime.datetime.fromisoformat(date.replace('Z', '+00:00'))
+            else:
+                date = datetime.datetime.fromisoformat(date)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        elif date.tzinfo != datetime.timezone.utc:
+            date = date.astimezone(datetime.timezone.utc)
+        return date
+    except Exception:
+        raise ValueError(f"Invalid date format: {date}")
+
+
+def _outcome(normalize, value):
+    try:
+        return repr(normalize(value))
+    except ValueError as e:
+        return f"ValueError: {e}"
+
+
+@pytest.mark.parametrize("cache_size", [0, 4, 65536])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_reference_conversion(cache_size, seed):
+    """Test cached and fast-path conversions give the reference results and errors"""
+    normalizer = DateNormalizer(cache_size=cache_size)
+    rng = random.Random(seed)
+    values = [_random_date(rng) for _ in range(500)]
+    # Repeat values so the cache gets hits
+    values += rng.sample(values, 200)
+
+    assert [_outcome(normalizer.normalize, value) for value in values] == [_outcome(_reference_normalize, value) for value in values]
+
+
+def test_canonical_utc_fast_path():
+    """Test canonical UTC strings parse to the same datetime as the general path"""
+    normalizer = DateNormalizer()
+
+    for value in ("2023-05-10T18:01:57Z", "2023-05-10T18:01:57.719Z", "2023-05-10T18:01:57.719123Z"):
+        result = normalizer.normalize(value)
+        assert result == datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        assert result.tzinfo is timezone.utc
+
+
+def test_cache_is_bounded_and_counts_hits():
+    """Test the cache never holds more than cache_size entries and reports hits and misses"""
+    normalizer = DateNormalizer(cache_size=2)
+
+    for value in ("2023-05-10T00:00:00Z", "2023-05-10T00:00:00Z", "2023-05-11T00:00:00Z", "2023-05-12T00:00:00Z"):
+        normalizer.normalize(value)
+
+    # The third distinct string found the cache full and started it over
+    info = normalizer.cache_info()
+    assert (info["hits"], info["misses"], info["size"]) == (1, 3, 1)
+    assert info["hit_rate"] == 0.25
+
+    assert normalizer.drain_counts() == {"translator.date_cache.hits": 1, "translator.date_cache.misses": 3}
+    normalizer.normalize("2023-05-12T00:00:00Z")
+    assert normalizer.drain_counts() == {"translator.date_cache.hits": 1, "translator.date_cache.misses": 0}
+
+
+def test_datetimes_skip_the_cache():
+    """Test native datetimes are converted without touching the string cache"""
+    normalizer = DateNormalizer()
+    aware = datetime.datetime(2023, 5, 10, 15, tzinfo=timezone(datetime.timedelta(hours=-3)))
+
+    assert normalizer.normalize(aware) == datetime.datetime(2023, 5, 10, 18, tzinfo=timezone.utc)
+    assert normalizer.normalize(datetime.datetime(2023, 5, 10)).tzinfo is timezone.utc
+    assert normalizer.cache_info()["misses"] == 0
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import shutil
+import pytest
+from unittest import mock
+from src.core import durable_io
+from src.core.durable_io import fsync_path
+
+
+@pytest.fixture
+def folder():
+    """Create a temporary folder and clean it up after"""
+    temp_folder = tempfile.mkdtemp()
+    yield temp_folder
+    shutil.rmtree(temp_folder)
+
+
+def test_fsync_path_syncs_a_closed_file(folder):
+    """Test a file written and closed earlier is fdatasynced through a new descriptor"""
+    path = os.path.join(folder, "file")
+    with open(path, "wb") as f:
+        f.write(b"data")
+
+    with mock.patch.object(durable_io, "_datasync") as datasync:
+        fsync_path(path)
+
+    datasync.assert_called_once()
+
+
+def test_fsync_path_raises_for_missing_file(folder):
+    """Test a file removed before its sync surfaces as OSError"""
+    with pytest.raises(OSError):
+        fsync_path(os.path.join(folder, "missing"))
@@ -1,5 +1,6 @@
 import pytest
 import pytest_asyncio
+import asyncio
 import os
 import json
 import tempfile
@@ -11,7 +12,10 @@ from mongomock_motor import AsyncMongoMockClient
 
 from setup import TracOSWorkorder, CustomerSystemWorkorder
 from src.main import main
+from src.daemon import run_daemon
 from src.core.tracos_handler import TracOsHandler
+from src.core.file_ledger import ProcessedFileLedger
+from src.core.translator import Translator
 
 
 @pytest_asyncio.fixture
@@ -36,7 +40,7 @@ async def ephemeral_environment():
     })
     
     # Create a factory function that returns configured TracOsHandler instances
-    def create_mock_tracos_handler():
+    def create_mock_tracos_handler(*args, **kwargs):
         handler = TracOsHandler()
         handler.client = mongo_client
         handler.db = db
@@ -257,3 +261,182 @@ async def test_end_to_end_flow_data_integrity(ephemeral_environment):
     synced_workorder = await env['collection'].find_one({"number": 999})
     assert synced_workorder['isSynced'] == True, "Original workorder should be marked as synced"
     assert 'syncedAt' in synced_workorder, "Should have syncedAt timestamp"
+
+
+@pytest.mark.asyncio
+async def test_end_to_end_flow_concurrent_mode(ephemeral_environment, sample_tracos_workorders, sample_customer_workorders):
+    """Test both flows run together and only TracOS workorders are exported"""
+    env = ephemeral_environment
+    await setup_initial_data(env, sample_tracos_workorders, sample_customer_workorders)
+
+    with mock.patch.dict(os.environ, {'SYNC_RUN_MODE': 'concurrent'}):
+        await main()
+
+    assert await env['collection'].count_documents({}) == 4
+
+    outbound_files = sorted(f for f in os.listdir(env['outbound_dir']) if f.endswith('.json'))
+    assert outbound_files == ["workorder_100.json", "workorder_101.json"]
+    assert await env['collection'].count_documents({"isSynced": False}) == 0
+
+
+@pytest.mark.asyncio
+async def test_end_to_end_flow_does_not_echo_customer_workorders(ephemeral_environment, sample_customer_workorders):
+    """Test customer workorders are not exported back until they change inside TracOS"""
+    env = ephemeral_environment
+    await setup_initial_data(env, [], sample_customer_workorders)
+
+    await main()
+
+    assert [f for f in os.listdir(env['outbound_dir']) if f.endswith('.json')] == []
+    ingested = await env['collection'].find_one({"number": 200})
+    assert ingested["origin"] == "customer"
+    assert ingested["version"] == 1
+    assert ingested["isSynced"] is True
+
+    # A change made inside TracOS is exported on the next pass
+    await env['collection'].update_one({"number": 200}, {"$set": {"status": "cancelled", "isSynced": False}})
+    await main()
+
+    outbound_files = [f for f in os.listdir(env['outbound_dir']) if f.endswith('.json')]
+    assert outbound_files == ["workorder_200.json"]
+
+
+@pytest.mark.asyncio
+async def test_daemon_ingests_files_as_they_arrive(ephemeral_environment, sample_customer_workorders):
+    """Test the daemon picks up dropped files in micro-batches without a restart"""
+    env = ephemeral_environment
+
+    with mock.patch.dict(os.environ, {
+        'DAEMON_WATCH_BACKEND': 'polling',
+        'DAEMON_POLL_INTERVAL_MS': '10',
+        'DAEMON_DEBOUNCE_MS': '20',
+        'DAEMON_BATCH_WINDOW_MS': '10',
+    }):
+        daemon = asyncio.create_task(run_daemon())
+        try:
+            for workorder in sample_customer_workorders:
+                file_path = os.path.join(env['inbound_dir'], f"{workorder['orderNo']}.json")
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump(workorder, f)
+
+                for _ in range(100):
+                    if await env['collection'].find_one({"number": workorder['orderNo']}):
+                        break
+                    await asyncio.sleep(0.02)
+                else:
+                    pytest.fail(f"Workorder {workorder['orderNo']} was not ingested by the daemon")
+        finally:
+            daemon.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await daemon
+
+    assert await env['collection'].count_documents({}) == 2
+
+
+@pytest.mark.asyncio
+async def test_daemon_retries_files_that_failed_to_apply(ephemeral_environment, sample_customer_workorders):
+    """Test a file whose workorders could not be written is picked up again after the retry delay"""
+    env = ephemeral_environment
+    create_workorders = TracOsHandler.create_workorders
+    calls = []
+
+    async def _fail_first_write(self, workorders, *args, **kwargs):
+        calls.append([workorder["number"] for workorder in workorders])
+        if len(calls) == 1:
+            return {"inserted": [], "updated": [], "unchanged": [], "failed": calls[0]}
+        return await create_workorders(self, workorders, *args, **kwargs)
+
+    with mock.patch.dict(os.environ, {
+        'DAEMON_WATCH_BACKEND': 'polling',
+        'DAEMON_POLL_INTERVAL_MS': '10',
+        'DAEMON_DEBOUNCE_MS': '20',
+        'DAEMON_BATCH_WINDOW_MS': '10',
+        'DAEMON_RETRY_DELAY_MS': '50',
+    }), mock.patch.object(TracOsHandler, 'create_workorders', _fail_first_write):
+        daemon = asyncio.create_task(run_daemon())
+        try:
+            workorder = sample_customer_workorders[0]
+            with open(os.path.join(env['inbound_dir'], f"{workorder['orderNo']}.json"), 'w', encoding='utf-8') as f:
+                json.dump(workorder, f)
+
+            for _ in range(100):
+                if await env['collection'].find_one({"number": workorder['orderNo']}):
+                    break
+                await asyncio.sleep(0.02)
+            else:
+                pytest.fail("The failed file was not retried by the daemon")
+        finally:
+            daemon.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await daemon
+
+    assert calls == [[200], [200]]
+
+
+@pytest.mark.asyncio
+async def test_end_to_end_flow_skips_applied_inbound_files(ephemeral_environment, sample_customer_workorders):
+    """Test a second run does not re-apply inbound files that were already applied"""
+    env = ephemeral_environment
+    await setup_initial_data(env, [], sample_customer_workorders)
+
+    await main()
+    first_run = {doc["number"]: doc["ingestedAt"] async for doc in env['collection'].find({})}
+
+    await main()
+    second_run = {doc["number"]: doc["ingestedAt"] async for doc in env['collection'].find({})}
+
+    assert sorted(first_run) == [200, 201]
+    assert second_run == first_run
+
+
+@pytest.mark.asyncio
+async def test_end_to_end_flow_ingests_bulk_export_files(ephemeral_environment, sample_customer_workorders):
+    """Test NDJSON and JSON-array exports are ingested through the chunked inbound pipeline"""
+    env = ephemeral_environment
+    with open(os.path.join(env['inbound_dir'], "export.ndjson"), 'w', encoding='utf-8') as f:
+        for order_no in range(300, 305):
+            f.write(json.dumps(dict(sample_customer_workorders[0], orderNo=order_no)) + "\n")
+    with open(os.path.join(env['inbound_dir'], "export.json"), 'w', encoding='utf-8') as f:
+        json.dump([dict(sample_customer_workorders[1], orderNo=order_no) for order_no in range(400, 403)], f)
+
+    with mock.patch.dict(os.environ, {'INBOUND_CHUNK_SIZE': '2'}):
+        await main()
+
+    numbers = sorted([doc["number"] async for doc in env['collection'].find({})])
+    assert numbers == [300, 301, 302, 303, 304, 400, 401, 402]
+
+    # Both files were ledgered once all of their workorders were applied
+    ledger = ProcessedFileLedger(os.path.join(env['inbound_dir'], ".processed_files.sqlite3"))
+    try:
+        assert ledger.get(os.path.join(env['inbound_dir'], "export.ndjson")) is not None
+        assert ledger.get(os.path.join(env['inbound_dir'], "export.json")) is not None
+    finally:
+        ledger.close()
+
+
+@pytest.mark.asyncio
+async def test_end_to_end_flow_translates_chunks_on_process_pool(ephemeral_environment, sample_tracos_workorders, sample_customer_workorders):
+    """Test both flows translate their chunks on the process pool, ahead of writes applied in order"""
+    env = ephemeral_environment
+    tracos_workorders = [dict(sample_tracos_workorders[0], _id=ObjectId(), number=number) for number in range(100, 105)]
+    await setup_initial_data(env, tracos_workorders, [])
+    with open(os.path.join(env['inbound_dir'], "export.ndjson"), 'w', encoding='utf-8') as f:
+        for order_no in range(300, 305):
+            f.write(json.dumps(dict(sample_customer_workorders[0], orderNo=order_no, summary=f"First {order_no}")) + "\n")
+        # A later chunk updates a workorder of the first one
+        f.write(json.dumps(dict(sample_customer_workorders[0], orderNo=300, summary="Second 300")) + "\n")
+
+    get_executor = Translator._get_executor
+    with mock.patch.dict(os.environ, {
+        'INBOUND_CHUNK_SIZE': '2',
+        'OUTBOUND_BATCH_SIZE': '2',
+        'TRANSLATOR_PARALLEL_THRESHOLD': '2',
+        'TRANSLATOR_WORKERS': '2',
+    }), mock.patch.object(Translator, '_get_executor', autospec=True, side_effect=get_executor) as pool_used:
+        await main()
+
+    assert pool_used.call_count >= 2
+    titles = {doc["number"]: doc["title"] async for doc in env['collection'].find({"number": {"$gte": 300}})}
+    assert titles == {300: "Second 300", 301: "First 301", 302: "First 302", 303: "First 303", 304: "First 304"}
+    assert sorted(os.listdir(env['outbound_dir'])) == [f"workorder_{number}.json" for number in range(100, 105)]
+    assert await env['collection'].count_documents({"number": {"$lt": 300}, "isSynced": True}) == 5
@@ -0,0 +1,39 @@
+import pytest
+import os
+import tempfile
+import shutil
+from src.core.file_ledger import ProcessedFileLedger
+
+
+@pytest.fixture
+def ledger():
+    """Create a ledger in a temporary directory"""
+    temp_dir = tempfile.mkdtemp()
+    ledger = ProcessedFileLedger(os.path.join(temp_dir, "state", "ledger.sqlite3"))
+    yield ledger
+    ledger.close()
+    shutil.rmtree(temp_dir)
+
+
+def test_ledger_matches_exact_file_version(ledger):
+    """Test only the applied size and mtime count as already applied"""
+    assert ledger.get("/inbound/1.json") is None
+
+    ledger.mark_applied([("/inbound/1.json", 120, 1000, "abc")])
+
+    assert ledger.get("/inbound/1.json") == (120, 1000, "abc")
+    assert ledger.is_applied("/inbound/1.json", 120, 1000)
+    assert not ledger.is_applied("/inbound/1.json", 120, 2000)
+    assert not ledger.is_applied("/inbound/2.json", 120, 1000)
+
+
+def test_ledger_persists_across_instances(ledger):
+    """Test entries survive closing and reopening the ledger"""
+    ledger.mark_applied([("/inbound/1.json", 120, 1000, "abc")])
+    ledger.close()
+
+    reopened = ProcessedFileLedger(ledger.ledger_path)
+    try:
+        assert reopened.is_applied("/inbound/1.json", 120, 1000)
+    finally:
+        reopened.close()
@@ -0,0 +1,87 @@
+import pytest
+import io
+import json
+import random
+import hashlib
+from src.core.inbound_formats import iter_json_array_records, iter_ndjson_records, is_multi_record_file
+
+
+def reader(data: bytes) -> io.BufferedReader:
+    return io.BufferedReader(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1024 * 1024])
+def test_json_array_is_decoded_across_block_boundaries(block_size):
+    """Test elements split over any block boundary decode the same as json.loads"""
+    rng = random.Random(18)
+    records = [
+        {"orderNo": number, "summary": "é" * rng.randint(0, 20), "value": rng.random(), "tags": [None, True, number]}
+        for number in range(200)
+    ]
+    data = json.dumps(records, indent=rng.choice([None, 2]), ensure_ascii=False).encode("utf-8")
+
+    hasher = hashlib.sha256()
+    assert list(iter_json_array_records(reader(data), hasher, block_size=block_size)) == records
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("data", [b"", b'{"orderNo": 1}', b"[1, 2", b"[1 2]", b"[1,]", b"[1] []"])
+def test_malformed_json_array_raises_value_error(data):
+    """Test truncated or malformed arrays raise ValueError"""
+    with pytest.raises(ValueError):
+        list(iter_json_array_records(reader(data), block_size=2))
+
+
+def test_malformed_json_array_element_fails_without_reading_ahead():
+    """Test a malformed element raises at once instead of buffering the rest of the file"""
+    good = json.dumps({"orderNo": 1, "summary": "x" * 100})
+    data = ("[" + ",".join([good] * 5) + ',{"orderNo": oops},' + ",".join([good] * 20000) + "]").encode("utf-8")
+    f = reader(data)
+    records = iter_json_array_records(f, block_size=1024)
+
+    assert [next(records) for _ in range(5)] == [json.loads(good)] * 5
+    with pytest.raises(ValueError, match="Malformed array element"):
+        next(records)
+    assert f.tell() <= 2048
+
+
+def test_json_array_element_size_is_bounded():
+    """Test an element that never ends is given up on at max_record_size"""
+    data = b'[{"summary": "' + b"x" * 100_000
+    f = reader(data)
+
+    with pytest.raises(ValueError, match="larger than 4096 characters"):
+        list(iter_json_array_records(f, block_size=256, max_record_size=4096))
+    assert f.tell() <= 2 * 4096 + 256
+
+
+def test_large_json_array_element_spanning_many_blocks():
+    """Test an element much larger than the block size still decodes"""
+    records = [{"orderNo": 1, "summary": "x" * 200_000}, {"orderNo": 2}]
+
+    assert list(iter_json_array_records(reader(json.dumps(records).encode("utf-8")), block_size=64)) == records
+
+
+def test_empty_json_array_with_bom():
+    """Test an empty array with a UTF-8 byte order mark yields nothing"""
+    assert list(iter_json_array_records(reader(b"\xef\xbb\xbf [ ]\n"))) == []
+
+
+def test_ndjson_reports_malformed_lines():
+    """Test malformed NDJSON lines are reported and skipped, blank lines ignored"""
+    errors = []
+    data = b'{"orderNo": 1}\n\n{oops\n{"orderNo": 2}'
+    records = list(iter_ndjson_records(reader(data), json.loads, on_error=lambda line, e: errors.append(line)))
+
+    assert records == [{"orderNo": 1}, {"orderNo": 2}]
+    assert errors == [3]
+
+
+def test_is_multi_record_file_peeks_without_consuming():
+    """Test detection by suffix, or by a leading '[' for .json files"""
+    f = reader(b'  \n[{"orderNo": 1}]')
+    assert is_multi_record_file("export.json", f)
+    assert f.read() == b'  \n[{"orderNo": 1}]'
+
+    assert not is_multi_record_file("1.json", reader(b'{"orderNo": 1}'))
+    assert is_multi_record_file("export.ndjson", reader(b'{"orderNo": 1}'))
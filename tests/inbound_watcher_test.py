@@ -0,0 +1,167 @@
+import pytest
+import asyncio
+import os
+import json
+import tempfile
+import shutil
+from unittest import mock
+from types import SimpleNamespace
+from src.core.inbound_watcher import InboundWatcher, _InboundEventHandler
+
+
+@pytest.fixture
+def inbound_dir():
+    """Create a temporary inbound directory and clean it up after"""
+    temp_inbound_dir = tempfile.mkdtemp()
+    yield temp_inbound_dir
+    shutil.rmtree(temp_inbound_dir)
+
+
+@pytest.fixture
+def watcher(inbound_dir):
+    """Create a polling InboundWatcher with short timings"""
+    with mock.patch.dict(os.environ, {
+        'DAEMON_DEBOUNCE_MS': '30',
+        'DAEMON_BATCH_SIZE': '2',
+        'DAEMON_BATCH_WINDOW_MS': '20',
+        'DAEMON_POLL_INTERVAL_MS': '10',
+    }):
+        yield InboundWatcher(inbound_dir, backend="polling")
+
+
+def write_file(folder, name, content):
+    with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+async def collect_batches(watcher, expected_files, timeout=2.0):
+    """Collect batches until expected_files paths were emitted"""
+    batches = []
+
+    async def _collect():
+        async for batch in watcher.batches():
+            batches.append(batch)
+            if sum(len(b) for b in batches) >= expected_files:
+                watcher.stop()
+
+    await asyncio.wait_for(_collect(), timeout)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_watcher_groups_existing_files_into_batches(watcher, inbound_dir):
+    """Test files already in the folder are emitted in batches of at most batch_size"""
+    for order_no in range(1, 4):
+        write_file(inbound_dir, f"{order_no}.json", json.dumps({"orderNo": order_no}))
+    write_file(inbound_dir, "notes.txt", "ignored")
+    write_file(inbound_dir, ".4.json", "hidden temp file")
+
+    batches = await collect_batches(watcher, expected_files=3)
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    emitted = sorted(os.path.basename(path) for batch in batches for path in batch)
+    assert emitted == ["1.json", "2.json", "3.json"]
+
+
+@pytest.mark.asyncio
+async def test_watcher_waits_for_file_to_settle(watcher, inbound_dir):
+    """Test a file still being written is only emitted once it stops changing"""
+    watcher.debounce = 0.1
+    path = os.path.join(inbound_dir, "1.json")
+    write_file(inbound_dir, "1.json", '{"orderNo": ')
+
+    async def _finish_write():
+        await asyncio.sleep(0.05)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('1}')
+
+    writer = asyncio.create_task(_finish_write())
+    batches = await collect_batches(watcher, expected_files=1)
+    await writer
+
+    assert batches == [[path]]
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {"orderNo": 1}
+
+
+@pytest.mark.asyncio
+async def test_watcher_emits_new_arrivals_once(watcher, inbound_dir):
+    """Test files dropped while watching are picked up and not emitted twice"""
+    batches = []
+
+    async def _collect():
+        async for batch in watcher.batches():
+            batches.append(batch)
+
+    collector = asyncio.create_task(_collect())
+    write_file(inbound_dir, "1.json", json.dumps({"orderNo": 1}))
+    await asyncio.sleep(0.2)
+    write_file(inbound_dir, "2.json", json.dumps({"orderNo": 2}))
+    await asyncio.sleep(0.2)
+    watcher.stop()
+    await asyncio.wait_for(collector, 1.0)
+
+    emitted = [os.path.basename(path) for batch in batches for path in batch]
+    assert emitted == ["1.json", "2.json"]
+
+
+@pytest.mark.asyncio
+async def test_watcher_emits_failed_files_again_after_retry_delay(watcher, inbound_dir):
+    """Test files handed back with retry_later are emitted again, after the retry delay"""
+    watcher.retry_delay = 0.1
+    write_file(inbound_dir, "1.json", json.dumps({"orderNo": 1}))
+    emitted_at = []
+
+    async def _collect():
+        async for batch in watcher.batches():
+            emitted_at.append((batch, asyncio.get_running_loop().time()))
+            if len(emitted_at) == 1:
+                watcher.retry_later(batch)
+            else:
+                watcher.stop()
+
+    await asyncio.wait_for(_collect(), 2.0)
+
+    path = os.path.join(inbound_dir, "1.json")
+    assert [batch for batch, _ in emitted_at] == [[path], [path]]
+    assert emitted_at[1][1] - emitted_at[0][1] >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_watcher_rescans_folder_in_event_mode(watcher, inbound_dir):
+    """Test the event backend still rescans the folder, picking up missed files and forgetting gone ones"""
+    watcher.use_events = True
+    watcher.rescan_interval = 0.05
+    write_file(inbound_dir, "1.json", json.dumps({"orderNo": 1}))
+    batches = []
+
+    async def _collect():
+        async for batch in watcher.batches():
+            batches.append(batch)
+            if len(batches) == 1:
+                os.remove(batch[0])
+                write_file(inbound_dir, "2.json", json.dumps({"orderNo": 2}))
+            else:
+                watcher.stop()
+
+    # No events ever arrive from the mocked observer
+    with mock.patch("src.core.inbound_watcher.Observer"):
+        await asyncio.wait_for(_collect(), 2.0)
+
+    assert [[os.path.basename(path) for path in batch] for batch in batches] == [["1.json"], ["2.json"]]
+    assert list(watcher._emitted) == [os.path.join(inbound_dir, "2.json")]
+
+
+def test_event_handler_forgets_deleted_and_moved_files(watcher, inbound_dir):
+    """Test deletions and moves out of the folder drop the file from the emitted index"""
+    deleted = os.path.join(inbound_dir, "1.json")
+    moved = os.path.join(inbound_dir, ".2.json.tmp")
+    watcher._emitted = {deleted: (1, 1), moved: (1, 1)}
+    notified = []
+    handler = _InboundEventHandler(notified.append, watcher._forget)
+
+    handler.on_deleted(SimpleNamespace(is_directory=False, src_path=deleted))
+    handler.on_moved(SimpleNamespace(is_directory=False, src_path=moved, dest_path=os.path.join(inbound_dir, "2.json")))
+
+    assert watcher._emitted == {}
+    assert notified == [os.path.join(inbound_dir, "2.json")]
@@ -0,0 +1,63 @@
+import pytest
+from unittest import mock
+from datetime import datetime, timezone
+from bson import ObjectId
+from src.core import json_codec
+from src.core.json_codec import get_codec, available_codecs
+
+
+@pytest.fixture
+def workorder():
+    """Customer workorder with values JSON has no native type for"""
+    return {
+        "id": ObjectId("6823a1f0c0ffee0000000001"),
+        "orderNo": 42,
+        "summary": "Replace bearing – ação",
+        "creationDate": datetime(2025, 5, 10, 18, 1, 57, 719000, tzinfo=timezone.utc),
+        "isDone": False,
+        "deletedDate": None,
+    }
+
+
+@pytest.mark.parametrize("name", available_codecs())
+@pytest.mark.parametrize("compact", [False, True])
+def test_codec_round_trip(name, compact, workorder):
+    """Test every available backend encodes datetimes as ISO 8601 and ObjectIds as strings"""
+    codec = get_codec(name, compact=compact)
+    assert codec.name == name
+
+    encoded = codec.dumps(workorder)
+    assert isinstance(encoded, bytes)
+    assert (b"\n" not in encoded) == compact
+
+    # msgspec writes the UTC offset as Z, the other backends as +00:00
+    utc_suffix = "Z" if name == "msgspec" else "+00:00"
+    decoded = codec.loads(encoded)
+    assert decoded == {
+        **workorder,
+        "id": "6823a1f0c0ffee0000000001",
+        "creationDate": f"2025-05-10T18:01:57.719000{utc_suffix}",
+    }
+    assert datetime.fromisoformat(decoded["creationDate"]) == workorder["creationDate"]
+
+
+@pytest.mark.parametrize("name", available_codecs())
+def test_codec_rejects_malformed_json(name):
+    """Test decode errors surface as ValueError for every backend"""
+    with pytest.raises(ValueError):
+        get_codec(name).loads(b'{"orderNo": ')
+
+
+def test_get_codec_falls_back_to_stdlib():
+    """Test a missing or unknown backend falls back to the stdlib codec"""
+    with mock.patch.dict(json_codec._AVAILABLE, {"orjson": False, "msgspec": False}):
+        assert get_codec("orjson").name == "stdlib"
+        assert get_codec("auto").name == "stdlib"
+    assert get_codec("simdjson").name == "stdlib"
+
+
+def test_get_codec_reads_environment():
+    """Test the backend and output mode come from the environment by default"""
+    with mock.patch.dict("os.environ", {"CUSTOMER_JSON_CODEC": "stdlib", "CUSTOMER_JSON_COMPACT": "true"}):
+        codec = get_codec()
+    assert (codec.name, codec.compact) == ("stdlib", True)
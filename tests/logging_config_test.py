@@ -0,0 +1,100 @@
+import io
+import sys
+import pytest
+from unittest import mock
+from loguru import logger
+from src.core import logging_config
+from src.core.logging_config import RecordLog, configure_logging, log_batch
+
+
+class _Unformattable:
+    """Fails the test if a log line tries to format it"""
+
+    def __format__(self, spec):
+        raise AssertionError("formatted a line no sink accepts")
+
+
+@pytest.fixture
+def messages():
+    """Capture INFO and above like the default configuration, as "LEVEL message" strings"""
+    captured = []
+    handler_id = logger.add(lambda message: captured.append(message.record["level"].name + " " + message.record["message"]), level="INFO")
+    yield captured
+    logger.remove(handler_id)
+
+
+def test_detail_lines_only_for_traced_workorders(messages):
+    """Test detail lines are logged at INFO for traced numbers and not even formatted otherwise"""
+    record_log = RecordLog(traced=["42"], per_second=10, level="INFO")
+
+    record_log.debug(42, "Translated with {}", "columns")
+    record_log.debug(7, "Translated with {}", _Unformattable())
+
+    assert messages == ["INFO [workorder 42] Translated with columns"]
+
+
+def test_problem_lines_are_rate_limited(messages):
+    """Test per-record errors beyond the rate are dropped, counted and reported by flush"""
+    record_log = RecordLog(traced=["1"], per_second=2, level="INFO")
+
+    for number in range(2, 7):
+        record_log.error(number, "Failed to upsert: {}", "duplicate key")
+    # Traced workorders are never dropped
+    record_log.warning(1, "Not found")
+
+    assert messages == [
+        "ERROR [workorder 2] Failed to upsert: duplicate key",
+        "ERROR [workorder 3] Failed to upsert: duplicate key",
+        "WARNING [workorder 1] Not found",
+    ]
+    assert record_log.suppressed == 3
+
+    record_log.flush()
+    assert messages[-1] == "WARNING Suppressed 3 per-record log lines over the 2/s limit"
+    assert record_log.suppressed == 0
+
+
+def test_rate_limit_window_resets():
+    """Test the limit applies per one-second window"""
+    record_log = RecordLog(traced=[], per_second=1, level="INFO")
+
+    with mock.patch.object(logging_config.time, "monotonic", side_effect=[100.0, 100.5, 101.2]):
+        assert record_log._allow()
+        assert not record_log._allow()
+        assert record_log._allow()
+
+
+def test_log_batch_summarizes_and_flushes(messages):
+    """Test a batch logs one summary line followed by its suppressed count"""
+    with mock.patch.object(logging_config, "record_log", RecordLog(traced=[], per_second=0, level="INFO")) as record_log:
+        record_log.error(5, "Failed")
+        with mock.patch.object(logging_config.time, "monotonic", return_value=10.5):
+            log_batch("Inbound chunk", 10.0, read=3, marked_as_synced=2)
+
+    assert messages == [
+        "INFO Inbound chunk: 3 read, 2 marked as synced in 500.0 ms",
+        "WARNING Suppressed 1 per-record log lines over the 0/s limit",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_configure_logging_with_background_sink(monkeypatch):
+    """Test the enqueued sink writes off the calling thread and is drained by complete()"""
+    monkeypatch.setenv("LOG_TRACE_WORKORDERS", "9, 10")
+    stderr = io.StringIO()
+    original_stderr = sys.stderr
+    sys.stderr = stderr
+    try:
+        configure_logging(level="DEBUG", enqueue=True)
+        assert logging_config.record_log.traced == {"9", "10"}
+        assert logging_config.record_log.detail_enabled
+
+        logger.info("queued line")
+        await logger.complete()
+    finally:
+        sys.stderr = original_stderr
+        logger.remove()
+        logger.add(sys.stderr)
+        logging_config.record_log.reload(traced=[])
+
+    assert "queued line" in stderr.getvalue()
@@ -0,0 +1,39 @@
+import pytest
+from src.core.metrics import Metrics
+
+
+def test_snapshot_derives_hit_rates():
+    """Test hits/misses pairs get a hit rate next to the raw counters"""
+    metrics = Metrics()
+    metrics.add({"translator.date_cache.hits": 3, "translator.date_cache.misses": 1})
+    metrics.increment("translator.date_cache.hits")
+    metrics.increment("inbound.files")
+
+    assert metrics.snapshot() == {
+        "inbound.files": 1,
+        "translator.date_cache.hit_rate": 0.8,
+        "translator.date_cache.hits": 4,
+        "translator.date_cache.misses": 1,
+    }
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+@pytest.mark.asyncio
+async def test_translator_reports_date_cache_counts(monkeypatch):
+    """Test a translated batch adds its date cache hits and misses to the metrics"""
+    from src.core import translator as translator_module
+    from src.core.translator import Translator
+
+    metrics = Metrics()
+    monkeypatch.setattr(translator_module, "metrics", metrics)
+    monkeypatch.setattr(translator_module, "np", None)
+    translator = Translator()
+    workorder = {"orderNo": 1, "creationDate": "2023-05-10T00:00:00Z", "lastUpdateDate": "2023-05-10T00:00:00Z"}
+
+    await translator.customer_to_tracos_many([dict(workorder, orderNo=number) for number in range(1, 11)])
+
+    # 20 lookups of one distinct string
+    assert metrics.get("translator.date_cache.misses") == 1
+    assert metrics.get("translator.date_cache.hits") == 19
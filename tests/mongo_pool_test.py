@@ -0,0 +1,64 @@
+import pytest
+from unittest import mock
+from mongomock_motor import AsyncMongoMockClient
+from src.core.mongo_pool import MongoClientPool
+from src.core.tracos_handler import TracOsHandler
+
+
+@pytest.fixture
+def mongo_pool():
+    """Create a MongoClientPool backed by in-memory MongoDB clients"""
+    pool = MongoClientPool()
+    pool.client_factory = mock.Mock(side_effect=lambda *args, **kwargs: AsyncMongoMockClient())
+    yield pool
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_handlers_share_a_single_client(mongo_pool):
+    """Test every handler built on the pool reuses one client and connection pool"""
+    inbound_handler = TracOsHandler(mongo_pool=mongo_pool)
+    outbound_handler = TracOsHandler(mongo_pool=mongo_pool)
+
+    await inbound_handler.connect()
+    await outbound_handler.connect()
+
+    assert mongo_pool.client_factory.call_count == 1
+    assert inbound_handler.client is outbound_handler.client is mongo_pool.client
+    _, options = mongo_pool.client_factory.call_args
+    assert options["maxPoolSize"] == mongo_pool.max_pool_size
+    assert options["minPoolSize"] == mongo_pool.min_pool_size
+    assert options["maxIdleTimeMS"] == mongo_pool.max_idle_time_ms
+
+    # Indexes are ensured once per pool, not once per handler
+    assert (inbound_handler.db_name, inbound_handler.collection_name) in mongo_pool.bootstrapped
+    assert outbound_handler._indexes_ensured
+
+
+@pytest.mark.asyncio
+async def test_disconnect_keeps_shared_client_open(mongo_pool):
+    """Test a handler disconnect releases the shared client without closing it"""
+    handler = TracOsHandler(mongo_pool=mongo_pool)
+    await handler.connect()
+    shared_client = mongo_pool.client
+
+    await handler.disconnect()
+    assert handler.client is None
+    assert mongo_pool.client is shared_client
+
+    await handler.connect()
+    assert handler.client is shared_client
+    assert mongo_pool.client_factory.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replaces_failed_client_once(mongo_pool):
+    """Test concurrent reconnects for the same failed client only create one new client"""
+    failed_client = await mongo_pool.get_client()
+
+    first = await mongo_pool.reconnect(failed_client)
+    second = await mongo_pool.reconnect(failed_client)
+
+    assert first is second is mongo_pool.client
+    assert first is not failed_client
+    assert mongo_pool.client_factory.call_count == 2
@@ -0,0 +1,394 @@
+import pytest
+import os
+import json
+import tempfile
+import shutil
+from unittest import mock
+from datetime import datetime, timezone
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from setup import TracOSWorkorder
+from src.core.retry_policy import CircuitOpenError
+from src.core.segment_writer import MANIFEST_SUFFIX
+from src.processors.outbound_processor import OutboundProcessor, RESUME_TOKEN_STATE_KEY
+
+
+def make_workorder(number):
+    """Build an unsynced TracOS workorder"""
+    return TracOSWorkorder(
+        _id=ObjectId(),
+        number=number,
+        status="completed",
+        title=f"Workorder {number}",
+        description=f"Workorder {number} description",
+        createdAt=datetime(2025, 1, 15, 10, 30, tzinfo=timezone.utc),
+        updatedAt=datetime(2025, 1, 15, 11, 45, tzinfo=timezone.utc),
+        deleted=False,
+        deletedAt=None,
+        isSynced=False,
+    )
+
+
+@pytest.fixture
+def outbound_dir():
+    """Create a temporary outbound directory and clean it up after"""
+    temp_outbound_dir = tempfile.mkdtemp()
+    with mock.patch.dict(os.environ, {'DATA_OUTBOUND_DIR': temp_outbound_dir}):
+        yield temp_outbound_dir
+    shutil.rmtree(temp_outbound_dir)
+
+
+@pytest.fixture
+def outbound_processor(outbound_dir):
+    """Create an OutboundProcessor whose handler uses an in-memory MongoDB"""
+    processor = OutboundProcessor()
+    mongo_client = AsyncMongoMockClient()
+    processor.tracos_handler.client = mongo_client
+    processor.tracos_handler.db = mongo_client["test_tractian"]
+    processor.tracos_handler.collection = processor.tracos_handler.db["test_workorders"]
+    return processor
+
+
+def outbound_numbers(outbound_dir):
+    numbers = []
+    for file in sorted(os.listdir(outbound_dir)):
+        with open(os.path.join(outbound_dir, file), 'r', encoding='utf-8') as f:
+            numbers.append(json.load(f)["orderNo"])
+    return sorted(numbers)
+
+
+@pytest.mark.asyncio
+async def test_change_stream_falls_back_to_full_scan_when_token_expired(outbound_processor, outbound_dir):
+    """Test an expired resume token triggers a full scan, then streaming resumes from a fresh token"""
+    handler = outbound_processor.tracos_handler
+    collection = handler.collection
+    await collection.insert_one(dict(make_workorder(1)))
+    streamed = make_workorder(2)
+    await collection.insert_one(dict(streamed))
+    await collection.update_one({"number": 2}, {"$set": {"isSynced": True}})
+    await handler.set_state(RESUME_TOKEN_STATE_KEY, {"_data": "expired"})
+
+    watch_calls = []
+
+    async def _fake_watch(resume_after=None):
+        watch_calls.append(resume_after)
+        if resume_after == {"_data": "expired"}:
+            raise OperationFailure("resume point no longer in the oplog", code=286)
+        # Workorder 2 changes after the catch-up scan
+        await collection.update_one({"number": 2}, {"$set": {"isSynced": False}})
+        outbound_processor.stop()
+        yield [handler.parse_data(await collection.find_one({"number": 2}))], {"_data": "after-2"}
+
+    async def _fake_current_resume_token():
+        return {"_data": "fresh"}
+
+    handler.watch_unsynced_workorders = _fake_watch
+    handler.current_resume_token = _fake_current_resume_token
+
+    await outbound_processor.process_change_stream()
+
+    assert watch_calls == [{"_data": "expired"}, {"_data": "fresh"}]
+    assert outbound_numbers(outbound_dir) == [1, 2]
+    assert await collection.count_documents({"isSynced": False}) == 0
+    assert await handler.get_state(RESUME_TOKEN_STATE_KEY) == {"_data": "after-2"}
+
+
+@pytest.mark.asyncio
+async def test_change_stream_resumes_from_saved_token_after_errors(outbound_processor, outbound_dir):
+    """Test stream errors are retried after a backoff from the persisted token instead of stopping the export"""
+    handler = outbound_processor.tracos_handler
+    collection = handler.collection
+    await collection.insert_one(dict(make_workorder(1)))
+    await handler.set_state(RESUME_TOKEN_STATE_KEY, {"_data": "saved"})
+    handler.retry_policy.base_delay = 0
+
+    watch_calls = []
+
+    async def _flaky_watch(resume_after=None):
+        watch_calls.append(resume_after)
+        if len(watch_calls) == 1:
+            # The token advances in memory, but is not persisted before the failure
+            yield [], {"_data": "unsaved"}
+            raise AutoReconnect("connection reset")
+        if len(watch_calls) == 2:
+            raise CircuitOpenError("MongoDB circuit breaker is open, failing fast")
+        outbound_processor.stop()
+        yield [handler.parse_data(await collection.find_one({"number": 1}))], {"_data": "after-1"}
+
+    handler.watch_unsynced_workorders = _flaky_watch
+    with mock.patch.object(outbound_processor, "_has_open_segment", side_effect=[True, False, False, False]):
+        await outbound_processor.process_change_stream()
+
+    assert watch_calls == [{"_data": "saved"}, {"_data": "saved"}, {"_data": "saved"}]
+    assert outbound_numbers(outbound_dir) == [1]
+    assert await handler.get_state(RESUME_TOKEN_STATE_KEY) == {"_data": "after-1"}
+
+
+@pytest.mark.asyncio
+async def test_change_stream_replays_batch_with_write_failures(outbound_processor, outbound_dir):
+    """Test the token doesn't move past a batch whose files failed, and the batch is exported on replay"""
+    handler = outbound_processor.tracos_handler
+    collection = handler.collection
+    await collection.insert_one(dict(make_workorder(1)))
+    await handler.set_state(RESUME_TOKEN_STATE_KEY, {"_data": "saved"})
+    handler.retry_policy.base_delay = 0
+
+    watch_calls = []
+
+    async def _watch(resume_after=None):
+        watch_calls.append(resume_after)
+        if len(watch_calls) > 1:
+            outbound_processor.stop()
+        # The change is still unsynced on replay, as updateLookup would show it
+        yield [handler.parse_data(await collection.find_one({"number": 1}))], {"_data": "after-1"}
+
+    handler.watch_unsynced_workorders = _watch
+    create_workorders_async = outbound_processor.customer_handler.create_workorders_async
+    calls = []
+
+    async def _failing_once(workorders):
+        calls.append(workorders)
+        if len(calls) == 1:
+            return [False] * len(workorders)
+        return await create_workorders_async(workorders)
+
+    with mock.patch.object(outbound_processor.customer_handler, "create_workorders_async", side_effect=_failing_once):
+        await outbound_processor.process_change_stream()
+
+    assert watch_calls == [{"_data": "saved"}, {"_data": "saved"}]
+    assert outbound_numbers(outbound_dir) == [1]
+    assert (await collection.find_one({"number": 1}))["isSynced"] is True
+    assert await handler.get_state(RESUME_TOKEN_STATE_KEY) == {"_data": "after-1"}
+
+
+@pytest.mark.asyncio
+async def test_workorders_inserted_without_is_synced_are_exported(outbound_processor, outbound_dir):
+    """Test a workorder inserted without isSynced after the first run is exported by the next one"""
+    collection = outbound_processor.tracos_handler.collection
+    await collection.insert_one(dict(make_workorder(1)))
+    await outbound_processor.process()
+
+    unflagged = dict(make_workorder(2))
+    del unflagged["isSynced"]
+    await collection.insert_one(unflagged)
+    await outbound_processor.process()
+
+    assert outbound_numbers(outbound_dir) == [1, 2]
+    assert (await collection.find_one({"number": 2}))["isSynced"] is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.getenv("MONGO_REPLSET_URI"), reason="needs a single-node replica set (MONGO_REPLSET_URI)")
+async def test_change_stream_against_replica_set(outbound_dir):
+    """Test changes are exported from a real change stream and the token survives a restart"""
+    mongo_client = AsyncIOMotorClient(os.environ["MONGO_REPLSET_URI"])
+    db_name = f"test_tractian_{ObjectId()}"
+
+    def _new_processor():
+        processor = OutboundProcessor()
+        processor.tracos_handler.client = mongo_client
+        processor.tracos_handler.db = mongo_client[db_name]
+        processor.tracos_handler.collection = processor.tracos_handler.db["test_workorders"]
+        processor.tracos_handler.disconnect = mock.AsyncMock()
+        processor.tracos_handler.change_stream_max_await_ms = 100
+        return processor
+
+    try:
+        collection = mongo_client[db_name]["test_workorders"]
+        await collection.insert_one(dict(make_workorder(1)))
+
+        for number in (2, 3):
+            processor = _new_processor()
+            original_process_chunk = processor._process_chunk
+
+            async def _process_and_stop(chunk, processor=processor, original=original_process_chunk):
+                result = await original(chunk)
+                processor.stop()
+                return result
+
+            processor._process_chunk = _process_and_stop
+            workorder = dict(make_workorder(number))
+            if number == 3:
+                # Inserted by another producer, without the flag
+                del workorder["isSynced"]
+            await collection.insert_one(workorder)
+            await processor.process_change_stream()
+
+        assert outbound_numbers(outbound_dir) == [1, 2, 3]
+        assert await mongo_client[db_name]["sync_state"].find_one({"_id": RESUME_TOKEN_STATE_KEY}) is not None
+    finally:
+        await mongo_client.drop_database(db_name)
+        mongo_client.close()
+
+
+@pytest.mark.asyncio
+async def test_incremental_scan_pages_forward_from_watermark(outbound_processor, outbound_dir):
+    """Test the incremental scan only exports changes after the persisted watermark"""
+    outbound_processor.batch_size = 2
+    handler = outbound_processor.tracos_handler
+    collection = handler.collection
+
+    base_time = datetime(2025, 1, 15, 10, 0)
+    for number in range(1, 6):
+        workorder = make_workorder(number)
+        workorder["updatedAt"] = base_time.replace(minute=number)
+        await collection.insert_one(dict(workorder))
+
+    await outbound_processor.process_incremental()
+    assert outbound_numbers(outbound_dir) == [1, 2, 3, 4, 5]
+    watermark = await handler.get_state("outbound_watermark")
+    assert watermark["updatedAt"] == base_time.replace(minute=5)
+
+    # Only the workorder changed after the watermark is read on the next pass
+    for file in os.listdir(outbound_dir):
+        os.remove(os.path.join(outbound_dir, file))
+    await collection.update_one({"number": 2}, {"$set": {"isSynced": False, "updatedAt": base_time.replace(minute=30)}})
+
+    await outbound_processor.process_incremental()
+    assert outbound_numbers(outbound_dir) == [2]
+
+
+@pytest.mark.asyncio
+async def test_incremental_scan_keeps_watermark_on_write_failure(outbound_processor, outbound_dir):
+    """Test a page with failed writes doesn't advance the watermark"""
+    handler = outbound_processor.tracos_handler
+    await handler.collection.insert_one(dict(make_workorder(1)))
+
+    async def _failing_writes(workorders):
+        return [False for _ in workorders]
+
+    outbound_processor.customer_handler.create_workorders_async = _failing_writes
+    await outbound_processor.process_incremental()
+
+    assert await handler.get_state("outbound_watermark") is None
+    assert await handler.collection.count_documents({"isSynced": False}) == 1
+
+
+@pytest.mark.asyncio
+async def test_incremental_scan_rereads_lag_window_without_moving_back(outbound_processor, outbound_dir):
+    """Test a change committed late, just behind the watermark, is exported within the lag window"""
+    outbound_processor.sweep_interval = 0
+    handler = outbound_processor.tracos_handler
+    watermark = {"updatedAt": datetime(2025, 1, 15, 10, 5), "_id": ObjectId()}
+    await handler.set_state("outbound_watermark", watermark)
+    late = make_workorder(1)
+    late["updatedAt"] = datetime(2025, 1, 15, 10, 4, 30)
+    await handler.collection.insert_one(dict(late))
+
+    await outbound_processor.process_incremental()
+
+    assert outbound_numbers(outbound_dir) == [1]
+    assert await handler.get_state("outbound_watermark") == watermark
+
+
+@pytest.mark.asyncio
+async def test_incremental_scan_sweeps_unsynced_behind_watermark(outbound_processor, outbound_dir):
+    """Test unsynced workorders older than the checkpoint are swept, at most once per interval"""
+    handler = outbound_processor.tracos_handler
+    watermark = {"updatedAt": datetime(2025, 1, 15, 10, 5), "_id": ObjectId()}
+    await handler.set_state("outbound_watermark", watermark)
+    stale = make_workorder(1)
+    stale["updatedAt"] = datetime(2025, 1, 14, 9, 0)
+    # Synced long ago, then flagged again without bumping updatedAt
+    reset = make_workorder(2)
+    reset["updatedAt"] = datetime(2025, 1, 10, 8, 0)
+    await handler.collection.insert_many([dict(stale), dict(reset)])
+
+    await outbound_processor.process_incremental()
+
+    assert outbound_numbers(outbound_dir) == [1, 2]
+    assert await handler.collection.count_documents({"isSynced": False}) == 0
+    assert await handler.get_state("outbound_watermark") == watermark
+    assert await handler.get_state("outbound_sweep") is not None
+
+    # The next sweep waits for sweep_interval
+    older = make_workorder(3)
+    older["updatedAt"] = datetime(2025, 1, 14, 9, 0)
+    await handler.collection.insert_one(dict(older))
+    await outbound_processor.process_incremental()
+    assert outbound_numbers(outbound_dir) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_watermark_starts_at_oldest_unsynced(outbound_processor):
+    """Test the rebuilt watermark includes the oldest unsynced workorder"""
+    handler = outbound_processor.tracos_handler
+    for number, minute in ((1, 5), (2, 10), (3, 20)):
+        workorder = make_workorder(number)
+        workorder["updatedAt"] = datetime(2025, 1, 15, 10, minute)
+        workorder["isSynced"] = number != 2
+        await handler.collection.insert_one(dict(workorder))
+
+    checkpoint = await outbound_processor.rebuild_watermark()
+
+    assert checkpoint == {"updatedAt": datetime(2025, 1, 15, 10, 10), "_id": None}
+    assert await handler.get_state("outbound_watermark") == checkpoint
+
+
+@pytest.fixture
+def ndjson_outbound_processor(outbound_dir):
+    """Create an OutboundProcessor writing NDJSON segments of up to 2 workorders"""
+    with mock.patch.dict(os.environ, {'OUTBOUND_FORMAT': 'ndjson', 'OUTBOUND_SEGMENT_MAX_RECORDS': '2'}):
+        processor = OutboundProcessor()
+    mongo_client = AsyncMongoMockClient()
+    processor.tracos_handler.client = mongo_client
+    processor.tracos_handler.db = mongo_client["test_tractian"]
+    processor.tracos_handler.collection = processor.tracos_handler.db["test_workorders"]
+    return processor
+
+
+def segment_numbers(outbound_dir):
+    """orderNos of each published segment, as listed in their manifests"""
+    numbers = []
+    for name in sorted(os.listdir(outbound_dir)):
+        if name.endswith(MANIFEST_SUFFIX):
+            with open(os.path.join(outbound_dir, name), 'r', encoding='utf-8') as f:
+                numbers.extend(json.loads(line)["orderNos"] for line in f)
+    return numbers
+
+
+@pytest.mark.asyncio
+async def test_ndjson_export_marks_workorders_once_segments_are_published(ndjson_outbound_processor, outbound_dir):
+    """Test workorders in an open segment stay unsynced until the segment is renamed into place"""
+    handler = ndjson_outbound_processor.tracos_handler
+    workorders = [make_workorder(number) for number in range(1, 4)]
+    await handler.collection.insert_many([dict(workorder) for workorder in workorders])
+
+    records = [handler.parse_data(workorder) for workorder in workorders]
+    created, synced, failures = await ndjson_outbound_processor._process_chunk(records)
+
+    assert (created, synced, failures) == (3, 2, 0)
+    assert [doc["number"] async for doc in handler.collection.find({"isSynced": False})] == [3]
+
+    # Shutting down without publishing drops the open segment, so 3 is exported again later
+    ndjson_outbound_processor.customer_handler.close()
+    assert segment_numbers(outbound_dir) == [[1, 2]]
+    assert not [name for name in os.listdir(outbound_dir) if name.endswith('.tmp')]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_full_and_incremental_exports(ndjson_outbound_processor, outbound_dir):
+    """Test both scan modes publish every segment and only then persist the watermark"""
+    handler = ndjson_outbound_processor.tracos_handler
+    base_time = datetime(2025, 1, 15, 10, 0)
+    for number in range(1, 6):
+        workorder = make_workorder(number)
+        workorder["updatedAt"] = base_time.replace(minute=number)
+        await handler.collection.insert_one(dict(workorder))
+
+    ndjson_outbound_processor.batch_size = 3
+    await ndjson_outbound_processor.process_incremental()
+
+    assert segment_numbers(outbound_dir) == [[1, 2], [3, 4], [5]]
+    assert await handler.collection.count_documents({"isSynced": False}) == 0
+    watermark = await handler.get_state("outbound_watermark")
+    assert watermark["updatedAt"] == base_time.replace(minute=5)
+
+    await handler.collection.update_many({"number": {"$in": [1, 2, 3]}}, {"$set": {"isSynced": False}})
+    await ndjson_outbound_processor.process()
+
+    assert segment_numbers(outbound_dir)[3:] == [[1, 2], [3]]
+    assert await handler.collection.count_documents({"isSynced": False}) == 0
@@ -0,0 +1,89 @@
+import pickle
+import pytest
+from datetime import datetime, timezone
+from bson import ObjectId
+from src.core.records import CustomerRecord, TracOSRecord
+from src.core.json_codec import available_codecs, get_codec
+
+
+@pytest.fixture
+def document():
+    """MongoDB document with bookkeeping fields the record leaves out"""
+    return {
+        "_id": ObjectId("6823a1f0c0ffee0000000001"),
+        "number": 1,
+        "status": "completed",
+        "title": "Example workorder #1",
+        "description": "Example workorder #1 description",
+        "createdAt": datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc),
+        "updatedAt": datetime(2025, 5, 10, 18, 30, tzinfo=timezone.utc),
+        "deleted": False,
+        "isSynced": False,
+        "syncedAt": None,
+        "contentHash": "abc",
+    }
+
+
+@pytest.fixture
+def customer_record():
+    return CustomerRecord(
+        orderNo=1,
+        isActive=False,
+        isCanceled=False,
+        isDeleted=False,
+        isDone=True,
+        isOnHold=False,
+        isPending=False,
+        isSynced=False,
+        summary="Example workorder #1",
+        creationDate=datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc),
+        lastUpdateDate=datetime(2025, 5, 10, 18, 30, tzinfo=timezone.utc),
+    )
+
+
+def test_tracos_record_from_document(document):
+    """Test a record keeps only the workorder fields and reads like the dict it replaced"""
+    record = TracOSRecord.from_document(document)
+
+    assert record["number"] == 1
+    assert record.get("deletedAt") is None
+    assert record.get("syncedAt", "missing") == "missing"
+    assert "contentHash" not in record
+    with pytest.raises(KeyError):
+        record["contentHash"]
+
+    expected = {key: value for key, value in document.items() if key not in ("syncedAt", "contentHash")}
+    assert record == {**expected, "deletedAt": None}
+    assert dict(record) == {**expected, "deletedAt": None}
+
+
+def test_tracos_record_keeps_version_out_of_the_mapping(document):
+    """Test the document version is carried for marking as synced but never exported"""
+    record = TracOSRecord.from_document({**document, "version": 3})
+
+    assert record.version == 3
+    assert "version" not in record
+    assert "version" not in dict(record)
+
+
+def test_records_are_slotted(document, customer_record):
+    """Test records carry no per-instance __dict__"""
+    for record in (TracOSRecord.from_document(document), customer_record):
+        assert not hasattr(record, "__dict__")
+        with pytest.raises(AttributeError):
+            record.extra = True
+
+
+def test_records_pickle(document, customer_record):
+    """Test records survive pickling, as used by process pools"""
+    for record in (TracOSRecord.from_document(document), customer_record):
+        restored = pickle.loads(pickle.dumps(record))
+        assert type(restored) is type(record)
+        assert restored == record
+
+
+@pytest.mark.parametrize("name", available_codecs())
+def test_records_encode_like_dicts(name, customer_record):
+    """Test every codec backend encodes a record exactly like the equivalent dict"""
+    codec = get_codec(name, compact=True)
+    assert codec.dumps(customer_record) == codec.dumps(dict(customer_record))
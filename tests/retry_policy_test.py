@@ -0,0 +1,184 @@
+import pytest
+from unittest import mock
+from pymongo.errors import (
+    AutoReconnect,
+    BulkWriteError,
+    DuplicateKeyError,
+    NotPrimaryError,
+    OperationFailure,
+    ServerSelectionTimeoutError,
+)
+from src.core import retry_policy
+from src.core.metrics import Metrics
+from src.core.retry_policy import (
+    CONNECTION,
+    PERMANENT,
+    TRANSIENT,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    classify_error,
+)
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    """Count into a fresh Metrics instead of the process-wide one"""
+    fresh = Metrics()
+    monkeypatch.setattr(retry_policy, "metrics", fresh)
+    return fresh
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record the backoff delays instead of sleeping"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def failing(*errors, result="done"):
+    """An async operation raising the given errors in turn, then returning result"""
+    operation = mock.AsyncMock(side_effect=[*errors, result])
+    return operation
+
+
+@pytest.mark.parametrize("error, kind", [
+    (DuplicateKeyError("E11000 duplicate key", code=11000), PERMANENT),
+    (OperationFailure("Document failed validation", code=121), PERMANENT),
+    (BulkWriteError({"writeErrors": [{"code": 11000}, {"code": 121}]}), PERMANENT),
+    (ValueError("bad document"), PERMANENT),
+    (AutoReconnect("connection reset"), CONNECTION),
+    (ServerSelectionTimeoutError("no servers"), CONNECTION),
+    (ConnectionRefusedError(), CONNECTION),
+    (NotPrimaryError("not primary"), TRANSIENT),
+    (OperationFailure("Primary stepped down", code=189), TRANSIENT),
+    (OperationFailure("labelled", code=2, details={"errorLabels": ["RetryableWriteError"]}), TRANSIENT),
+    (BulkWriteError({"writeErrors": [{"code": 11000}, {"code": 112}]}), TRANSIENT),
+    (RuntimeError("unknown"), TRANSIENT),
+])
+def test_classify_error(error, kind):
+    """Test errors are sorted by type, code and labels"""
+    assert classify_error(error) == kind
+
+
+def test_backoff_is_capped_and_jittered():
+    """Test delays stay within [0, min(max_delay, base * 2^attempt)]"""
+    policy = RetryPolicy(max_retries=10, base_delay=0.5, max_delay=4.0, breaker=CircuitBreaker(5, 30))
+
+    with mock.patch.object(retry_policy.random, "uniform", side_effect=lambda low, high: high):
+        assert [policy.backoff(attempt) for attempt in range(6)] == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    for attempt in range(10):
+        assert 0 <= policy.backoff(attempt) <= min(4.0, 0.5 * 2 ** attempt)
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_is_not_retried(counters, no_sleep):
+    """Test a duplicate key error is raised on the first attempt"""
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, breaker=CircuitBreaker(5, 30))
+    operation = failing(DuplicateKeyError("E11000 duplicate key", code=11000))
+
+    with pytest.raises(DuplicateKeyError):
+        await policy.run(operation)
+
+    assert operation.await_count == 1
+    assert no_sleep == []
+    assert counters.get("mongo.permanent_errors") == 1
+    assert counters.get("mongo.retries") == 0
+
+
+@pytest.mark.asyncio
+async def test_transient_error_is_retried(counters, no_sleep):
+    """Test a failover error is retried after a backoff without reconnecting"""
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, breaker=CircuitBreaker(5, 30))
+    reconnect = mock.AsyncMock()
+    operation = failing(NotPrimaryError("not primary"), OperationFailure("stepped down", code=189))
+
+    assert await policy.run(operation, "arg", on_connection_error=reconnect, key="value") == "done"
+
+    operation.assert_awaited_with("arg", key="value")
+    assert operation.await_count == 3
+    assert len(no_sleep) == 2
+    reconnect.assert_not_awaited()
+    assert counters.get("mongo.retries") == 2
+
+
+@pytest.mark.asyncio
+async def test_connection_error_reconnects(counters, no_sleep):
+    """Test a connection error awaits the reconnect hook, even when the hook fails"""
+    policy = RetryPolicy(max_retries=3, base_delay=1.0, breaker=CircuitBreaker(5, 30))
+    reconnect = mock.AsyncMock(side_effect=[AutoReconnect("still down"), None])
+    operation = failing(AutoReconnect("reset"), AutoReconnect("reset"))
+
+    assert await policy.run(operation, on_connection_error=reconnect) == "done"
+
+    assert reconnect.await_count == 2
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+    assert policy.breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_retries_exhausted(counters, no_sleep):
+    """Test the last error is raised once max_retries retries have failed"""
+    policy = RetryPolicy(max_retries=2, base_delay=1.0, breaker=CircuitBreaker(5, 30))
+    operation = failing(*[RuntimeError("busy")] * 3)
+
+    with pytest.raises(RuntimeError):
+        await policy.run(operation)
+
+    assert operation.await_count == 3
+    assert counters.get("mongo.retries") == 2
+    assert counters.get("mongo.retries_exhausted") == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers(counters, no_sleep):
+    """Test the breaker opens at the threshold, fails fast, then closes after a good probe"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    policy = RetryPolicy(max_retries=5, base_delay=1.0, breaker=breaker)
+    down = mock.AsyncMock(side_effect=AutoReconnect("down"))
+
+    with mock.patch.object(retry_policy.time, "monotonic", return_value=100.0):
+        with pytest.raises(CircuitOpenError):
+            await policy.run(down)
+    # Opened on the second failure, the third attempt was rejected without a call
+    assert down.await_count == 2
+    assert breaker.state == CircuitBreaker.OPEN
+    assert counters.get("mongo.circuit.opened") == 1
+
+    # Other policies sharing the breaker fail fast too
+    other = RetryPolicy(max_retries=0, breaker=breaker)
+    untouched = mock.AsyncMock()
+    with mock.patch.object(retry_policy.time, "monotonic", return_value=110.0):
+        with pytest.raises(CircuitOpenError):
+            await other.run(untouched)
+    untouched.assert_not_awaited()
+    assert counters.get("mongo.circuit.rejected") == 2
+
+    # After reset_timeout a single probe goes through and closes the circuit
+    up = mock.AsyncMock(return_value="ok")
+    with mock.patch.object(retry_policy.time, "monotonic", return_value=131.0):
+        assert await other.run(up) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_circuit(counters):
+    """Test a connection error during the half-open probe opens the circuit again"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+
+    with mock.patch.object(retry_policy.time, "monotonic", return_value=0.0):
+        breaker.record_failure()
+    with mock.patch.object(retry_policy.time, "monotonic", return_value=31.0):
+        breaker.before_call()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # Only one probe at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert counters.get("mongo.circuit.opened") == 2
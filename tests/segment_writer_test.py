@@ -0,0 +1,115 @@
+import pytest
+import os
+import json
+import tempfile
+import shutil
+from unittest import mock
+from src.core.json_codec import get_codec
+from src.core.segment_writer import NdjsonSegmentWriter, MANIFEST_SUFFIX
+
+
+@pytest.fixture
+def outbound_dir():
+    """Create a temporary outbound directory and clean it up after"""
+    temp_outbound_dir = tempfile.mkdtemp()
+    yield temp_outbound_dir
+    shutil.rmtree(temp_outbound_dir)
+
+
+def make_writer(folder, **limits):
+    return NdjsonSegmentWriter(folder, get_codec("stdlib", compact=True), **limits)
+
+
+def records(*numbers):
+    return [{"orderNo": number, "summary": f"Workorder {number}"} for number in numbers]
+
+
+def read_segments(folder):
+    """Return the orderNos of every published segment, in the order of their manifests"""
+    manifest = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(MANIFEST_SUFFIX):
+            with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                manifest.extend(json.loads(line) for line in f)
+
+    segments = []
+    for entry in manifest:
+        with open(os.path.join(folder, entry["segment"]), 'r', encoding='utf-8') as f:
+            numbers = [json.loads(line)["orderNo"] for line in f]
+        assert numbers == entry["orderNos"]
+        assert entry["records"] == len(numbers)
+        assert entry["bytes"] == os.path.getsize(os.path.join(folder, entry["segment"]))
+        segments.append(numbers)
+    return segments
+
+
+def test_segments_roll_over_by_record_count(outbound_dir):
+    """Test full segments are published as they fill up and return their keys"""
+    writer = make_writer(outbound_dir, max_records=2)
+
+    published = writer.append_many(records(1, 2, 3), ["a", "b", "c"])
+
+    assert published == ["a", "b"]
+    assert writer.pending_count == 1
+    # The open segment is only visible under its hidden temporary name
+    visible = [name for name in os.listdir(outbound_dir) if not name.startswith('.')]
+    assert len(visible) == 2
+
+    assert writer.close() == ["c"]
+    assert read_segments(outbound_dir) == [[1, 2], [3]]
+    assert not [name for name in os.listdir(outbound_dir) if name.endswith('.tmp')]
+
+
+def test_segments_roll_over_by_size(outbound_dir):
+    """Test a record that would exceed the size limit starts a new segment"""
+    line_size = len(get_codec("stdlib", compact=True).dumps(records(1)[0])) + 1
+    writer = make_writer(outbound_dir, max_bytes=line_size * 2)
+
+    assert writer.append_many(records(1, 2, 3), [1, 2, 3]) == [1, 2]
+    writer.close()
+
+    assert read_segments(outbound_dir) == [[1, 2], [3]]
+
+
+def test_segments_roll_over_by_age(outbound_dir):
+    """Test a segment older than the age limit is published"""
+    writer = make_writer(outbound_dir, max_age=30)
+
+    with mock.patch("src.core.segment_writer.time.monotonic", return_value=100.0):
+        writer.append_many(records(1), [1])
+    with mock.patch("src.core.segment_writer.time.monotonic", return_value=110.0):
+        assert writer.roll_if_expired() == []
+    with mock.patch("src.core.segment_writer.time.monotonic", return_value=131.0):
+        assert writer.roll_if_expired() == [1]
+
+    assert read_segments(outbound_dir) == [[1]]
+
+
+def test_failed_append_discards_open_segment(outbound_dir):
+    """Test a failed write drops the unpublished segment instead of publishing it partially"""
+    writer = make_writer(outbound_dir)
+    writer.append_many(records(1), [1])
+
+    with mock.patch.object(writer.codec, "dumps", side_effect=OSError("No space left on device")):
+        with pytest.raises(OSError):
+            writer.append_many(records(2), [2])
+
+    assert writer.pending_count == 0
+    assert os.listdir(outbound_dir) == []
+
+
+def test_each_segment_gets_its_own_manifest(outbound_dir):
+    """Test manifests sit next to their segment and a failed manifest write leaves no partial file"""
+    writer = make_writer(outbound_dir, max_records=1)
+    writer.append_many(records(1), [1])
+
+    segments = [name for name in os.listdir(outbound_dir) if name.endswith(".ndjson")]
+    assert len(segments) == 1 and segments[0].startswith("workorders_")
+    assert os.path.exists(os.path.join(outbound_dir, f"{segments[0]}{MANIFEST_SUFFIX}"))
+
+    with mock.patch("src.core.segment_writer.os.replace", side_effect=[None, OSError("No space left on device")]):
+        with pytest.raises(OSError):
+            writer.append_many(records(2), [2])
+
+    assert len([name for name in os.listdir(outbound_dir) if name.endswith(MANIFEST_SUFFIX)]) == 1
+    assert not [name for name in os.listdir(outbound_dir) if name.endswith(".tmp")]
@@ -1,8 +1,10 @@
 import pytest
-from src.core.tracos_handler import TracOsHandler
+from src.core.tracos_handler import TracOsHandler, ORIGIN_CUSTOMER, ORIGIN_TRACOS, UNSYNCED_QUERY
 from setup import TracOSWorkorder
 from mongomock_motor import AsyncMongoMockClient
-from datetime import datetime
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 
 @pytest.mark.asyncio
 async def test_tracos_handler_workflow():
@@ -52,4 +54,288 @@ async def test_tracos_handler_workflow():
             pass
         mongo_client.close()
         if handler.client:
-            await handler.disconnect()
\ No newline at end of file
+            await handler.disconnect()
+
+@pytest.fixture
+def tracos_handler():
+    """Create a TracOsHandler wired to an in-memory MongoDB"""
+    mongo_client = AsyncMongoMockClient()
+    handler = TracOsHandler()
+    handler.client = mongo_client
+    handler.db = mongo_client["test_tractian"]
+    handler.collection = handler.db["test_workorders"]
+    yield handler
+    mongo_client.close()
+
+
+def make_workorder(number, **overrides):
+    """Build a minimal TracOS workorder for handler tests"""
+    workorder = TracOSWorkorder(
+        _id=ObjectId(),
+        number=number,
+        status="pending",
+        title=f"Workorder {number}",
+        description=f"Workorder {number} description",
+        createdAt=datetime(2025, 5, 10, 18, 0, tzinfo=timezone.utc),
+        updatedAt=datetime(2025, 5, 10, 19, 0, tzinfo=timezone.utc),
+        deleted=False,
+        deletedAt=None,
+        isSynced=False,
+    )
+    workorder.update(overrides)
+    return workorder
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_bulk_upsert(tracos_handler):
+    """Test create_workorders inserts new records and updates existing ones by number"""
+    tracos_handler.bulk_batch_size = 2
+    existing = make_workorder(1)
+    await tracos_handler.collection.insert_one(dict(existing))
+
+    results = await tracos_handler.create_workorders([
+        make_workorder(1, status="completed"),
+        make_workorder(2),
+        make_workorder(3),
+    ])
+
+    assert results == {"inserted": [2, 3], "updated": [1], "unchanged": [], "failed": []}
+    assert await tracos_handler.collection.count_documents({}) == 3
+
+    updated = await tracos_handler.collection.find_one({"number": 1})
+    assert updated["_id"] == existing["_id"]
+    assert updated["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_reports_failed_chunk(tracos_handler):
+    """Test create_workorders reports every record of a chunk that could not be written"""
+    tracos_handler.retry_policy.max_retries = 0
+
+    async def _failing_bulk_write(*args, **kwargs):
+        raise RuntimeError("bulk write failed")
+
+    tracos_handler.collection.bulk_write = _failing_bulk_write
+    results = await tracos_handler.create_workorders([make_workorder(1), make_workorder(2)])
+
+    assert results == {"inserted": [], "updated": [], "unchanged": [], "failed": [1, 2]}
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_does_not_retry_permanent_errors(tracos_handler):
+    """Test a chunk rejected with a non-retryable error is written once and reported as failed"""
+    tracos_handler.retry_policy.max_retries = 3
+    calls = []
+
+    async def _rejected_bulk_write(*args, **kwargs):
+        calls.append(args)
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "Document failed validation"}]})
+
+    tracos_handler.collection.bulk_write = _rejected_bulk_write
+    results = await tracos_handler.create_workorders([make_workorder(1)])
+
+    assert len(calls) == 1
+    assert results["failed"] == [1]
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_skips_unchanged_and_sends_field_diffs(tracos_handler):
+    """Test unchanged records are not written and changed ones only $set the differing fields"""
+    await tracos_handler.create_workorders([make_workorder(1), make_workorder(2)])
+    await tracos_handler.collection.update_many({}, {"$set": {"isSynced": True}})
+    stored = await tracos_handler.collection.find_one({"number": 1})
+
+    sent_operations = []
+    bulk_write = tracos_handler.collection.bulk_write
+
+    async def _recording_bulk_write(operations, **kwargs):
+        sent_operations.extend(operations)
+        return await bulk_write(operations, **kwargs)
+
+    tracos_handler.collection.bulk_write = _recording_bulk_write
+    # Translated again with a new _id, as the translator does for every run
+    results = await tracos_handler.create_workorders([make_workorder(1), make_workorder(2, status="completed")])
+
+    assert results == {"inserted": [], "updated": [2], "unchanged": [1], "failed": []}
+    assert len(sent_operations) == 1
+    assert set(sent_operations[0]._doc["$set"]) == {"status", "isSynced", "ingestedAt", "contentHash", "origin"}
+
+    unchanged = await tracos_handler.collection.find_one({"number": 1})
+    assert unchanged == stored
+    changed = await tracos_handler.collection.find_one({"number": 2})
+    assert changed["status"] == "completed"
+    assert changed["isSynced"] is False
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_backfills_fingerprint_without_resync(tracos_handler):
+    """Test documents written before fingerprints only get the hash recorded"""
+    existing = make_workorder(1, isSynced=True)
+    await tracos_handler.collection.insert_one(dict(existing))
+
+    results = await tracos_handler.create_workorders([make_workorder(1)])
+
+    assert results["unchanged"] == [1]
+    stored = await tracos_handler.collection.find_one({"number": 1})
+    assert stored["isSynced"] is True
+    assert "ingestedAt" not in stored
+    assert stored["contentHash"]
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_compares_against_stored_content(tracos_handler):
+    """Test a TracOS edit made outside the handler leaves a stale contentHash that doesn't hide a revert"""
+    await tracos_handler.create_workorders([make_workorder(1)], origin=ORIGIN_CUSTOMER)
+    before = await tracos_handler.collection.find_one({"number": 1})
+    # Edited directly in TracOS: the stored hash still matches the customer's content
+    await tracos_handler.collection.update_one({"number": 1}, {"$set": {"status": "completed", "isSynced": False}})
+
+    results = await tracos_handler.create_workorders([make_workorder(1)], origin=ORIGIN_CUSTOMER)
+
+    assert results["updated"] == [1]
+    stored = await tracos_handler.collection.find_one({"number": 1})
+    assert stored["status"] == before["status"]
+    assert stored["contentHash"] == before["contentHash"]
+    assert stored["version"] == before["version"] + 1
+
+
+@pytest.mark.asyncio
+async def test_create_workorders_customer_origin_is_not_exported(tracos_handler):
+    """Test customer writes don't put workorders in the outbound backlog nor hide pending TracOS changes"""
+    await tracos_handler.create_workorders([make_workorder(1), make_workorder(2)], origin=ORIGIN_CUSTOMER)
+
+    assert await tracos_handler.get_unsynced_workorders() == []
+    stored = await tracos_handler.collection.find_one({"number": 1})
+    assert (stored["origin"], stored["version"], stored["isSynced"]) == (ORIGIN_CUSTOMER, 1, True)
+
+    # Workorder 2 has a TracOS change that wasn't exported yet
+    await tracos_handler.collection.update_one({"number": 2}, {"$set": {"isSynced": False, "origin": ORIGIN_TRACOS}})
+    await tracos_handler.create_workorders(
+        [make_workorder(1, title="Renamed"), make_workorder(2, title="Renamed")], origin=ORIGIN_CUSTOMER
+    )
+
+    first = await tracos_handler.collection.find_one({"number": 1})
+    second = await tracos_handler.collection.find_one({"number": 2})
+    assert (first["title"], first["version"], first["isSynced"]) == ("Renamed", 2, True)
+    assert (second["title"], second["version"], second["isSynced"]) == ("Renamed", 2, False)
+    assert [w["number"] for w in await tracos_handler.get_unsynced_workorders()] == [2]
+
+
+@pytest.mark.asyncio
+async def test_connect_ensures_indexes_and_normalizes_is_synced(tracos_handler):
+    """Test connect creates the workorder indexes, drops obsolete ones and backfills missing isSynced"""
+    legacy = make_workorder(1)
+    del legacy["isSynced"]
+    await tracos_handler.collection.insert_one(dict(legacy))
+    await tracos_handler.collection.create_index([("isSynced", 1), ("_id", 1)], name="unsynced_partial",
+                                                 partialFilterExpression={"isSynced": False})
+
+    await tracos_handler.connect()
+
+    indexes = await tracos_handler.collection.index_information()
+    assert indexes["number_unique"]["unique"] is True
+    assert "partialFilterExpression" not in indexes["is_synced_id"]
+    assert "unsynced_partial" not in indexes
+    assert await tracos_handler.collection.count_documents({"isSynced": {"$exists": False}}) == 0
+
+    unsynced = await tracos_handler.get_unsynced_workorders()
+    assert [workorder["number"] for workorder in unsynced] == [1]
+
+
+@pytest.mark.asyncio
+async def test_workorders_inserted_without_is_synced_after_connect_are_unsynced(tracos_handler):
+    """Test workorders another producer inserts without the flag are found by every outbound query"""
+    await tracos_handler.connect()
+    legacy = make_workorder(1)
+    del legacy["isSynced"]
+    await tracos_handler.collection.insert_one(dict(legacy))
+
+    assert [w["number"] for w in await tracos_handler.get_unsynced_workorders()] == [1]
+    assert [w["number"] async for w in tracos_handler.iter_unsynced_workorders()] == [1]
+    pages = [page async for page, _ in tracos_handler.iter_changed_workorder_pages()]
+    assert [[w["number"] for w in page] for page in pages] == [[1]]
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_dry_run_does_not_write(tracos_handler):
+    """Test dry-run mode reports missing indexes and query plans without changing anything"""
+    legacy = make_workorder(1)
+    del legacy["isSynced"]
+    await tracos_handler.collection.insert_one(dict(legacy))
+
+    report = await tracos_handler.ensure_indexes(dry_run=True)
+
+    assert report["missing_indexes"] == ["number_unique", "is_synced_id", "updated_at_id"]
+    assert report["obsolete_indexes"] == []
+    assert set(report["plans"]) == {"get_unsynced_workorders", "create_workorder", "iter_changed_workorder_pages"}
+    assert "number_unique" not in await tracos_handler.collection.index_information()
+    assert await tracos_handler.collection.count_documents({"isSynced": {"$exists": False}}) == 1
+
+
+@pytest.mark.asyncio
+async def test_mark_as_synced_many_returns_modified_ids(tracos_handler):
+    """Test mark_as_synced_many updates in chunks and only returns ids that exist"""
+    tracos_handler.sync_batch_size = 2
+    workorders = [make_workorder(number) for number in (1, 2, 3)]
+    await tracos_handler.collection.insert_many([dict(workorder) for workorder in workorders])
+
+    ids = [workorder["_id"] for workorder in workorders]
+    keys = [(workorder_id, None) for workorder_id in ids]
+    modified = await tracos_handler.mark_as_synced_many(keys[:1] + [(ObjectId(), None)] + keys[1:])
+
+    assert modified == ids
+    assert await tracos_handler.collection.count_documents({"isSynced": True}) == 3
+
+    synced_at = [doc["syncedAt"] async for doc in tracos_handler.collection.find({})]
+    assert synced_at[1] == synced_at[2]  # second chunk shares a single timestamp
+
+
+@pytest.mark.asyncio
+async def test_mark_as_synced_many_skips_workorders_changed_since_read(tracos_handler):
+    """Test a workorder edited between reading and marking stays unsynced and is not reported"""
+    await tracos_handler.collection.insert_many(
+        [{**dict(make_workorder(number, _id=number)), "version": 1} for number in (1, 2)]
+    )
+    read = [record async for record in tracos_handler.iter_unsynced_workorders()]
+    assert [(record["_id"], record.version) for record in read] == [(1, 1), (2, 1)]
+
+    await tracos_handler.collection.update_one({"_id": 2}, {"$set": {"title": "Edited"}, "$inc": {"version": 1}})
+    modified = await tracos_handler.mark_as_synced_many([(record["_id"], record.version) for record in read])
+
+    assert modified == [1]
+    edited = await tracos_handler.collection.find_one({"_id": 2})
+    assert (edited["isSynced"], edited["title"]) == (False, "Edited")
+
+
+@pytest.mark.asyncio
+async def test_iter_unsynced_workorders_resumes_after_cursor_failure(tracos_handler):
+    """Test the streaming cursor yields every unsynced workorder once, even after a failure"""
+    tracos_handler.retry_policy.base_delay = 0
+    await tracos_handler.collection.insert_many(
+        [dict(make_workorder(number, _id=number)) for number in range(1, 6)]
+    )
+    await tracos_handler.collection.update_one({"_id": 3}, {"$set": {"isSynced": True}})
+
+    original_find = tracos_handler.collection.find
+    calls = []
+
+    def _flaky_find(*args, **kwargs):
+        cursor = original_find(*args, **kwargs)
+        calls.append(args[0])
+        if len(calls) == 1:
+            original_next = cursor.next
+
+            async def _next():
+                doc = await original_next()
+                if doc["_id"] == 2:
+                    raise RuntimeError("cursor killed")
+                return doc
+
+            cursor.next = _next
+        return cursor
+
+    tracos_handler.collection.find = _flaky_find
+    numbers = [workorder["number"] async for workorder in tracos_handler.iter_unsynced_workorders(batch_size=2)]
+
+    assert numbers == [1, 2, 4, 5]
+    assert calls[1] == {**UNSYNCED_QUERY, "_id": {"$gt": 1}}
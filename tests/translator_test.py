@@ -1,5 +1,6 @@
 import pytest
 import datetime
+import random
 from datetime import timezone
 from bson import ObjectId
 import sys
@@ -196,3 +197,168 @@ class TestDateConversion:
         """Test handling of invalid date formats"""
         with pytest.raises(ValueError):
             translator.date_to_iso_8601("not-a-date")
+
+
+class TestBatchTranslation:
+    @pytest.mark.asyncio
+    async def test_small_batch_translates_in_process(self, translator, sample_customer_workorder):
+        """Test batches below the threshold are translated in-process with failures collected"""
+        workorders = [dict(sample_customer_workorder, orderNo=1), {"summary": "missing orderNo"}, dict(sample_customer_workorder, orderNo=3)]
+
+        results, failures = await translator.customer_to_tracos_many(workorders)
+
+        assert translator._executor is None
+        assert [result["number"] if result else None for result in results] == [1, None, 3]
+        assert [failure["index"] for failure in failures] == [1]
+
+    @pytest.mark.asyncio
+    async def test_large_batch_uses_process_pool_and_keeps_order(self, translator, sample_tracos_workorder):
+        """Test batches above the threshold fan out to worker processes and keep input order"""
+        translator.parallel_threshold = 2
+        translator.parallel_chunk_size = 2
+        translator.max_workers = 2
+        workorders = [dict(sample_tracos_workorder, number=number) for number in range(1, 6)]
+        workorders[3] = {"title": "missing number"}
+
+        try:
+            results, failures = await translator.tracos_to_costumer_many(workorders)
+            assert translator._executor is not None
+        finally:
+            translator.close()
+
+        assert [result["orderNo"] if result else None for result in results] == [1, 2, 3, None, 5]
+        assert [failure["index"] for failure in failures] == [3]
+        assert results[0] == translator.tracos_to_costumer(workorders[0])
+
+
+def _random_date(rng):
+    """A date in any of the shapes the scalar path accepts or rejects"""
+    moment = datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=rng.randrange(10**8), microseconds=rng.randrange(10**6))
+    return rng.choice([
+        None,
+        "not-a-date",
+        "",
+        12345,
+        moment,
+        moment.replace(tzinfo=timezone.utc),
+        moment.replace(tzinfo=timezone(datetime.timedelta(hours=-3))),
+        moment.isoformat(),
+        moment.isoformat() + "Z",
+        moment.isoformat(timespec="milliseconds") + "Z",
+        moment.isoformat(timespec="seconds") + "+02:00",
+        moment.isoformat(timespec="minutes") + "Z",
+        moment.date().isoformat(),
+        "2023-13-40T25:00:00Z",
+        # numpy parses year 0, datetime can't hold it
+        "0000-01-01T00:00:00",
+        "0000-01-01T00:00:00Z",
+        {"$date": moment.isoformat(timespec="milliseconds") + "Z"},
+        {"$date": moment},
+        {"$date": None},
+    ])
+
+
+def _random_customer_workorder(rng):
+    flag = lambda: rng.choice([True, False, False, None, 0, 1, "yes"])
+    workorder = {
+        "orderNo": rng.choice([rng.randrange(1, 10**6), rng.randrange(1, 10**6), 0, None]),
+        "isActive": flag(),
+        "isCanceled": flag(),
+        "isDeleted": rng.choice([True, False]),
+        "isDone": flag(),
+        "isOnHold": flag(),
+        "isPending": flag(),
+        "isSynced": False,
+        "summary": f"summary {rng.random()}",
+        "creationDate": _random_date(rng),
+        "lastUpdateDate": _random_date(rng),
+        "deletedDate": _random_date(rng),
+    }
+    for key in rng.sample(sorted(workorder), rng.choice([0, 0, 0, 1, 2])):
+        del workorder[key]
+    return workorder
+
+
+def _random_tracos_workorder(rng):
+    workorder = {
+        "_id": ObjectId(),
+        "number": rng.choice([rng.randrange(1, 10**6), rng.randrange(1, 10**6), 0, None]),
+        "status": rng.choice(["pending", "in_progress", "completed", "on_hold", "cancelled", "unknown", "", None]),
+        "title": f"title {rng.random()}",
+        "description": f"description {rng.random()}",
+        "createdAt": _random_date(rng),
+        "updatedAt": _random_date(rng),
+        "deleted": rng.choice([True, False]),
+        "deletedAt": _random_date(rng),
+    }
+    for key in rng.sample(sorted(workorder), rng.choice([0, 0, 0, 1, 2])):
+        del workorder[key]
+    return workorder
+
+
+def _comparable(result):
+    """repr of a translated record without the random _id, so datetimes are compared with their tzinfo"""
+    if result is None:
+        return None
+    return repr({key: value for key, value in result.items() if key != "_id"})
+
+
+class TestColumnarTranslation:
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    @pytest.mark.parametrize("direction,make_workorder", [
+        ("customer_to_tracos", _random_customer_workorder),
+        ("tracos_to_costumer", _random_tracos_workorder),
+    ])
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_scalar_path(self, translator, monkeypatch, direction, make_workorder, seed, use_numpy):
+        """Test the columnar path gives the scalar results and failures for randomized workorders"""
+        from src.core import translator as translator_module
+        if use_numpy:
+            pytest.importorskip("numpy")
+        else:
+            monkeypatch.setattr(translator_module, "np", None)
+
+        rng = random.Random(seed)
+        workorders = [make_workorder(rng) for _ in range(300)]
+
+        results, failures = translator.translate_batch(direction, workorders)
+        expected_results, expected_failures = translator._translate_each(direction, workorders)
+
+        assert [_comparable(result) for result in results] == [_comparable(result) for result in expected_results]
+        assert failures == expected_failures
+        assert any(result is not None for result in results)
+        assert failures
+
+    def test_numpy_bulk_dates_match_scalar_path(self, translator, sample_customer_workorder):
+        """Test dates numpy parses in bulk, year 0 included, give the scalar results and failures"""
+        pytest.importorskip("numpy")
+        # All valid for numpy, so the bulk parse doesn't fall back as a whole
+        dates = ["2023-05-10T18:01:57.719Z", "0000-01-01T00:00:00", "9999-12-31T23:59:59.999999", "0000-06-01T00:00Z"]
+        workorders = [dict(sample_customer_workorder, orderNo=number, creationDate=date) for number, date in enumerate(dates, 1)]
+
+        results, failures = translator.translate_batch("customer_to_tracos", workorders)
+        expected_results, expected_failures = translator._translate_each("customer_to_tracos", workorders)
+
+        assert [_comparable(result) for result in results] == [_comparable(result) for result in expected_results]
+        assert failures == expected_failures
+        assert [failure["index"] for failure in failures] == [1, 3]
+
+    def test_status_table_matches_flag_priority(self, translator, sample_customer_workorder):
+        """Test every combination of customer flags maps to the status the scalar chain picks"""
+        flags = ("isCanceled", "isDone", "isOnHold", "isActive")
+        workorders = [
+            dict(sample_customer_workorder, **{flag: bool(mask & (1 << bit)) for bit, flag in enumerate(flags)})
+            for mask in range(16)
+        ]
+
+        results, _ = translator.translate_batch("customer_to_tracos", workorders)
+
+        assert [result["status"] for result in results] == [translator.customer_to_tracos(workorder)["status"] for workorder in workorders]
+
+    def test_non_mapping_records_fall_back_to_scalar_path(self, translator, sample_customer_workorder):
+        """Test a chunk with a non-object record still translates the others"""
+        results, failures = translator.translate_batch("customer_to_tracos", [sample_customer_workorder, ["not", "an", "object"]])
+
+        assert results[0]["number"] == 42
+        assert results[1] is None
+        assert [failure["index"] for failure in failures] == [1]